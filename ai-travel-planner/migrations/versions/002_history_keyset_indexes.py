@@ -0,0 +1,64 @@
+"""Keyset pagination indexes for conversation history
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Built CONCURRENTLY so writes to large tables are not blocked,
+    # which cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        # (conversation_id, timestamp, id) lets history pages seek by row value;
+        # role and tokens_used make token-budget scans index-only
+        op.create_index(
+            "ix_messages_conversation_timestamp_id",
+            "messages",
+            ["conversation_id", "timestamp", "id"],
+            unique=False,
+            postgresql_include=["role", "tokens_used"],
+            postgresql_concurrently=True,
+        )
+        # Superseded by the index above
+        op.drop_index(
+            "ix_messages_conversation_timestamp",
+            table_name="messages",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_conversations_user_updated_id",
+            "conversations",
+            ["user_id", "updated_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_conversations_user_updated_id",
+            table_name="conversations",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_messages_conversation_timestamp",
+            "messages",
+            ["conversation_id", "timestamp"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_messages_conversation_timestamp_id",
+            table_name="messages",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,66 @@
+"""JSONB storage and GIN indexes for travel plan contents
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+JSONB_COLUMNS = ["destinations", "flights", "hotels", "itinerary"]
+GIN_INDEXED_COLUMNS = ["destinations", "hotels", "itinerary"]
+
+
+def upgrade() -> None:
+    # Rewrites the table under an ACCESS EXCLUSIVE lock; run in a maintenance window
+    for column in JSONB_COLUMNS:
+        op.alter_column(
+            "travel_plans",
+            column,
+            type_=postgresql.JSONB(),
+            existing_type=sa.JSON(),
+            existing_nullable=False,
+            postgresql_using=f"{column}::jsonb",
+        )
+
+    # jsonb_path_ops indexes are smaller and faster than the default
+    # jsonb_ops, and support the @> containment used by TravelPlanRepository
+    with op.get_context().autocommit_block():
+        for column in GIN_INDEXED_COLUMNS:
+            op.create_index(
+                f"ix_travel_plans_{column}_gin",
+                "travel_plans",
+                [column],
+                unique=False,
+                postgresql_using="gin",
+                postgresql_ops={column: "jsonb_path_ops"},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in GIN_INDEXED_COLUMNS:
+            op.drop_index(
+                f"ix_travel_plans_{column}_gin",
+                table_name="travel_plans",
+                postgresql_concurrently=True,
+            )
+
+    for column in JSONB_COLUMNS:
+        op.alter_column(
+            "travel_plans",
+            column,
+            type_=sa.JSON(),
+            existing_type=postgresql.JSONB(),
+            existing_nullable=False,
+            postgresql_using=f"{column}::json",
+        )
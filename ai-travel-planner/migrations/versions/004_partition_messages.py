@@ -0,0 +1,134 @@
+"""Partition messages by month and index conversations for archival
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from shared.database.partitions import DEFAULT_PARTITION, add_months, month_partitions
+
+# revision identifiers, used by Alembic.
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created beyond the current month
+MONTHS_AHEAD = 3
+
+MESSAGE_COLUMNS = (
+    "id, conversation_id, role, content, metadata, tokens_used, "
+    "model_name, processing_time_ms, timestamp"
+)
+
+
+def _message_columns():
+    return [
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "role",
+            postgresql.ENUM(
+                "user", "assistant", "system", name="messagerole", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("metadata", sa.JSON(), nullable=False),
+        sa.Column("tokens_used", sa.Integer(), nullable=True),
+        sa.Column("model_name", sa.String(length=100), nullable=True),
+        sa.Column("processing_time_ms", sa.Integer(), nullable=True),
+        sa.Column(
+            "timestamp",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"],
+            ["conversations.id"],
+            name=op.f("fk_messages_conversation_id_conversations"),
+        ),
+    ]
+
+
+def _create_message_indexes():
+    op.create_index(
+        "ix_messages_conversation_timestamp_id",
+        "messages",
+        ["conversation_id", "timestamp", "id"],
+        unique=False,
+        postgresql_include=["role", "tokens_used"],
+    )
+    op.create_index("ix_messages_role", "messages", ["role"], unique=False)
+
+
+def _rename_old_messages():
+    # Index names share the schema namespace, so free them for the new table
+    op.rename_table("messages", "messages_old")
+    op.execute("ALTER INDEX pk_messages RENAME TO pk_messages_old")
+    op.execute(
+        "ALTER INDEX ix_messages_conversation_timestamp_id "
+        "RENAME TO ix_messages_old_conversation_timestamp_id"
+    )
+    op.execute("ALTER INDEX ix_messages_role RENAME TO ix_messages_old_role")
+
+
+def upgrade() -> None:
+    # Copies every message under an ACCESS EXCLUSIVE lock; run in a maintenance window
+    _rename_old_messages()
+
+    op.create_table(
+        "messages",
+        *_message_columns(),
+        sa.PrimaryKeyConstraint("id", "timestamp", name=op.f("pk_messages")),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    _create_message_indexes()
+
+    oldest = op.get_bind().scalar(sa.text("SELECT min(timestamp) FROM messages_old"))
+    today = datetime.now(timezone.utc).date()
+    start = oldest.date() if oldest is not None else today
+    for partition in month_partitions(start, add_months(today, MONTHS_AHEAD)):
+        op.execute(partition.create_sql())
+    op.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF messages DEFAULT")
+
+    op.execute(
+        f"INSERT INTO messages ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages_old"
+    )
+    op.drop_table("messages_old")
+
+    op.create_index(
+        "ix_conversations_status_updated",
+        "conversations",
+        ["status", "updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    # Messages already moved to the cold store stay there
+    op.drop_index("ix_conversations_status_updated", table_name="conversations")
+
+    _rename_old_messages()
+
+    op.create_table(
+        "messages",
+        *_message_columns(),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_messages")),
+    )
+    _create_message_indexes()
+
+    op.execute(
+        f"INSERT INTO messages ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages_old"
+    )
+    # Drops the partitions with it
+    op.drop_table("messages_old")
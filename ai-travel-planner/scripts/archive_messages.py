@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Message partition maintenance and archival job.
+
+Run it daily (cron or a scheduled container):
+
+1. creates the monthly messages partitions for the coming months
+2. moves messages of conversations completed more than --closed-after-days
+   days ago to the Parquet cold store (MESSAGE_ARCHIVE_DIR)
+3. drops monthly partitions older than --retain-months that archival has emptied
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from shared.database.archive import (  # noqa: E402
+    MESSAGE_ARCHIVE_DIR,
+    MessageArchiver,
+    ParquetMessageArchive,
+)
+from shared.database.config import close_db, engine  # noqa: E402
+from shared.database.partitions import (  # noqa: E402
+    add_months,
+    drop_empty_message_partitions,
+    ensure_message_partitions,
+)
+
+
+async def run(args) -> None:
+    try:
+        await maintain(args)
+    finally:
+        await close_db()
+
+
+async def maintain(args) -> None:
+    async with engine.begin() as conn:
+        created = await ensure_message_partitions(conn, months_ahead=args.months_ahead)
+    print(f"✓ Partitions checked: {', '.join(created) or 'none (not PostgreSQL)'}")
+
+    archiver = MessageArchiver(
+        ParquetMessageArchive(args.archive_dir),
+        closed_after=timedelta(days=args.closed_after_days),
+        batch_size=args.batch_size,
+    )
+    await archiver.archive_all()
+    stats = archiver.get_stats()
+    print(
+        f"✓ Archived {stats['archived_messages']} messages "
+        f"from {stats['archived_conversations']} conversations to {args.archive_dir}"
+    )
+
+    if args.retain_months is not None:
+        today = datetime.now(timezone.utc).date()
+        async with engine.begin() as conn:
+            dropped = await drop_empty_message_partitions(
+                conn, add_months(today, -args.retain_months)
+            )
+        print(f"✓ Dropped empty partitions: {', '.join(dropped) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--archive-dir", default=MESSAGE_ARCHIVE_DIR)
+    parser.add_argument("--closed-after-days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument(
+        "--retain-months",
+        type=int,
+        default=None,
+        help="Drop empty partitions that ended more than this many months ago",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("=== AI Travel Planner - Message Archival ===\n")
+    try:
+        asyncio.run(run(args))
+    except Exception as e:
+        print(f"✗ Message archival failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline destination-guide generation against a running vLLM service.
+
+Builds attraction and food prompts for every city with PromptManager, then
+generates them twice: once as individual /v1/chat/completions calls through
+the shared connection pool, and once through VLLMClient.batch_generate
+(/v1/batch). Reports requests/s and completion tokens/s for both paths.
+
+Requires a live server started from services/vllm-service/server.py.
+
+Usage:
+    python scripts/benchmarks/bench_batch.py \
+        --base-url http://localhost:8001 --cities 200
+"""
+import argparse
+import asyncio
+import time
+
+from common import load_vllm_service, print_table
+
+load_vllm_service()
+
+from vllm_service.client import VLLMClient, VLLMConnectionPool  # noqa: E402
+from vllm_service.models import (  # noqa: E402
+    BatchRequestItem,
+    ChatCompletionRequest,
+    ChatMessage,
+)
+from vllm_service.prompt_manager import PromptManager  # noqa: E402
+
+CITIES = [
+    "北京",
+    "上海",
+    "广州",
+    "深圳",
+    "成都",
+    "杭州",
+    "西安",
+    "重庆",
+    "南京",
+    "苏州",
+    "厦门",
+    "青岛",
+    "昆明",
+    "大理",
+    "丽江",
+    "桂林",
+    "三亚",
+    "拉萨",
+    "哈尔滨",
+    "长沙",
+]
+
+
+def build_requests(cities: int, model: str, max_tokens: int):
+    """Two guide prompts (attractions + food) per city."""
+    prompts = PromptManager()
+    items = []
+    for i in range(cities):
+        city = CITIES[i % len(CITIES)]
+        for kind, prompt in (
+            ("attractions", prompts.create_attraction_prompt(city)),
+            ("food", prompts.create_food_prompt(city)),
+        ):
+            items.append(
+                BatchRequestItem(
+                    custom_id=f"{kind}-{i}",
+                    body=ChatCompletionRequest(
+                        model=model,
+                        messages=[ChatMessage(role="user", content=prompt)],
+                        max_tokens=max_tokens,
+                        temperature=0.7,
+                    ),
+                )
+            )
+    return items
+
+
+def completion_tokens(response) -> int:
+    return response.usage.completion_tokens if response and response.usage else 0
+
+
+async def run_per_request(base_url: str, items, concurrency: int):
+    pool = VLLMConnectionPool(base_url=base_url, pool_size=concurrency, max_retries=0)
+    tokens = 0
+
+    async def one(item):
+        nonlocal tokens
+        async with pool.get_client() as client:
+            body = item.body
+            response = await client.chat_completion(
+                body.messages,
+                model=body.model,
+                max_tokens=body.max_tokens,
+                temperature=body.temperature,
+            )
+        tokens += completion_tokens(response)
+
+    start = time.perf_counter()
+    async with pool:
+        await asyncio.gather(*(one(item) for item in items))
+    return time.perf_counter() - start, tokens
+
+
+async def run_batch(base_url: str, items, chunk_size: int):
+    tokens = errors = 0
+    start = time.perf_counter()
+    async with VLLMClient(base_url=base_url, max_retries=0) as client:
+        async for result in client.batch_generate(items, chunk_size=chunk_size):
+            if result.error:
+                errors += 1
+            tokens += completion_tokens(result.response)
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"batch path: {errors} requests failed")
+    return elapsed, tokens
+
+
+def row(path: str, requests: int, elapsed: float, tokens: int):
+    return {
+        "path": path,
+        "seconds": elapsed,
+        "requests_per_sec": requests / elapsed,
+        "completion_tokens_per_sec": tokens / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--model", default="default")
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="per-request path in-flight calls"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    items = build_requests(args.cities, args.model, args.max_tokens)
+
+    per_request = await run_per_request(args.base_url, items, args.concurrency)
+    batch = await run_batch(args.base_url, items, args.chunk_size)
+
+    print_table(
+        f"Destination guides, {len(items)} requests",
+        [
+            row(f"/v1/chat/completions x{args.concurrency}", len(items), *per_request),
+            row("/v1/batch", len(items), *batch),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
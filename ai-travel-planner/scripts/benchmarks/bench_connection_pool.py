@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark VLLMClient connection handling against a local stub server.
+
+Compares opening a client (and therefore a transport) per call with the
+shared per-base-URL VLLMConnectionPool. The stub server speaks just
+enough HTTP/1.1 keep-alive to answer /health and /v1/chat/completions
+and counts accepted sockets.
+
+Usage:
+    python scripts/benchmarks/bench_connection_pool.py --callers 500 --requests 4
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from common import load_vllm_service, print_table
+
+load_vllm_service()
+
+from vllm_service.client import VLLMClient, VLLMConnectionPool  # noqa: E402
+from vllm_service.models import ChatMessage  # noqa: E402
+
+COMPLETION = json.dumps(
+    {
+        "id": "bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode()
+
+
+class StubServer:
+    """Minimal keep-alive HTTP/1.1 server that counts sockets."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.accepted = 0
+        self.open = 0
+        self.peak_open = 0
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(
+            self._handle, "127.0.0.1", 0, backlog=4096
+        )
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def reset(self):
+        self.accepted = 0
+        self.peak_open = self.open
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.accepted += 1
+        self.open += 1
+        self.peak_open = max(self.peak_open, self.open)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                body = COMPLETION if head.startswith(b"POST") else b'{"status": "ok"}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.open -= 1
+            writer.close()
+
+
+MESSAGES = [ChatMessage(role="user", content="你好")]
+
+
+async def client_per_call(base_url: str, callers: int, requests: int, pool_size: int):
+    async def caller():
+        for _ in range(requests):
+            async with VLLMClient(base_url=base_url, max_retries=0) as client:
+                await client.chat_completion(MESSAGES, max_tokens=1)
+
+    await asyncio.gather(*(caller() for _ in range(callers)))
+
+
+async def shared_pool(base_url: str, callers: int, requests: int, pool_size: int):
+    async with VLLMConnectionPool(
+        base_url=base_url,
+        pool_size=pool_size,
+        max_retries=0,
+        warmup_connections=pool_size,
+    ) as pool:
+
+        async def caller():
+            for _ in range(requests):
+                async with pool.get_client() as client:
+                    await client.chat_completion(MESSAGES, max_tokens=1)
+
+        await asyncio.gather(*(caller() for _ in range(callers)))
+
+
+async def run(args):
+    server = StubServer(latency=args.latency)
+    base_url = await server.start()
+    rows = []
+
+    for name, scenario in (
+        ("client-per-call", client_per_call),
+        ("shared-pool", shared_pool),
+    ):
+        server.reset()
+        start = time.perf_counter()
+        await scenario(base_url, args.callers, args.requests, args.pool_size)
+        elapsed = time.perf_counter() - start
+        total = args.callers * args.requests
+        rows.append(
+            {
+                "mode": name,
+                "requests": total,
+                "req_per_s": total / elapsed,
+                "sockets_opened": server.accepted,
+                "peak_open_sockets": server.peak_open,
+            }
+        )
+
+    await server.stop()
+    print_table(
+        f"{args.callers} concurrent callers x {args.requests} requests "
+        f"(pool_size={args.pool_size}, latency={args.latency * 1000:.0f}ms)",
+        rows,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callers", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
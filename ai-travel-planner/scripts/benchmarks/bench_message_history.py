@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading conversation history from long conversations.
+
+Seeds conversations of increasing length (10k+ messages) and times
+fetching the last N turns three ways:
+
+  load_all  every message ordered by timestamp, sliced in Python
+            (what the eager ConversationORM.messages relationship did)
+  offset    ORDER BY timestamp LIMIT N OFFSET total - N
+  keyset    MessageRepository.recent(), seeking on (timestamp, id)
+
+It also times fetching a page from the middle of the conversation with
+OFFSET versus a keyset cursor. Keyset timings should stay flat as the
+conversation grows; the others grow linearly.
+
+Defaults to a temporary SQLite file; pass --database-url for PostgreSQL
+(run migrations first so the covering indexes exist).
+
+Usage:
+    python scripts/benchmarks/bench_message_history.py --sizes 1000 10000 50000
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from common import print_table
+from shared.models.base import MessageRole
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from shared.database import (
+    Base,
+    ConversationORM,
+    MessageORM,
+    MessageRepository,
+    NewMessage,
+    UserORM,
+)
+from shared.database.repository import encode_cursor
+
+
+async def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(samples)
+
+
+async def seed(session_factory, user_id, size):
+    async with session_factory() as session:
+        conversation = ConversationORM(user_id=user_id, total_tokens=0, total_cost=0.0)
+        session.add(conversation)
+        await session.commit()
+
+    start = datetime.now(timezone.utc) - timedelta(seconds=size)
+    messages = [
+        NewMessage(
+            conversation_id=conversation.id,
+            role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=f"第{i}轮：请帮我调整京都行程，把岚山安排在上午。",
+            tokens_used=30,
+            timestamp=start + timedelta(seconds=i),
+        )
+        for i in range(size)
+    ]
+    for offset in range(0, size, 5000):
+        async with session_factory() as session:
+            async with session.begin():
+                await MessageRepository(session).bulk_insert(
+                    messages[offset : offset + 5000]
+                )
+    return conversation.id, messages
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--last", type=int, default=20, help="Turns to load")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite+aiosqlite:///{Path(tmpdir.name) / 'bench.db'}"
+
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as session:
+        user = UserORM(
+            username=f"bench-{time.time_ns()}",
+            email=f"bench-{time.time_ns()}@example.com",
+        )
+        session.add(user)
+        await session.commit()
+
+    n = args.last
+    rows = []
+    conversation_ids = []
+    try:
+        for size in args.sizes:
+            conversation_id, messages = await seed(session_factory, user.id, size)
+            conversation_ids.append(conversation_id)
+            middle = messages[size // 2]
+            by_time = select(MessageORM).where(
+                MessageORM.conversation_id == conversation_id
+            )
+
+            async with session_factory() as session:
+                repo = MessageRepository(session)
+
+                async def load_all():
+                    result = await session.execute(
+                        by_time.order_by(MessageORM.timestamp)
+                    )
+                    return result.scalars().all()[-n:]
+
+                async def offset_last():
+                    result = await session.execute(
+                        by_time.order_by(MessageORM.timestamp).limit(n).offset(size - n)
+                    )
+                    return result.scalars().all()
+
+                async def keyset_last():
+                    return await repo.recent(conversation_id, n)
+
+                async def offset_middle():
+                    result = await session.execute(
+                        by_time.order_by(
+                            MessageORM.timestamp.desc(), MessageORM.id.desc()
+                        )
+                        .limit(n)
+                        .offset(size // 2)
+                    )
+                    return result.scalars().all()
+
+                cursor = encode_cursor(middle.timestamp, middle.id)
+
+                async def keyset_middle():
+                    return await repo.history(conversation_id, limit=n, before=cursor)
+
+                row = {"messages": size}
+                for name, func in (
+                    ("load_all_ms", load_all),
+                    ("offset_last_ms", offset_last),
+                    ("keyset_last_ms", keyset_last),
+                    ("offset_middle_ms", offset_middle),
+                    ("keyset_middle_ms", keyset_middle),
+                ):
+                    session.expunge_all()
+                    row[name] = await timed(func, args.repeat)
+                rows.append(row)
+    finally:
+        async with session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(MessageORM).where(
+                        MessageORM.conversation_id.in_(conversation_ids)
+                    )
+                )
+                await session.execute(
+                    delete(ConversationORM).where(ConversationORM.user_id == user.id)
+                )
+                await session.execute(delete(UserORM).where(UserORM.id == user.id))
+        await engine.dispose()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    print_table(
+        f"Last {n} turns / middle page of {n}, {engine.dialect.name}, "
+        f"median of {args.repeat}",
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark chat prompt rendering in the vLLM service PromptManager.
+
+Compares the original per-request string concatenation + str.format
+renderer against the compiled template renderer.
+
+Usage:
+    python scripts/benchmarks/bench_prompt_render.py --turns 50
+"""
+import argparse
+
+from common import load_vllm_service, print_table, time_per_call
+
+load_vllm_service()
+
+from vllm_service.models import ChatMessage  # noqa: E402
+from vllm_service.prompt_manager import PromptManager  # noqa: E402
+
+
+def legacy_format_chat_prompt(manager: PromptManager, messages) -> str:
+    """The renderer as it was before templates were compiled."""
+    system_message = ""
+    conversation_parts = []
+    for message in messages:
+        if message.role == "system":
+            system_message = message.content
+        elif message.role == "user":
+            conversation_parts.append(f"<|im_start|>user\n{message.content}<|im_end|>")
+        elif message.role == "assistant":
+            conversation_parts.append(
+                f"<|im_start|>assistant\n{message.content}<|im_end|>"
+            )
+
+    if not system_message:
+        system_message = manager.get_template("travel_system").template
+
+    conversation = "\n".join(conversation_parts)
+    return manager.get_template("qwen_chat").template.format(
+        system_message=system_message,
+        conversation=conversation,
+    )
+
+
+def build_history(turns: int):
+    """Build a realistic multi-turn travel conversation."""
+    messages = []
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        if role == "user":
+            content = f"第{i}轮：我想了解成都第{i}天的行程，包括美食、景点和交通安排。"
+        else:
+            content = (
+                f"第{i}轮回复：上午参观宽窄巷子和人民公园，中午品尝钟水饺、龙抄手，"
+                f"下午前往武侯祠和锦里，晚上在九眼桥附近吃火锅。地铁2号线可直达。" * 3
+            )
+        messages.append(ChatMessage(role=role, content=content))
+    return messages
+
+
+def run(turns: int, iterations: int):
+    history = build_history(turns)
+    manager = PromptManager()
+    legacy_manager = PromptManager()
+
+    assert manager.format_chat_prompt(history) == legacy_format_chat_prompt(
+        legacy_manager, history
+    )
+
+    rows = []
+
+    legacy = time_per_call(
+        lambda: legacy_format_chat_prompt(legacy_manager, history), iterations
+    )
+    rows.append({"renderer": "legacy", **legacy})
+
+    compiled = time_per_call(lambda: manager.format_chat_prompt(history), iterations)
+    rows.append({"renderer": "compiled", **compiled})
+
+    print_table(f"Chat prompt render cost per request ({turns}-turn history)", rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    for turns in args.turns:
+        run(turns, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
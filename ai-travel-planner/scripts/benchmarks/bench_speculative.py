@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compare streaming latency of a baseline vLLM service against one started
+with speculative decoding (e.g. VLLM_SPECULATIVE_METHOD=ngram).
+
+Prompts are itinerary rewrites that embed hotel names and addresses the
+model is expected to copy back, which is where prompt-lookup speculation
+pays off. For each server the script streams every prompt sequentially
+and reports time to first token, inter-token latency, end-to-end latency
+and decode tokens/s, then prints the acceptance stats from
+/v1/speculative/stats.
+
+Requires two live servers.
+
+Usage:
+    python scripts/benchmarks/bench_speculative.py \\
+        --baseline-url http://localhost:8001 --speculative-url http://localhost:8002
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from common import load_vllm_service, print_table
+
+load_vllm_service()
+
+from vllm_service.client import VLLMClient  # noqa: E402
+from vllm_service.models import ChatMessage  # noqa: E402
+
+HOTELS = [
+    ("北京王府井希尔顿酒店", "北京市东城区王府井东街8号"),
+    ("上海外滩华尔道夫酒店", "上海市黄浦区中山东一路2号"),
+    ("成都博舍酒店", "成都市锦江区笔帖式街81号"),
+    ("杭州西子湖四季酒店", "杭州市西湖区灵隐路5号"),
+    ("西安索菲特人民大厦", "西安市新城区东新街319号"),
+]
+
+
+def build_prompts(count: int):
+    prompts = []
+    for i in range(count):
+        lines = [
+            f"第{day + 1}天：入住{name}（地址：{address}），晚餐后返回酒店休息。"
+            for day, (name, address) in enumerate(
+                HOTELS[i % len(HOTELS) :] + HOTELS[: i % len(HOTELS)]
+            )
+        ]
+        prompts.append("请把下面的行程整理成表格，保留每家酒店的完整名称和地址：\n" + "\n".join(lines))
+    return prompts
+
+
+async def measure(base_url: str, prompts, model: str, max_tokens: int):
+    ttfts, itls, e2es, rates = [], [], [], []
+    async with VLLMClient(base_url=base_url, max_retries=0) as client:
+        for prompt in prompts:
+            start = time.perf_counter()
+            first = last = None
+            pieces = 0
+            async for chunk in client.chat_completion_stream(
+                [ChatMessage(role="user", content=prompt)],
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.0,
+            ):
+                if (
+                    not chunk.choices
+                    or not chunk.choices[0].delta
+                    or not chunk.choices[0].delta.content
+                ):
+                    continue
+                now = time.perf_counter()
+                if first is None:
+                    first = now
+                else:
+                    itls.append(now - last)
+                last = now
+                pieces += 1
+
+            end = time.perf_counter()
+            if first is None:
+                continue
+            ttfts.append(first - start)
+            e2es.append(end - start)
+            if pieces > 1 and end > first:
+                rates.append((pieces - 1) / (end - first))
+
+        try:
+            spec_stats = await client._make_request("GET", "/v1/speculative/stats")
+        except Exception:
+            spec_stats = {"enabled": False}
+
+    return {
+        "ttft_p50_ms": statistics.median(ttfts) * 1e3,
+        "itl_p50_ms": statistics.median(itls) * 1e3 if itls else 0.0,
+        "e2e_p50_ms": statistics.median(e2es) * 1e3,
+        "e2e_p95_ms": statistics.quantiles(e2es, n=20)[-1] * 1e3
+        if len(e2es) > 1
+        else e2es[0] * 1e3,
+        "chunks_per_sec": statistics.median(rates) if rates else 0.0,
+    }, spec_stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--baseline-url", default="http://localhost:8001")
+    parser.add_argument("--speculative-url", default="http://localhost:8002")
+    parser.add_argument("--model", default="default")
+    parser.add_argument("--prompts", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.prompts)
+
+    rows = []
+    spec_stats = None
+    for label, url in (
+        ("baseline", args.baseline_url),
+        ("speculative", args.speculative_url),
+    ):
+        result, stats = await measure(url, prompts, args.model, args.max_tokens)
+        rows.append({"server": label, **result})
+        if label == "speculative":
+            spec_stats = stats
+
+    print_table(f"Streaming latency, {len(prompts)} prompts, concurrency 1", rows)
+
+    if spec_stats and spec_stats.get("enabled"):
+        print_table(
+            "Speculative decoding",
+            [
+                {
+                    "method": spec_stats["method"],
+                    "num_speculative_tokens": spec_stats["num_speculative_tokens"],
+                    "acceptance_rate": spec_stats["acceptance_rate"] or 0.0,
+                    "mean_acceptance_length": spec_stats["mean_acceptance_length"]
+                    or 0.0,
+                }
+            ],
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark SSE frame encoding (server) and parsing (client) per core.
+
+Server: the original per-token path (build a pydantic chunk, .dict(),
+json.dumps into an f-string) against DeltaStreamTracker.update_sse with
+pre-serialised frame templates.
+
+Client: the original path (decode bytes to text, split lines, strip,
+json.loads) against SSEDecoder on raw bytes plus the configured codec.
+
+Usage:
+    python scripts/benchmarks/bench_sse_codec.py --tokens 2000
+"""
+import argparse
+import codecs
+import json
+from types import SimpleNamespace
+
+from common import load_vllm_service, print_table, time_per_call
+
+load_vllm_service()
+
+from vllm_service import sse_codec  # noqa: E402
+from vllm_service.models import (  # noqa: E402
+    ChatCompletionChoice,
+    ChatCompletionResponse,
+    DeltaMessage,
+)
+from vllm_service.sse_codec import SSEDecoder  # noqa: E402
+from vllm_service.stream_delta import DeltaStreamTracker  # noqa: E402
+
+TOKENS = ["北京", "的", "故宫", "建于", "明朝", "，", "是", "世界", "上", "最大", "的", "宫殿", "建筑群", "。"]
+
+
+def build_outputs(tokens: int):
+    """Cumulative RequestOutput-like objects, one per generated token."""
+    outputs, text = [], ""
+    for i in range(tokens):
+        text += TOKENS[i % len(TOKENS)]
+        finish_reason = "stop" if i == tokens - 1 else None
+        outputs.append(
+            SimpleNamespace(
+                prompt_token_ids=[0] * 32,
+                outputs=[
+                    SimpleNamespace(
+                        index=0,
+                        text=text,
+                        token_ids=[0] * (i + 1),
+                        finish_reason=finish_reason,
+                    )
+                ],
+            )
+        )
+    return outputs
+
+
+def legacy_encode(outputs):
+    """Per-token pydantic chunk + json.dumps, as the server did before."""
+    offset = 0
+    frames = []
+    for i, output in enumerate(outputs):
+        choice = output.outputs[0]
+        delta = choice.text[offset:]
+        offset = len(choice.text)
+        chunk = ChatCompletionResponse(
+            id="req-1",
+            object="chat.completion.chunk",
+            created=1,
+            model="qwen",
+            choices=[
+                ChatCompletionChoice(
+                    index=0,
+                    delta=DeltaMessage(
+                        role="assistant" if i == 0 else None, content=delta
+                    ),
+                    finish_reason=choice.finish_reason,
+                )
+            ],
+        )
+        frames.append(
+            f"data: {json.dumps(chunk.dict(exclude_none=True), ensure_ascii=False)}\n\n"
+        )
+    return frames
+
+
+def fast_encode(outputs):
+    tracker = DeltaStreamTracker(request_id="req-1", model_name="qwen", created=1)
+    return [tracker.update_sse(output) for output in outputs]
+
+
+def split_network_chunks(stream: bytes, size: int = 1024):
+    return [stream[i : i + size] for i in range(0, len(stream), size)]
+
+
+def legacy_decode(chunks):
+    """aiter_lines-style text decoding followed by strip + json.loads."""
+    results, pending = [], ""
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        pending += text_decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.startswith("data: "):
+                payload = line[6:].strip()
+                if payload and payload != "[DONE]":
+                    results.append(json.loads(payload))
+    return results
+
+
+def fast_decode(chunks):
+    decoder = SSEDecoder()
+    loads = sse_codec.loads
+    results = []
+    for chunk in chunks:
+        for payload in decoder.feed(chunk):
+            if payload != sse_codec.DONE_PAYLOAD:
+                results.append(loads(payload))
+    return results
+
+
+def frames_per_sec(timing, frames):
+    return frames / (timing["best_us"] / 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    outputs = build_outputs(args.tokens)
+    frames = len(outputs)
+    default_codec = sse_codec.get_json_codec().name
+
+    encode_rows = [
+        {
+            "path": "legacy (pydantic + json.dumps)",
+            "frames_per_sec": frames_per_sec(
+                time_per_call(lambda: legacy_encode(outputs), args.iterations), frames
+            ),
+        }
+    ]
+    for name in sse_codec.available_codecs():
+        sse_codec.set_json_codec(name)
+        encode_rows.append(
+            {
+                "path": f"update_sse ({name})",
+                "frames_per_sec": frames_per_sec(
+                    time_per_call(lambda: fast_encode(outputs), args.iterations), frames
+                ),
+            }
+        )
+    print_table(f"Server frame encoding, {frames} frames, single core", encode_rows)
+
+    stream = b"".join(fast_encode(outputs)) + sse_codec.SSE_DONE
+    chunks = split_network_chunks(stream)
+    assert legacy_decode(chunks) == fast_decode(chunks)
+
+    decode_rows = [
+        {
+            "path": "legacy (lines + json.loads)",
+            "frames_per_sec": frames_per_sec(
+                time_per_call(lambda: legacy_decode(chunks), args.iterations), frames
+            ),
+        }
+    ]
+    for name in sse_codec.available_codecs():
+        sse_codec.set_json_codec(name)
+        decode_rows.append(
+            {
+                "path": f"SSEDecoder ({name})",
+                "frames_per_sec": frames_per_sec(
+                    time_per_call(lambda: fast_decode(chunks), args.iterations), frames
+                ),
+            }
+        )
+    sse_codec.set_json_codec(default_codec)
+    print_table(f"Client SSE parsing, {frames} frames, single core", decode_rows)
+
+
+if __name__ == "__main__":
+    main()
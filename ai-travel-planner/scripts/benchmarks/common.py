@@ -0,0 +1,73 @@
+"""
+Shared helpers for benchmark scripts.
+"""
+import importlib.util
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+VLLM_SERVICE_DIR = project_root / "services" / "vllm-service"
+
+
+def load_vllm_service():
+    """
+    Import services/vllm-service as the ``vllm_service`` package.
+
+    The directory name contains a hyphen, so it cannot be imported directly.
+    """
+    if "vllm_service" in sys.modules:
+        return sys.modules["vllm_service"]
+
+    spec = importlib.util.spec_from_file_location(
+        "vllm_service",
+        VLLM_SERVICE_DIR / "__init__.py",
+        submodule_search_locations=[str(VLLM_SERVICE_DIR)],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["vllm_service"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_per_call(
+    func: Callable[[], object], iterations: int, repeat: int = 5
+) -> Dict[str, float]:
+    """Run func repeatedly and return per-call timings in microseconds."""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - start) / iterations * 1e6)
+
+    return {
+        "best_us": min(samples),
+        "median_us": statistics.median(samples),
+    }
+
+
+def print_table(title: str, rows: List[Dict[str, object]]) -> None:
+    """Print benchmark results as an aligned table."""
+    print(f"\n{title}")
+    if not rows:
+        return
+
+    columns = list(rows[0].keys())
+    widths = {
+        col: max(len(col), *(len(_fmt(row[col])) for row in rows)) for col in columns
+    }
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    for row in rows:
+        print("  ".join(_fmt(row[col]).ljust(widths[col]) for col in columns))
+
+
+def _fmt(value: object) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
@@ -0,0 +1,251 @@
+"""
+请求准入控制和排队
+Request admission control and queueing
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPriority(Enum):
+    """请求优先级枚举"""
+
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+    @property
+    def rank(self) -> int:
+        """排序值，越小越优先"""
+        return _PRIORITY_RANK[self]
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> "RequestPriority":
+        """解析优先级，未知值按普通优先级处理"""
+        try:
+            return cls(value) if value else cls.NORMAL
+        except ValueError:
+            return cls.NORMAL
+
+
+_PRIORITY_RANK = {
+    RequestPriority.HIGH: 0,
+    RequestPriority.NORMAL: 1,
+    RequestPriority.LOW: 2,
+}
+
+DEFAULT_QUEUE_DEADLINES = {
+    RequestPriority.HIGH: 60.0,
+    RequestPriority.NORMAL: 30.0,
+    RequestPriority.LOW: 10.0,
+}
+
+
+class AdmissionRejectedError(Exception):
+    """请求被拒绝（队列已满）"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionTimeoutError(AdmissionRejectedError):
+    """请求排队超过截止时间"""
+
+    pass
+
+
+@dataclass
+class AdmissionStats:
+    """准入统计信息"""
+
+    admitted_total: int = 0
+    rejected_total: int = 0
+    timed_out_total: int = 0
+    completed_total: int = 0
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    recent_wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    @property
+    def avg_wait_time(self) -> float:
+        """平均排队时间"""
+        if self.admitted_total == 0:
+            return 0.0
+        return self.total_wait_time / self.admitted_total
+
+    def wait_time_percentile(self, percentile: float) -> float:
+        """最近请求排队时间的分位数"""
+        if not self.recent_wait_times:
+            return 0.0
+        ordered = sorted(self.recent_wait_times)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    sequence: int
+    priority: RequestPriority = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class AdmissionTicket:
+    """准入凭证，请求结束时必须释放"""
+
+    def __init__(
+        self,
+        controller: "AdmissionController",
+        priority: RequestPriority,
+        wait_time: float,
+    ):
+        self.priority = priority
+        self.wait_time = wait_time
+        self.admitted_at = time.monotonic()
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        """释放并发槽位，可重复调用"""
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self.admitted_at)
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    限制同时提交给引擎的请求数，超出部分按优先级排队；
+    队列已满或排队超时的请求被拒绝，由调用方返回429。
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue_size: int = 512,
+        queue_deadlines: Optional[Dict[RequestPriority, float]] = None,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight必须大于0")
+
+        self.max_in_flight = max_in_flight
+        self.max_queue_size = max_queue_size
+        self.queue_deadlines = {**DEFAULT_QUEUE_DEADLINES, **(queue_deadlines or {})}
+        self.stats = AdmissionStats()
+
+        self._in_flight = 0
+        self._queue: List[_Waiter] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._avg_service_time = 1.0
+
+    @property
+    def in_flight(self) -> int:
+        """正在处理的请求数"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """排队中的请求数"""
+        return self._queued
+
+    def estimate_retry_after(self) -> float:
+        """估算客户端重试等待时间（秒）"""
+        estimate = self._avg_service_time * (self._queued + 1) / self.max_in_flight
+        return min(max(estimate, 1.0), 60.0)
+
+    async def acquire(
+        self, priority: RequestPriority = RequestPriority.NORMAL
+    ) -> AdmissionTicket:
+        """获取准入凭证，必要时排队等待"""
+        if self._in_flight < self.max_in_flight and self._queued == 0:
+            self._in_flight += 1
+            return self._admit(priority, 0.0)
+
+        if self._queued >= self.max_queue_size:
+            self.stats.rejected_total += 1
+            raise AdmissionRejectedError(
+                f"请求队列已满 ({self._queued}/{self.max_queue_size})",
+                retry_after=self.estimate_retry_after(),
+            )
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(
+            rank=priority.rank,
+            sequence=next(self._sequence),
+            priority=priority,
+            future=loop.create_future(),
+            enqueued_at=time.monotonic(),
+        )
+        heapq.heappush(self._queue, waiter)
+        self._queued += 1
+
+        deadline = self.queue_deadlines[priority]
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分配到槽位但调用方放弃，立即归还
+                self._release(0.0)
+            else:
+                waiter.future.cancel()
+                self._queued -= 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.stats.timed_out_total += 1
+            raise AdmissionTimeoutError(
+                f"请求排队超时 ({deadline:.1f}s)", retry_after=self.estimate_retry_after()
+            )
+
+        return self._admit(priority, time.monotonic() - waiter.enqueued_at)
+
+    def _admit(self, priority: RequestPriority, wait_time: float) -> AdmissionTicket:
+        self.stats.admitted_total += 1
+        self.stats.total_wait_time += wait_time
+        self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+        self.stats.recent_wait_times.append(wait_time)
+        return AdmissionTicket(self, priority, wait_time)
+
+    def _release(self, service_time: float):
+        self._in_flight -= 1
+        if service_time > 0:
+            self.stats.completed_total += 1
+            self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * service_time
+
+        while self._queue and self._in_flight < self.max_in_flight:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                # 已超时或取消的等待者
+                continue
+            self._queued -= 1
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取准入统计"""
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self._queued,
+            "max_queue_size": self.max_queue_size,
+            "admitted_total": self.stats.admitted_total,
+            "rejected_total": self.stats.rejected_total,
+            "timed_out_total": self.stats.timed_out_total,
+            "avg_wait_time": self.stats.avg_wait_time,
+            "max_wait_time": self.stats.max_wait_time,
+            "p50_wait_time": self.stats.wait_time_percentile(50),
+            "p99_wait_time": self.stats.wait_time_percentile(99),
+        }
@@ -0,0 +1,120 @@
+"""
+批处理JSONL编解码和断点文件
+Batch JSONL encoding and checkpoint files
+"""
+
+import logging
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Set, Union
+
+from . import sse_codec
+from .models import BatchRequestItem, BatchResult
+
+logger = logging.getLogger(__name__)
+
+BATCH_MEDIA_TYPE = "application/x-ndjson"
+
+BatchInput = Union[BatchRequestItem, Dict[str, Any]]
+
+
+def parse_batch_requests(
+    data: bytes, max_requests: Optional[int] = None
+) -> List[BatchRequestItem]:
+    """解析JSONL批处理请求，空行忽略，custom_id必须唯一"""
+    items: List[BatchRequestItem] = []
+    seen: Set[str] = set()
+
+    for line_number, line in enumerate(data.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = BatchRequestItem(**sse_codec.loads(line))
+        except Exception as e:
+            raise ValueError(f"第{line_number}行格式错误: {e}")
+
+        if item.custom_id in seen:
+            raise ValueError(f"第{line_number}行custom_id重复: {item.custom_id}")
+        seen.add(item.custom_id)
+        items.append(item)
+
+        if max_requests is not None and len(items) > max_requests:
+            raise ValueError(f"批处理请求超过{max_requests}行")
+
+    return items
+
+
+def load_batch_requests(path: Union[str, Path]) -> List[BatchRequestItem]:
+    """从JSONL文件读取批处理请求"""
+    return parse_batch_requests(Path(path).read_bytes())
+
+
+def encode_batch_requests(items: Iterable[BatchInput]) -> bytes:
+    """编码为JSONL请求体"""
+    lines = []
+    for item in items:
+        if isinstance(item, BatchRequestItem):
+            item = item.dict(exclude_none=True)
+        lines.append(sse_codec.dumps(item))
+    return b"\n".join(lines) + b"\n"
+
+
+def encode_batch_result(result: BatchResult) -> bytes:
+    """编码为一行JSONL结果"""
+    return sse_codec.dumps(result.dict(exclude_none=True)) + b"\n"
+
+
+class BatchCheckpoint:
+    """
+    批处理断点文件
+
+    结果以JSONL逐行追加并立即刷新，中断后重新运行时跳过已成功的custom_id，
+    失败的请求会被重试。进程崩溃留下的不完整末行被忽略。
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file: Optional[IO[bytes]] = None
+
+    def completed_ids(self) -> Set[str]:
+        """已成功完成的custom_id"""
+        if not self.path.exists():
+            return set()
+
+        completed: Set[str] = set()
+        for line in self.path.read_bytes().splitlines():
+            if not line.strip():
+                continue
+            try:
+                data = sse_codec.loads(line)
+            except ValueError:
+                logger.warning(f"断点文件 {self.path} 中存在不完整的行，已忽略")
+                continue
+            if data.get("response") is not None and not data.get("error"):
+                completed.add(data["custom_id"])
+        return completed
+
+    def append(self, result: BatchResult):
+        """追加一条结果"""
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            needs_newline = self.path.exists() and self._ends_without_newline()
+            self._file = open(self.path, "ab")
+            if needs_newline:
+                self._file.write(b"\n")
+
+        self._file.write(encode_batch_result(result))
+        self._file.flush()
+
+    def _ends_without_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(0, 2)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, 2)
+            return f.read(1) != b"\n"
+
+    def close(self):
+        """关闭断点文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -5,13 +5,33 @@ vLLM client wrapper and connection management
 
 import asyncio
 import logging
-from typing import Optional, Dict, Any, List, AsyncGenerator, Union
+import time
+from pathlib import Path
+from typing import (
+    Optional, Dict, Any, List, AsyncGenerator, AsyncIterator, Callable, Iterable,
+    Tuple, Union
+)
 import httpx
-import json
 from contextlib import asynccontextmanager
 
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from . import sse_codec
+from .batch import (
+    BATCH_MEDIA_TYPE,
+    BatchCheckpoint,
+    BatchInput,
+    encode_batch_requests,
+    load_batch_requests,
+)
 from .config import VLLMConfig, GenerationConfig
 from .models import (
+    BatchRequestItem,
+    BatchResult,
     ChatCompletionRequest, 
     ChatCompletionResponse, 
     ChatMessage,
@@ -20,13 +40,17 @@ from .models import (
     ModelInfo,
     HealthResponse
 )
+from .sse_codec import DONE_PAYLOAD, SSEDecoder
 
 logger = logging.getLogger(__name__)
 
 
 class VLLMConnectionError(Exception):
     """vLLM连接错误"""
-    pass
+    
+    def __init__(self, message: str = "", status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class VLLMTimeoutError(Exception):
@@ -43,23 +67,29 @@ class VLLMClient:
         api_key: Optional[str] = None,
         timeout: float = 300.0,
         max_retries: int = 3,
-        retry_delay: float = 1.0
+        retry_delay: float = 1.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20
     ):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.timeout = timeout
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
         
-        # HTTP客户端配置
-        self._client: Optional[httpx.AsyncClient] = None
-        self._headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "vLLM-Client/1.0.0"
-        }
+        # HTTP客户端配置，外部传入的共享客户端由调用方负责关闭
+        self._client: Optional[httpx.AsyncClient] = http_client
+        self._owns_client = http_client is None
+        self._headers = build_headers(api_key)
         
-        if self.api_key:
-            self._headers["Authorization"] = f"Bearer {self.api_key}"
+        # 连接错误和请求成功回调（连接池用于健康统计）
+        self.on_transport_error: Optional[Callable[[Exception], None]] = None
+        self.on_request_success: Optional[Callable[[], None]] = None
     
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -73,25 +103,36 @@ class VLLMClient:
     async def _ensure_client(self):
         """确保HTTP客户端已初始化"""
         if self._client is None:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(self.timeout),
+            self._client = create_http_client(
+                timeout=self.timeout,
                 headers=self._headers,
-                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                http2=self.http2,
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections
             )
+            self._owns_client = True
     
     async def close(self):
         """关闭客户端连接"""
         if self._client:
-            await self._client.aclose()
+            if self._owns_client:
+                await self._client.aclose()
             self._client = None
     
+    def _notify_transport_error(self, error: Exception):
+        if self.on_transport_error:
+            self.on_transport_error(error)
+    
+    def _notify_request_success(self):
+        if self.on_request_success:
+            self.on_request_success()
+    
     async def _make_request(
         self, 
         method: str, 
         endpoint: str, 
-        data: Optional[Dict[str, Any]] = None,
-        stream: bool = False
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+        data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """发送HTTP请求"""
         await self._ensure_client()
         
@@ -99,21 +140,10 @@ class VLLMClient:
         
         for attempt in range(self.max_retries + 1):
             try:
-                if stream:
-                    # 流式请求
-                    async with self._client.stream(
-                        method, url, json=data
-                    ) as response:
-                        response.raise_for_status()
-                        async for line in response.aiter_lines():
-                            if line.startswith("data: "):
-                                yield line[6:]  # 移除"data: "前缀
-                    return
-                else:
-                    # 普通请求
-                    response = await self._client.request(method, url, json=data)
-                    response.raise_for_status()
-                    return response.json()
+                response = await self._client.request(method, url, json=data)
+                self._notify_request_success()
+                response.raise_for_status()
+                return response.json()
                     
             except httpx.TimeoutException as e:
                 if attempt == self.max_retries:
@@ -126,14 +156,72 @@ class VLLMClient:
                     logger.warning(f"服务器错误，重试 {attempt + 1}/{self.max_retries}: {e}")
                     await asyncio.sleep(self.retry_delay * (2 ** attempt))
                     continue
-                raise VLLMConnectionError(f"HTTP错误 {e.response.status_code}: {e.response.text}")
+                raise VLLMConnectionError(
+                    f"HTTP错误 {e.response.status_code}: {e.response.text}",
+                    status_code=e.response.status_code
+                )
                 
             except Exception as e:
+                if isinstance(e, httpx.TransportError):
+                    self._notify_transport_error(e)
                 if attempt == self.max_retries:
                     raise VLLMConnectionError(f"连接错误: {e}")
                 logger.warning(f"连接错误，重试 {attempt + 1}/{self.max_retries}: {e}")
                 await asyncio.sleep(self.retry_delay * (2 ** attempt))
     
+    async def _stream_request(
+        self, 
+        method: str, 
+        endpoint: str, 
+        data: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """发送流式HTTP请求，返回SSE事件的data负载（原始字节）"""
+        await self._ensure_client()
+        
+        url = f"{self.base_url}{endpoint}"
+        
+        for attempt in range(self.max_retries + 1):
+            received = False
+            try:
+                async with self._client.stream(
+                    method, url, json=data
+                ) as response:
+                    self._notify_request_success()
+                    response.raise_for_status()
+                    decoder = SSEDecoder()
+                    async for raw in response.aiter_bytes():
+                        for payload in decoder.feed(raw):
+                            received = True
+                            yield payload
+                    for payload in decoder.flush():
+                        yield payload
+                return
+                    
+            except httpx.TimeoutException as e:
+                # 已经收到数据后不再重试，避免重复输出
+                if received or attempt == self.max_retries:
+                    raise VLLMTimeoutError(f"请求超时: {e}")
+                logger.warning(f"请求超时，重试 {attempt + 1}/{self.max_retries}")
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code >= 500 and attempt < self.max_retries:
+                    logger.warning(f"服务器错误，重试 {attempt + 1}/{self.max_retries}: {e}")
+                    await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                    continue
+                await e.response.aread()
+                raise VLLMConnectionError(
+                    f"HTTP错误 {e.response.status_code}: {e.response.text}",
+                    status_code=e.response.status_code
+                )
+                
+            except httpx.TransportError as e:
+                self._notify_transport_error(e)
+                if received or attempt == self.max_retries:
+                    raise VLLMConnectionError(f"连接错误: {e}")
+                logger.warning(f"连接错误，重试 {attempt + 1}/{self.max_retries}: {e}")
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+    
     async def health_check(self) -> HealthResponse:
         """健康检查"""
         try:
@@ -190,24 +278,88 @@ class VLLMClient:
         )
         
         try:
-            async for line in self._make_request(
-                "POST", "/v1/chat/completions", request.dict(), stream=True
+            async for payload in self._stream_request(
+                "POST", "/v1/chat/completions", request.dict()
             ):
-                if line.strip() == "[DONE]":
+                if payload == DONE_PAYLOAD:
                     break
-                if line.strip():
+                if payload.strip():
                     try:
-                        data = json.loads(line)
-                        if "error" in data:
-                            raise VLLMConnectionError(f"流式响应错误: {data['error']}")
-                        yield ChatCompletionResponse(**data)
-                    except json.JSONDecodeError:
-                        logger.warning(f"无法解析流式响应: {line}")
+                        data = sse_codec.loads(payload)
+                    except ValueError:
+                        logger.warning(f"无法解析流式响应: {payload!r}")
                         continue
+                    if "error" in data:
+                        raise VLLMConnectionError(f"流式响应错误: {data['error']}")
+                    yield ChatCompletionResponse(**data)
         except Exception as e:
             logger.error(f"流式聊天完成请求失败: {e}")
             raise
     
+    async def batch_generate(
+        self,
+        requests: Union[str, Path, Iterable[BatchInput]],
+        checkpoint_path: Optional[Union[str, Path]] = None,
+        chunk_size: int = 1000
+    ) -> AsyncGenerator[BatchResult, None]:
+        """
+        批量聊天完成
+        
+        requests可以是JSONL文件路径，或BatchRequestItem/字典的序列。请求按
+        chunk_size分段提交到/v1/batch，结果按完成顺序返回。指定checkpoint_path时
+        每条结果立即写入断点文件，重新运行会跳过已成功的custom_id。
+        """
+        if isinstance(requests, (str, Path)):
+            requests = load_batch_requests(requests)
+        items = [
+            item if isinstance(item, BatchRequestItem) else BatchRequestItem(**item)
+            for item in requests
+        ]
+        
+        checkpoint = BatchCheckpoint(checkpoint_path) if checkpoint_path else None
+        if checkpoint:
+            completed = checkpoint.completed_ids()
+            if completed:
+                logger.info(f"从断点文件恢复，跳过 {len(completed)} 个已完成的请求")
+            items = [item for item in items if item.custom_id not in completed]
+        
+        try:
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start:start + chunk_size]
+                async for result in self._batch_request(encode_batch_requests(chunk)):
+                    if checkpoint:
+                        checkpoint.append(result)
+                    yield result
+        finally:
+            if checkpoint:
+                checkpoint.close()
+    
+    async def _batch_request(self, body: bytes) -> AsyncGenerator[BatchResult, None]:
+        """提交一段批处理请求并逐行读取结果，中断后由断点文件续跑，不在此重试"""
+        await self._ensure_client()
+        
+        try:
+            async with self._client.stream(
+                "POST",
+                f"{self.base_url}/v1/batch",
+                content=body,
+                headers={"Content-Type": BATCH_MEDIA_TYPE}
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    raise VLLMConnectionError(
+                        f"HTTP错误 {response.status_code}: {response.text}",
+                        status_code=response.status_code
+                    )
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield BatchResult(**sse_codec.loads(line))
+        except httpx.TimeoutException as e:
+            raise VLLMTimeoutError(f"批处理请求超时: {e}")
+        except httpx.TransportError as e:
+            self._notify_transport_error(e)
+            raise VLLMConnectionError(f"批处理连接错误: {e}")
+    
     async def generate(
         self, 
         prompt: str,
@@ -269,8 +421,49 @@ class VLLMClient:
             raise
 
 
+def build_headers(api_key: Optional[str] = None) -> Dict[str, str]:
+    """构建请求头"""
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "vLLM-Client/1.0.0"
+    }
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers
+
+
+def create_http_client(
+    timeout: float = 300.0,
+    headers: Optional[Dict[str, str]] = None,
+    http2: bool = True,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20
+) -> httpx.AsyncClient:
+    """
+    创建HTTP客户端
+
+    安装h2时启用HTTP/2，HTTPS端点通过ALPN协商后多个请求复用同一连接；
+    明文HTTP端点仍使用HTTP/1.1长连接。
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout),
+        headers=headers,
+        http2=http2 and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+    )
+
+
 class VLLMConnectionPool:
-    """vLLM连接池"""
+    """
+    vLLM连接池
+
+    每个base_url共享一个HTTP传输（连接池），并用信号量限制并发请求数。
+    连续出现连接错误时重建传输，淘汰可能已失效的连接。旧传输上的请求结束后
+    才关闭旧传输，最长等待retire_grace_period（不小于timeout，默认等于timeout）。
+    """
     
     def __init__(
         self, 
@@ -278,78 +471,260 @@ class VLLMConnectionPool:
         api_key: Optional[str] = None,
         pool_size: int = 10,
         timeout: float = 300.0,
-        max_retries: int = 3
+        max_retries: int = 3,
+        http2: bool = True,
+        max_keepalive_connections: Optional[int] = None,
+        warmup_connections: int = 0,
+        unhealthy_threshold: int = 3,
+        health_check_interval: Optional[float] = None,
+        retire_grace_period: Optional[float] = None
     ):
         self.base_url = base_url
         self.api_key = api_key
         self.pool_size = pool_size
         self.timeout = timeout
         self.max_retries = max_retries
+        self.http2 = http2
+        self.max_keepalive_connections = max_keepalive_connections or pool_size
+        self.warmup_connections = min(warmup_connections, pool_size)
+        self.unhealthy_threshold = unhealthy_threshold
+        self.health_check_interval = health_check_interval
+        # 宽限期短于请求超时会中断仍在进行的长生成和流式请求
+        self.retire_grace_period = max(retire_grace_period or 0.0, timeout)
         
-        self._pool: List[VLLMClient] = []
-        self._available: asyncio.Queue = asyncio.Queue(maxsize=pool_size)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._client: Optional[VLLMClient] = None
+        self._semaphore = asyncio.Semaphore(pool_size)
+        self._lock = asyncio.Lock()
         self._initialized = False
+        self._closed = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._transport_in_flight: Dict[httpx.AsyncClient, int] = {}
+        self._retired: Dict[httpx.AsyncClient, Tuple[asyncio.Event, asyncio.Task]] = {}
+        
+        # 统计信息
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.recycle_count = 0
+        self.created_at: Optional[float] = None
+    
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
     
     async def initialize(self):
         """初始化连接池"""
         if self._initialized:
             return
         
-        for _ in range(self.pool_size):
-            client = VLLMClient(
-                base_url=self.base_url,
-                api_key=self.api_key,
-                timeout=self.timeout,
-                max_retries=self.max_retries
-            )
-            self._pool.append(client)
-            await self._available.put(client)
+        async with self._lock:
+            if self._initialized:
+                return
+            
+            self._build_transport()
+            self._initialized = True
+            self._closed = False
+            
+            if self.warmup_connections:
+                await self.warmup(self.warmup_connections)
+            
+            if self.health_check_interval:
+                self._health_task = asyncio.create_task(self._health_loop())
         
-        self._initialized = True
-        logger.info(f"vLLM连接池初始化完成，池大小: {self.pool_size}")
+        logger.info(
+            f"vLLM连接池初始化完成，并发上限: {self.pool_size}, "
+            f"HTTP/2: {self.http2 and HTTP2_AVAILABLE}"
+        )
+    
+    def _build_transport(self):
+        """创建共享传输和绑定的客户端"""
+        self._http = create_http_client(
+            timeout=self.timeout,
+            headers=build_headers(self.api_key),
+            http2=self.http2,
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.max_keepalive_connections
+        )
+        self._client = VLLMClient(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+            http_client=self._http
+        )
+        self._client.on_transport_error = self._on_transport_error
+        self._client.on_request_success = self._on_request_success
+        self.created_at = time.time()
+        self.consecutive_failures = 0
+    
+    async def warmup(self, connections: int):
+        """并发发起健康检查以预先建立连接"""
+        url = f"{self.base_url.rstrip('/')}/health"
+        
+        async def probe():
+            try:
+                response = await self._http.get(url)
+                return response.status_code < 500
+            except httpx.HTTPError:
+                return False
+        
+        results = await asyncio.gather(*(probe() for _ in range(connections)))
+        logger.info(f"连接预热完成: {sum(results)}/{connections}")
+    
+    def _on_transport_error(self, error: Exception):
+        """记录连接错误，超过阈值时重建传输"""
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.unhealthy_threshold:
+            logger.warning(f"连续 {self.consecutive_failures} 次连接错误，重建连接池: {error}")
+            self.recycle()
+    
+    def _on_request_success(self):
+        """请求成功，连续错误计数清零"""
+        self.consecutive_failures = 0
+    
+    def recycle(self):
+        """用新传输替换当前传输，旧传输上的请求结束后关闭"""
+        if not self._initialized or self._closed:
+            return
+        
+        old_http = self._http
+        self._build_transport()
+        self.recycle_count += 1
+        
+        if old_http is not None:
+            drained = asyncio.Event()
+            if not self._transport_in_flight.get(old_http):
+                drained.set()
+            task = asyncio.get_running_loop().create_task(
+                self._close_later(old_http, drained)
+            )
+            self._retired[old_http] = (drained, task)
+    
+    async def _close_later(self, http: httpx.AsyncClient, drained: asyncio.Event):
+        try:
+            await asyncio.wait_for(drained.wait(), timeout=self.retire_grace_period)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"旧传输上仍有 {self._transport_in_flight.get(http, 0)} 个请求，"
+                f"宽限期 {self.retire_grace_period:.0f}s 已到，强制关闭"
+            )
+        self._retired.pop(http, None)
+        await http.aclose()
+    
+    def _release_transport(self, http: httpx.AsyncClient):
+        """请求结束，旧传输上的请求全部结束时通知关闭"""
+        remaining = self._transport_in_flight[http] - 1
+        if remaining:
+            self._transport_in_flight[http] = remaining
+            return
+        del self._transport_in_flight[http]
+        retired = self._retired.get(http)
+        if retired:
+            retired[0].set()
+    
+    async def _health_loop(self):
+        """定期健康检查"""
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                response = await self._http.get(f"{self.base_url.rstrip('/')}/health")
+                response.raise_for_status()
+                self.consecutive_failures = 0
+            except httpx.HTTPError as e:
+                self._on_transport_error(e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"连接池健康检查失败: {e}")
     
     @asynccontextmanager
-    async def get_client(self) -> VLLMClient:
-        """获取客户端连接"""
+    async def get_client(self) -> AsyncIterator[VLLMClient]:
+        """获取客户端，并发数超过上限时等待"""
         if not self._initialized:
             await self.initialize()
         
-        # 从池中获取客户端
-        client = await self._available.get()
-        try:
-            yield client
-        finally:
-            # 归还客户端到池中
-            await self._available.put(client)
+        async with self._semaphore:
+            # 记录请求所用的传输，重建后旧传输等这些请求结束再关闭
+            http = self._http
+            self.in_flight += 1
+            self._transport_in_flight[http] = self._transport_in_flight.get(http, 0) + 1
+            try:
+                yield self._client
+            finally:
+                self.in_flight -= 1
+                self._release_transport(http)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        return {
+            "base_url": self.base_url,
+            "max_concurrency": self.pool_size,
+            "in_flight": self.in_flight,
+            "http2": self.http2 and HTTP2_AVAILABLE,
+            "consecutive_failures": self.consecutive_failures,
+            "recycle_count": self.recycle_count,
+            "transport_age": time.time() - self.created_at if self.created_at else None,
+        }
     
     async def close(self):
         """关闭连接池"""
-        for client in self._pool:
-            await client.close()
-        self._pool.clear()
+        self._closed = True
+        
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        
+        retired = list(self._retired.items())
+        self._retired.clear()
+        for http, (_, task) in retired:
+            task.cancel()
+            await http.aclose()
+        
+        if self._http:
+            await self._http.aclose()
+        self._http = None
+        self._client = None
         self._initialized = False
         logger.info("vLLM连接池已关闭")
 
 
-# 全局连接池实例
-_global_pool: Optional[VLLMConnectionPool] = None
+# 全局连接池实例，每个base_url一个
+_global_pools: Dict[str, VLLMConnectionPool] = {}
+
+
+async def get_global_pool(
+    base_url: str = "http://localhost:8001",
+    **kwargs
+) -> VLLMConnectionPool:
+    """获取指定base_url的全局连接池"""
+    pool = _global_pools.get(base_url)
+    if pool is None:
+        pool = VLLMConnectionPool(base_url=base_url, **kwargs)
+        _global_pools[base_url] = pool
+    await pool.initialize()
+    return pool
 
 
-async def get_vllm_client() -> VLLMClient:
+@asynccontextmanager
+async def get_vllm_client(
+    base_url: str = "http://localhost:8001"
+) -> AsyncIterator[VLLMClient]:
     """获取全局vLLM客户端"""
-    global _global_pool
-    
-    if _global_pool is None:
-        _global_pool = VLLMConnectionPool()
-        await _global_pool.initialize()
-    
-    return _global_pool.get_client()
+    pool = await get_global_pool(base_url)
+    async with pool.get_client() as client:
+        yield client
 
 
 async def close_global_pool():
     """关闭全局连接池"""
-    global _global_pool
-    
-    if _global_pool:
-        await _global_pool.close()
-        _global_pool = None
\ No newline at end of file
+    pools = list(_global_pools.values())
+    _global_pools.clear()
+    for pool in pools:
+        await pool.close()
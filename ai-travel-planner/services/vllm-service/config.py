@@ -53,6 +53,15 @@ class VLLMConfig(BaseModel):
         description="启用前缀缓存"
     )
     
+    prompt_layout: str = Field(
+        default="legacy",
+        description="聊天提示词布局: legacy, stable_prefix"
+    )
+    default_prompt_family: str = Field(
+        default="travel_system",
+        description="默认的共享系统提示词模板"
+    )
+    
     # 性能优化
     swap_space: int = Field(
         default=4,
@@ -63,6 +72,158 @@ class VLLMConfig(BaseModel):
         description="CPU卸载内存大小(GB)"
     )
     
+    # 多LoRA
+    enable_lora: bool = Field(
+        default=False,
+        description="启用多LoRA适配器服务，请求的model字段选择适配器"
+    )
+    lora_modules_dir: Optional[str] = Field(
+        default=None,
+        description="LoRA适配器目录，每个包含adapter_config.json的子目录为一个适配器"
+    )
+    max_loras: int = Field(
+        default=4,
+        ge=1,
+        description="同一批次中可同时使用的适配器数(GPU驻留)"
+    )
+    max_cpu_loras: Optional[int] = Field(
+        default=None,
+        description="CPU缓存的适配器数，超出时按LRU换出，默认与max_loras一致"
+    )
+    max_lora_rank: int = Field(
+        default=16,
+        description="适配器的最大rank"
+    )
+    
+    # 上下文预算
+    enable_context_budget: bool = Field(
+        default=True,
+        description="按max_model_len为输出预留max_tokens，超出时截断最早的对话"
+    )
+    context_truncation_policy: str = Field(
+        default="drop_oldest",
+        description="超出上下文时的处理策略: drop_oldest, summarize, error"
+    )
+    context_budget_margin: int = Field(
+        default=16,
+        description="按轮次估算token数的安全余量"
+    )
+    context_summary_max_tokens: int = Field(
+        default=256,
+        description="summarize策略下摘要的最大token数"
+    )
+    
+    # 投机解码
+    speculative_method: Optional[str] = Field(
+        default=None,
+        description="投机解码方式: ngram(提示词查找), draft_model(草稿模型), eagle；为空时不启用"
+    )
+    speculative_model: Optional[str] = Field(
+        default=None,
+        description="草稿模型名称或路径，draft_model和eagle方式必填"
+    )
+    num_speculative_tokens: int = Field(
+        default=5,
+        ge=1,
+        description="每步推测的token数"
+    )
+    ngram_prompt_lookup_max: int = Field(
+        default=4,
+        ge=1,
+        description="n-gram提示词查找的最大匹配长度"
+    )
+    ngram_prompt_lookup_min: int = Field(
+        default=1,
+        ge=1,
+        description="n-gram提示词查找的最小匹配长度"
+    )
+    speculative_draft_tensor_parallel_size: Optional[int] = Field(
+        default=None,
+        description="草稿模型张量并行大小"
+    )
+    speculative_disable_by_batch_size: Optional[int] = Field(
+        default=None,
+        description="排队请求数超过该值时暂停投机解码，高负载下投机收益下降"
+    )
+    
+    # 准入控制
+    max_concurrent_requests: Optional[int] = Field(
+        default=None,
+        description="最大并发请求数，默认与max_num_seqs一致"
+    )
+    max_queue_size: int = Field(
+        default=512,
+        description="最大排队请求数，超出时返回429"
+    )
+    queue_deadlines: Dict[str, float] = Field(
+        default_factory=lambda: {"high": 60.0, "normal": 30.0, "low": 10.0},
+        description="各优先级请求的最长排队时间(秒)"
+    )
+    disconnect_check_interval: float = Field(
+        default=0.5,
+        description="非流式请求检测客户端断开的间隔(秒)，断开后中止引擎生成"
+    )
+    non_streaming_early_return: bool = Field(
+        default=True,
+        description="非流式请求在所有候选出现finish_reason后立即返回"
+    )
+    
+    # 批处理
+    batch_max_requests: int = Field(
+        default=50000,
+        description="单次批处理请求的最大行数"
+    )
+    batch_max_in_flight: Optional[int] = Field(
+        default=None,
+        description="批处理同时提交到引擎的请求数上限，默认与max_num_seqs一致"
+    )
+    
+    # 启动预热
+    enable_warmup: bool = Field(
+        default=True,
+        description="引擎启动后先用模板提示词预热，预热完成后才报告就绪"
+    )
+    warmup_requests: int = Field(
+        default=8,
+        ge=0,
+        description="预热请求数"
+    )
+    warmup_max_tokens: int = Field(
+        default=16,
+        ge=1,
+        description="每个预热请求生成的token数"
+    )
+    warmup_timeout: float = Field(
+        default=300.0,
+        description="预热超时时间(秒)，超时后直接报告就绪"
+    )
+
+    # 结果缓存
+    enable_response_cache: bool = Field(
+        default=True,
+        description="启用推理结果缓存"
+    )
+    response_cache_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description="结果缓存字节预算"
+    )
+    response_cache_ttl: float = Field(
+        default=3600.0,
+        description="结果缓存过期时间(秒)"
+    )
+    enable_semantic_cache: bool = Field(
+        default=False,
+        description="启用语义相似度缓存"
+    )
+    semantic_cache_model: str = Field(
+        default="BAAI/bge-small-zh-v1.5",
+        description="语义缓存使用的向量模型"
+    )
+    semantic_cache_threshold: float = Field(
+        default=0.95,
+        description="语义缓存命中的相似度阈值"
+    )
+    
     # 安全配置
     disable_log_stats: bool = Field(
         default=False,
@@ -83,6 +244,39 @@ class VLLMConfig(BaseModel):
         description="服务模型名称"
     )
     
+    def speculative_config(self) -> Optional[Dict[str, Any]]:
+        """构建vLLM引擎的speculative_config，未启用时返回None"""
+        method = self.speculative_method
+        if not method:
+            return None
+        
+        config: Dict[str, Any] = {
+            "method": method,
+            "num_speculative_tokens": self.num_speculative_tokens,
+        }
+        
+        if method == "ngram":
+            if self.ngram_prompt_lookup_min > self.ngram_prompt_lookup_max:
+                raise ValueError(
+                    f"ngram_prompt_lookup_min({self.ngram_prompt_lookup_min}) "
+                    f"不能大于ngram_prompt_lookup_max({self.ngram_prompt_lookup_max})"
+                )
+            config["prompt_lookup_max"] = self.ngram_prompt_lookup_max
+            config["prompt_lookup_min"] = self.ngram_prompt_lookup_min
+        else:
+            if not self.speculative_model:
+                raise ValueError(f"投机解码方式 {method} 需要设置speculative_model")
+            config["model"] = self.speculative_model
+            if self.speculative_draft_tensor_parallel_size:
+                config["draft_tensor_parallel_size"] = (
+                    self.speculative_draft_tensor_parallel_size
+                )
+        
+        if self.speculative_disable_by_batch_size:
+            config["disable_by_batch_size"] = self.speculative_disable_by_batch_size
+        
+        return config
+    
     @classmethod
     def from_env(cls) -> "VLLMConfig":
         """从环境变量创建配置"""
@@ -96,6 +290,82 @@ class VLLMConfig(BaseModel):
             max_num_seqs=int(os.getenv("VLLM_MAX_NUM_SEQS", "256")),
             gpu_memory_utilization=float(os.getenv("VLLM_GPU_MEMORY_UTILIZATION", "0.8")),
             enable_prefix_caching=os.getenv("VLLM_ENABLE_PREFIX_CACHING", "true").lower() == "true",
+            enable_lora=os.getenv("VLLM_ENABLE_LORA", "false").lower() == "true",
+            lora_modules_dir=os.getenv("VLLM_LORA_MODULES_DIR"),
+            max_loras=int(os.getenv("VLLM_MAX_LORAS", "4")),
+            max_cpu_loras=(
+                int(os.getenv("VLLM_MAX_CPU_LORAS"))
+                if os.getenv("VLLM_MAX_CPU_LORAS") else None
+            ),
+            max_lora_rank=int(os.getenv("VLLM_MAX_LORA_RANK", "16")),
+            enable_context_budget=(
+                os.getenv("VLLM_ENABLE_CONTEXT_BUDGET", "true").lower() == "true"
+            ),
+            context_truncation_policy=os.getenv(
+                "VLLM_CONTEXT_TRUNCATION_POLICY", "drop_oldest"
+            ),
+            context_budget_margin=int(os.getenv("VLLM_CONTEXT_BUDGET_MARGIN", "16")),
+            context_summary_max_tokens=int(
+                os.getenv("VLLM_CONTEXT_SUMMARY_MAX_TOKENS", "256")
+            ),
+            speculative_method=os.getenv("VLLM_SPECULATIVE_METHOD") or None,
+            speculative_model=os.getenv("VLLM_SPECULATIVE_MODEL"),
+            num_speculative_tokens=int(os.getenv("VLLM_NUM_SPECULATIVE_TOKENS", "5")),
+            ngram_prompt_lookup_max=int(os.getenv("VLLM_NGRAM_PROMPT_LOOKUP_MAX", "4")),
+            ngram_prompt_lookup_min=int(os.getenv("VLLM_NGRAM_PROMPT_LOOKUP_MIN", "1")),
+            speculative_draft_tensor_parallel_size=(
+                int(os.getenv("VLLM_SPECULATIVE_DRAFT_TP_SIZE"))
+                if os.getenv("VLLM_SPECULATIVE_DRAFT_TP_SIZE") else None
+            ),
+            speculative_disable_by_batch_size=(
+                int(os.getenv("VLLM_SPECULATIVE_DISABLE_BY_BATCH_SIZE"))
+                if os.getenv("VLLM_SPECULATIVE_DISABLE_BY_BATCH_SIZE") else None
+            ),
+            max_concurrent_requests=(
+                int(os.getenv("VLLM_MAX_CONCURRENT_REQUESTS"))
+                if os.getenv("VLLM_MAX_CONCURRENT_REQUESTS") else None
+            ),
+            max_queue_size=int(os.getenv("VLLM_MAX_QUEUE_SIZE", "512")),
+            queue_deadlines={
+                "high": float(os.getenv("VLLM_QUEUE_DEADLINE_HIGH", "60")),
+                "normal": float(os.getenv("VLLM_QUEUE_DEADLINE_NORMAL", "30")),
+                "low": float(os.getenv("VLLM_QUEUE_DEADLINE_LOW", "10")),
+            },
+            disconnect_check_interval=float(
+                os.getenv("VLLM_DISCONNECT_CHECK_INTERVAL", "0.5")
+            ),
+            non_streaming_early_return=(
+                os.getenv("VLLM_NON_STREAMING_EARLY_RETURN", "true").lower() == "true"
+            ),
+            batch_max_requests=int(os.getenv("VLLM_BATCH_MAX_REQUESTS", "50000")),
+            batch_max_in_flight=(
+                int(os.getenv("VLLM_BATCH_MAX_IN_FLIGHT"))
+                if os.getenv("VLLM_BATCH_MAX_IN_FLIGHT") else None
+            ),
+            enable_warmup=os.getenv("VLLM_ENABLE_WARMUP", "true").lower() == "true",
+            warmup_requests=int(os.getenv("VLLM_WARMUP_REQUESTS", "8")),
+            warmup_max_tokens=int(os.getenv("VLLM_WARMUP_MAX_TOKENS", "16")),
+            warmup_timeout=float(os.getenv("VLLM_WARMUP_TIMEOUT", "300")),
+            prompt_layout=os.getenv("VLLM_PROMPT_LAYOUT", "legacy"),
+            default_prompt_family=os.getenv(
+                "VLLM_DEFAULT_PROMPT_FAMILY", "travel_system"
+            ),
+            enable_response_cache=(
+                os.getenv("VLLM_ENABLE_RESPONSE_CACHE", "true").lower() == "true"
+            ),
+            response_cache_max_bytes=int(
+                os.getenv("VLLM_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+            ),
+            response_cache_ttl=float(os.getenv("VLLM_RESPONSE_CACHE_TTL", "3600")),
+            enable_semantic_cache=(
+                os.getenv("VLLM_ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+            ),
+            semantic_cache_model=os.getenv(
+                "VLLM_SEMANTIC_CACHE_MODEL", "BAAI/bge-small-zh-v1.5"
+            ),
+            semantic_cache_threshold=float(
+                os.getenv("VLLM_SEMANTIC_CACHE_THRESHOLD", "0.95")
+            ),
             api_key=os.getenv("VLLM_API_KEY"),
             served_model_name=os.getenv("VLLM_SERVED_MODEL_NAME"),
         )
@@ -0,0 +1,236 @@
+"""
+上下文token预算和历史截断
+Tokenizer-aware context budgeting and history truncation
+"""
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, List, Optional
+
+from .models import ChatMessage
+from .prompt_manager import ConversationRenderer, PromptManager, RenderedPrompt
+
+logger = logging.getLogger(__name__)
+
+
+class ContextBudgetError(ValueError):
+    """提示词无法放入上下文窗口"""
+
+    pass
+
+
+class TruncationPolicy(Enum):
+    """超出预算时的历史处理策略"""
+
+    DROP_OLDEST = "drop_oldest"  # 丢弃最早的轮次
+    SUMMARIZE = "summarize"  # 丢弃最早的轮次，并以摘要形式保留要点
+    ERROR = "error"  # 直接拒绝请求
+
+
+class TokenCounter:
+    """
+    带缓存的token计数器
+
+    按文本缓存token数，同一会话的历史轮次在后续请求中不再重复分词，
+    每个请求只需为新增的轮次分词。
+    """
+
+    def __init__(self, encode: Callable[[str], List[int]], max_cache_size: int = 4096):
+        self._encode = encode
+        self.max_cache_size = max_cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def encode(self, text: str) -> List[int]:
+        """分词"""
+        return self._encode(text)
+
+    def count(self, text: str) -> int:
+        """统计token数"""
+        cache = self._cache
+        count = cache.get(text)
+        if count is not None:
+            cache.move_to_end(text)
+            self.hits += 1
+            return count
+
+        self.misses += 1
+        count = len(self._encode(text))
+        cache[text] = count
+        if len(cache) > self.max_cache_size:
+            cache.popitem(last=False)
+        return count
+
+
+@dataclass
+class BudgetedPrompt:
+    """按预算处理后的提示词"""
+
+    rendered: RenderedPrompt
+    prompt_token_ids: List[int]
+    dropped_messages: int = 0
+    summarized: bool = False
+
+    @property
+    def prompt_tokens(self) -> int:
+        """提示词token数"""
+        return len(self.prompt_token_ids)
+
+
+class ContextBudget:
+    """
+    上下文预算
+
+    为输出预留max_tokens，按轮次估算提示词token数，超出预算时按策略
+    处理最早的对话轮次。最新的用户消息及其后的消息始终保留。最终提示词只分词一次，
+    token ID直接交给引擎，引擎不再重复分词，返回的usage即为准确值。
+    """
+
+    SUMMARY_HEADER = "以下是较早对话的摘要："
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        prompt_manager: PromptManager,
+        max_model_len: int,
+        policy: TruncationPolicy = TruncationPolicy.DROP_OLDEST,
+        margin: int = 16,
+        summary_max_tokens: int = 256,
+        summary_snippet_chars: int = 80,
+    ):
+        self.counter = counter
+        self.prompt_manager = prompt_manager
+        self.max_model_len = max_model_len
+        self.policy = policy
+        self.margin = margin
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_snippet_chars = summary_snippet_chars
+
+        # 统计信息
+        self.truncated_requests = 0
+        self.dropped_messages = 0
+
+    def prompt_budget(self, max_tokens: int) -> int:
+        """提示词可用的token数"""
+        return self.max_model_len - max_tokens - self.margin
+
+    def _turn_cost(self, message: ChatMessage) -> int:
+        # 轮次之间以换行连接
+        return (
+            self.counter.count(
+                ConversationRenderer.render_turn(message.role, message.content)
+            )
+            + 1
+        )
+
+    def fit(
+        self,
+        messages: List[ChatMessage],
+        max_tokens: int,
+        family: Optional[str] = None,
+        continue_final_message: bool = False,
+    ) -> BudgetedPrompt:
+        """按预算渲染提示词"""
+        budget = self.prompt_budget(max_tokens)
+        if budget <= 0:
+            raise ContextBudgetError(
+                f"max_tokens({max_tokens}) 超出上下文长度 {self.max_model_len}"
+            )
+
+        system_messages = [m for m in messages if m.role == "system"]
+        turns = [m for m in messages if m.role in ("user", "assistant")]
+
+        # 系统消息和模板部分的开销，与对话轮次分开缓存
+        base = self.counter.count(
+            self.prompt_manager.render_chat_prompt(system_messages, family=family).text
+        )
+        costs = [self._turn_cost(m) for m in turns]
+        total = base + sum(costs)
+
+        dropped = 0
+        summary: Optional[str] = None
+        if total > budget:
+            if self.policy == TruncationPolicy.ERROR:
+                raise ContextBudgetError(f"提示词约 {total} 个token，超出预算 {budget}")
+
+            # 最新的用户消息及其后的消息不能丢弃
+            protected = max(
+                (i for i, m in enumerate(turns) if m.role == "user"), default=0
+            )
+            while total > budget and dropped < protected:
+                total -= costs[dropped]
+                dropped += 1
+            # 不留下没有对应提问的assistant回复
+            while dropped < protected and turns[dropped].role != "user":
+                total -= costs[dropped]
+                dropped += 1
+
+            if total > budget:
+                raise ContextBudgetError(f"最新消息约 {total} 个token，超出预算 {budget}")
+
+            if self.policy == TruncationPolicy.SUMMARIZE and dropped:
+                summary = self._summarize(
+                    turns[:dropped], min(self.summary_max_tokens, budget - total)
+                )
+
+            self.truncated_requests += 1
+            self.dropped_messages += dropped
+            logger.info(f"上下文超出预算，丢弃最早的 {dropped} 条消息，剩余约 {total} 个token")
+
+        if dropped:
+            kept = turns[dropped:]
+            if summary:
+                # 摘要放在保留的第一条用户消息之前，不改变系统消息和共享前缀
+                first = kept[0]
+                kept = [
+                    first.copy(update={"content": f"{summary}\n\n{first.content}"})
+                ] + kept[1:]
+            messages = system_messages + kept
+
+        rendered = self.prompt_manager.render_chat_prompt(
+            messages, family=family, continue_final_message=continue_final_message
+        )
+        return BudgetedPrompt(
+            rendered=rendered,
+            prompt_token_ids=self.counter.encode(rendered.text),
+            dropped_messages=dropped,
+            summarized=summary is not None,
+        )
+
+    def _summarize(self, dropped: List[ChatMessage], max_tokens: int) -> Optional[str]:
+        """
+        抽取式摘要：每条被丢弃的消息保留开头片段，从最近的消息开始加入直到用完预算
+
+        不额外调用模型生成摘要，避免在请求路径上增加一次生成。
+        """
+        used = self.counter.count(self.SUMMARY_HEADER) + 2
+        lines: List[str] = []
+        for message in reversed(dropped):
+            speaker = "用户" if message.role == "user" else "助手"
+            snippet = message.content.strip().replace("\n", " ")
+            if len(snippet) > self.summary_snippet_chars:
+                snippet = snippet[: self.summary_snippet_chars] + "…"
+            line = f"- {speaker}: {snippet}"
+            cost = self.counter.count(line) + 1
+            if used + cost > max_tokens:
+                break
+            used += cost
+            lines.append(line)
+
+        if not lines:
+            return None
+        return "\n".join([self.SUMMARY_HEADER] + lines[::-1])
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "max_model_len": self.max_model_len,
+            "policy": self.policy.value,
+            "truncated_requests": self.truncated_requests,
+            "dropped_messages": self.dropped_messages,
+            "token_cache_hits": self.counter.hits,
+            "token_cache_misses": self.counter.misses,
+        }
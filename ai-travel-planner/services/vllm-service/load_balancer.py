@@ -0,0 +1,452 @@
+"""
+vLLM多副本负载均衡客户端
+Multi-replica load balancing client for vLLM
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Set, Union
+
+from .client import VLLMClient, VLLMConnectionError, VLLMTimeoutError
+from .models import BatchResult
+
+logger = logging.getLogger(__name__)
+
+# 完整生成的非流式接口，只有这些请求计入延迟窗口并可对冲
+GENERATION_ENDPOINTS = frozenset({"/v1/chat/completions", "/v1/completions"})
+
+# 摘除时长指数退避的最大指数，之后由max_ejection_time封顶
+MAX_EJECTION_EXPONENT = 16
+
+
+class LoadBalancingStrategy(str, Enum):
+    """负载均衡策略"""
+
+    LEAST_OUTSTANDING = "least_outstanding"
+    POWER_OF_TWO = "power_of_two"
+
+
+@dataclass
+class ReplicaState:
+    """单个副本的状态"""
+
+    base_url: str
+    client: VLLMClient
+    outstanding: int = 0
+    ewma_latency: Optional[float] = None
+    # 非流式生成的完整延迟，决定对冲等待时间
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=256))
+    # 流式请求的首个数据延迟，与完整延迟分开统计
+    ttft_latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=256))
+    consecutive_failures: int = 0
+    ejections: int = 0
+    # 上次请求成功以来的连续摘除次数，决定摘除时长
+    ejection_streak: int = 0
+    ejected_until: Optional[float] = None
+    total_requests: int = 0
+    total_failures: int = 0
+
+    def is_available(self, now: float) -> bool:
+        """是否可以接收请求"""
+        return self.ejected_until is None or now >= self.ejected_until
+
+    @property
+    def score(self) -> float:
+        """负载评分，越低越好"""
+        return (self.outstanding + 1) * (self.ewma_latency or 1e-3)
+
+    def percentile(
+        self, q: float, window: Optional[Deque[float]] = None
+    ) -> Optional[float]:
+        """延迟分位数，默认使用非流式生成的延迟窗口"""
+        window = self.latencies if window is None else window
+        if not window:
+            return None
+        ordered = sorted(window)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def record_success(
+        self, latency: float, window: Optional[Deque[float]] = None, alpha: float = 0.2
+    ):
+        """记录成功请求，window为延迟计入的窗口，健康检查等轻量请求不计入"""
+        if window is not None:
+            window.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+        self.consecutive_failures = 0
+        self.ejection_streak = 0
+
+    def reinstate(self):
+        """恢复副本，连续摘除次数保留到真实请求成功后才清零"""
+        self.consecutive_failures = 0
+        self.ejected_until = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            "base_url": self.base_url,
+            "available": self.is_available(time.time()),
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "p95_latency": self.percentile(0.95),
+            "p95_ttft": self.percentile(0.95, self.ttft_latencies),
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "ejection_streak": self.ejection_streak,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+        }
+
+
+class MultiEndpointVLLMClient(VLLMClient):
+    """
+    多副本vLLM客户端
+
+    按最少未完成请求数或二选一（power of two choices）选择副本，失败时切换到
+    其他副本；连续失败的副本被摘除，健康检查通过后恢复。非流式生成请求超过
+    副本非流式生成的p95延迟仍未返回时，向另一个副本发送对冲请求，取先返回的结果。
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        api_key: Optional[str] = None,
+        timeout: float = 300.0,
+        strategy: Union[
+            LoadBalancingStrategy, str
+        ] = LoadBalancingStrategy.LEAST_OUTSTANDING,
+        max_attempts: Optional[int] = None,
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        max_ejection_time: float = 300.0,
+        health_check_interval: Optional[float] = 10.0,
+        enable_hedging: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+    ):
+        if not base_urls:
+            raise ValueError("至少需要一个副本地址")
+
+        super().__init__(
+            base_url=base_urls[0], api_key=api_key, timeout=timeout, max_retries=0
+        )
+
+        self.strategy = LoadBalancingStrategy(strategy)
+        self.max_attempts = max_attempts or len(base_urls)
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.health_check_interval = health_check_interval
+        self.enable_hedging = enable_hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+        # 副本客户端不重试，由负载均衡层切换副本
+        self.replicas: List[ReplicaState] = [
+            ReplicaState(
+                base_url=url.rstrip("/"),
+                client=VLLMClient(
+                    base_url=url, api_key=api_key, timeout=timeout, max_retries=0
+                ),
+            )
+            for url in base_urls
+        ]
+
+        self._health_task: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.failovers = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    async def _ensure_client(self):
+        """启动后台健康检查"""
+        if self.health_check_interval and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """关闭所有副本连接"""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        for replica in self.replicas:
+            await replica.client.close()
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """连接错误、超时、5xx和429可以切换副本重试"""
+        if isinstance(error, VLLMTimeoutError):
+            return True
+        if isinstance(error, VLLMConnectionError):
+            status_code = error.status_code
+            return status_code is None or status_code >= 500 or status_code == 429
+        return False
+
+    def _select(self, exclude: Set[str]) -> Optional[ReplicaState]:
+        """选择副本"""
+        now = time.time()
+        candidates = [
+            r
+            for r in self.replicas
+            if r.base_url not in exclude and r.is_available(now)
+        ]
+        if not candidates:
+            # 所有副本都被摘除时，退而选择未尝试过的副本
+            candidates = [r for r in self.replicas if r.base_url not in exclude]
+        if not candidates:
+            return None
+
+        if self.strategy == LoadBalancingStrategy.POWER_OF_TWO and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+            return min(candidates, key=lambda r: r.score)
+
+        return min(candidates, key=lambda r: (r.outstanding, r.ewma_latency or 0.0))
+
+    def _record_failure(self, replica: ReplicaState, error: Exception):
+        """记录失败，连续失败达到阈值时摘除副本"""
+        replica.total_failures += 1
+        replica.consecutive_failures += 1
+        if (
+            replica.consecutive_failures >= self.failure_threshold
+            and replica.is_available(time.time())
+        ):
+            replica.ejections += 1
+            replica.ejection_streak += 1
+            exponent = min(replica.ejection_streak - 1, MAX_EJECTION_EXPONENT)
+            duration = min(self.ejection_time * 2**exponent, self.max_ejection_time)
+            replica.ejected_until = time.time() + duration
+            logger.warning(
+                f"副本 {replica.base_url} 连续失败 {replica.consecutive_failures} 次，"
+                f"摘除 {duration:.0f}s: {error}"
+            )
+
+    def _hedge_delay(self, replica: ReplicaState, endpoint: str) -> Optional[float]:
+        """对冲等待时间，只对冲非流式生成请求，样本不足时不对冲"""
+        if not self.enable_hedging or len(self.replicas) < 2:
+            return None
+        if endpoint not in GENERATION_ENDPOINTS:
+            return None
+        if len(replica.latencies) < self.hedge_min_samples:
+            return None
+        return replica.percentile(self.hedge_percentile)
+
+    async def _send(
+        self,
+        replica: ReplicaState,
+        method: str,
+        endpoint: str,
+        data: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """向指定副本发送请求"""
+        replica.outstanding += 1
+        replica.total_requests += 1
+        start = time.perf_counter()
+        try:
+            result = await replica.client._make_request(method, endpoint, data)
+        except (VLLMConnectionError, VLLMTimeoutError) as e:
+            if self._is_retryable(e):
+                self._record_failure(replica, e)
+            raise
+        else:
+            window = replica.latencies if endpoint in GENERATION_ENDPOINTS else None
+            replica.record_success(time.perf_counter() - start, window)
+            return result
+        finally:
+            replica.outstanding -= 1
+
+    async def _send_hedged(
+        self,
+        primary: ReplicaState,
+        method: str,
+        endpoint: str,
+        data: Optional[Dict[str, Any]],
+        tried: Set[str],
+    ) -> Dict[str, Any]:
+        """发送请求，主副本超过p95延迟未返回时向备用副本发送对冲请求"""
+        delay = self._hedge_delay(primary, endpoint)
+        if delay is None:
+            return await self._send(primary, method, endpoint, data)
+
+        first = asyncio.create_task(self._send(primary, method, endpoint, data))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            backup = self._select(exclude=tried)
+            if backup is None:
+                return await first
+
+            tried.add(backup.base_url)
+            self.hedged_requests += 1
+            second = asyncio.create_task(self._send(backup, method, endpoint, data))
+            pending = {first, second}
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _make_request(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """选择副本发送请求，失败时切换副本"""
+        await self._ensure_client()
+
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_attempts):
+            replica = self._select(exclude=tried)
+            if replica is None:
+                break
+            tried.add(replica.base_url)
+
+            try:
+                return await self._send_hedged(replica, method, endpoint, data, tried)
+            except (VLLMConnectionError, VLLMTimeoutError) as e:
+                if not self._is_retryable(e):
+                    raise
+                last_error = e
+                self.failovers += 1
+                logger.warning(
+                    f"副本 {replica.base_url} 请求失败，"
+                    f"切换副本 {attempt + 1}/{self.max_attempts}: {e}"
+                )
+
+        raise last_error or VLLMConnectionError("没有可用的vLLM副本")
+
+    async def _stream_request(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        """选择副本发送流式请求，收到数据前失败时切换副本"""
+        await self._ensure_client()
+
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_attempts):
+            replica = self._select(exclude=tried)
+            if replica is None:
+                break
+            tried.add(replica.base_url)
+
+            received = False
+            replica.outstanding += 1
+            replica.total_requests += 1
+            start = time.perf_counter()
+            try:
+                async for line in replica.client._stream_request(
+                    method, endpoint, data
+                ):
+                    if not received:
+                        # 流式请求按首个数据的延迟统计，不影响非流式请求的对冲
+                        received = True
+                        replica.record_success(
+                            time.perf_counter() - start, replica.ttft_latencies
+                        )
+                    yield line
+                return
+            except (VLLMConnectionError, VLLMTimeoutError) as e:
+                if not self._is_retryable(e):
+                    raise
+                self._record_failure(replica, e)
+                if received:
+                    raise
+                last_error = e
+                self.failovers += 1
+                logger.warning(
+                    f"副本 {replica.base_url} 流式请求失败，"
+                    f"切换副本 {attempt + 1}/{self.max_attempts}: {e}"
+                )
+            finally:
+                replica.outstanding -= 1
+
+        raise last_error or VLLMConnectionError("没有可用的vLLM副本")
+
+    async def _batch_request(self, body: bytes) -> AsyncGenerator[BatchResult, None]:
+        """整段批处理提交到一个副本，中断后由断点文件续跑"""
+        await self._ensure_client()
+
+        replica = self._select(exclude=set())
+        if replica is None:
+            raise VLLMConnectionError("没有可用的vLLM副本")
+
+        replica.outstanding += 1
+        replica.total_requests += 1
+        try:
+            async for result in replica.client._batch_request(body):
+                yield result
+        except (VLLMConnectionError, VLLMTimeoutError) as e:
+            if self._is_retryable(e):
+                self._record_failure(replica, e)
+            raise
+        finally:
+            replica.outstanding -= 1
+
+    async def check_replicas(self) -> Dict[str, bool]:
+        """对所有副本执行健康检查，恢复通过检查的副本"""
+
+        async def probe(replica: ReplicaState) -> bool:
+            try:
+                health = await replica.client.health_check()
+                healthy = health.status == "healthy"
+            except Exception as e:
+                logger.debug(f"副本 {replica.base_url} 健康检查失败: {e}")
+                healthy = False
+
+            if healthy:
+                if not replica.is_available(time.time()):
+                    logger.info(f"副本 {replica.base_url} 健康检查通过，恢复服务")
+                replica.reinstate()
+            else:
+                self._record_failure(replica, VLLMConnectionError("健康检查失败"))
+            return healthy
+
+        results = await asyncio.gather(*(probe(r) for r in self.replicas))
+        return {r.base_url: ok for r, ok in zip(self.replicas, results)}
+
+    async def _health_loop(self):
+        """后台健康检查"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_replicas()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"副本健康检查异常: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取负载均衡统计"""
+        return {
+            "strategy": self.strategy.value,
+            "failovers": self.failovers,
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "replicas": [r.to_dict() for r in self.replicas],
+        }
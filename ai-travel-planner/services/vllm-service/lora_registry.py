@@ -0,0 +1,229 @@
+"""
+LoRA适配器注册表
+LoRA adapter registry for multi-adapter serving
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+ADAPTER_CONFIG = "adapter_config.json"
+
+
+@dataclass
+class LoRAAdapter:
+    """已注册的LoRA适配器"""
+
+    name: str
+    path: str
+    lora_id: int
+    rank: Optional[int] = None
+    base_model: Optional[str] = None
+    version: Optional[str] = None
+    created: int = 0
+    requests: int = 0
+    last_used: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "lora_id": self.lora_id,
+            "rank": self.rank,
+            "base_model": self.base_model,
+            "version": self.version,
+            "requests": self.requests,
+        }
+
+
+def same_base_model(a: str, b: str) -> bool:
+    """按模型名比较基础模型，忽略组织前缀、本地目录和大小写"""
+    return Path(a.rstrip("/")).name.lower() == Path(b.rstrip("/")).name.lower()
+
+
+def adapter_version(adapter_dir: Path) -> str:
+    """根据适配器目录中文件的大小和修改时间计算版本"""
+    digest = hashlib.sha256()
+    for path in sorted(adapter_dir.iterdir()):
+        if path.is_file():
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+class LoRARegistry:
+    """
+    LoRA适配器注册表
+
+    从目录中发现适配器（每个包含adapter_config.json的子目录为一个适配器，
+    目录名即请求中的model名称），为每个适配器分配稳定的lora_id。
+    基础模型与服务的base_model不一致的适配器不注册。适配器文件被原地覆盖时
+    分配新的lora_id，vLLM按lora_id缓存权重，沿用旧ID会继续使用旧权重。
+    vLLM按LRU在GPU(max_loras)和CPU(max_cpu_loras)缓存之间换入换出适配器，
+    注册表按相同的LRU顺序记录哪些适配器仍驻留在CPU缓存中。
+    """
+
+    def __init__(
+        self,
+        adapters_dir: Optional[Union[str, Path]] = None,
+        max_resident: int = 4,
+        max_rank: int = 16,
+        base_model: Optional[str] = None,
+    ):
+        self.adapters_dir = Path(adapters_dir) if adapters_dir else None
+        self.max_resident = max_resident
+        self.max_rank = max_rank
+        self.base_model = base_model
+        self.adapters: Dict[str, LoRAAdapter] = {}
+        self._resident: "OrderedDict[str, None]" = OrderedDict()
+        self._next_id = 1
+
+        # 统计信息
+        self.loads = 0
+        self.evictions = 0
+
+    def scan(self) -> List[str]:
+        """扫描适配器目录，注册新增的适配器并移除已删除的，返回当前的适配器名称"""
+        if not self.adapters_dir or not self.adapters_dir.is_dir():
+            return list(self.adapters)
+
+        found = set()
+        for config_path in sorted(self.adapters_dir.glob(f"*/{ADAPTER_CONFIG}")):
+            adapter_dir = config_path.parent
+            name = adapter_dir.name
+            try:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    adapter_config = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法读取LoRA适配器配置 {config_path}: {e}")
+                continue
+
+            rank = adapter_config.get("r")
+            if rank and rank > self.max_rank:
+                logger.warning(
+                    f"LoRA适配器 {name} 的rank {rank} 超过max_lora_rank {self.max_rank}，已跳过"
+                )
+                continue
+
+            base_model = adapter_config.get("base_model_name_or_path")
+            if (
+                self.base_model
+                and base_model
+                and not same_base_model(base_model, self.base_model)
+            ):
+                logger.warning(
+                    f"LoRA适配器 {name} 基于 {base_model}，与服务的基础模型 "
+                    f"{self.base_model} 不一致，已跳过"
+                )
+                continue
+
+            found.add(name)
+            version = adapter_version(adapter_dir)
+            existing = self.adapters.get(name)
+            if existing and existing.version != version:
+                logger.info(f"LoRA适配器 {name} 已更新，重新注册")
+                self.unregister(name)
+                existing = None
+            if existing is None:
+                self.register(
+                    name,
+                    str(adapter_dir),
+                    rank=rank,
+                    base_model=base_model,
+                    version=version,
+                )
+
+        for name in list(self.adapters):
+            if name not in found:
+                self.unregister(name)
+
+        return list(self.adapters)
+
+    def register(
+        self,
+        name: str,
+        path: str,
+        rank: Optional[int] = None,
+        base_model: Optional[str] = None,
+        version: Optional[str] = None,
+    ) -> LoRAAdapter:
+        """注册适配器，重复注册同名适配器时保留原lora_id"""
+        existing = self.adapters.get(name)
+        lora_id = existing.lora_id if existing else self._next_id
+        if not existing:
+            self._next_id += 1
+
+        adapter = LoRAAdapter(
+            name=name,
+            path=path,
+            lora_id=lora_id,
+            rank=rank,
+            base_model=base_model,
+            version=version,
+            created=int(time.time()),
+        )
+        self.adapters[name] = adapter
+        logger.info(f"注册LoRA适配器: {name} (id={lora_id}, path={path})")
+        return adapter
+
+    def unregister(self, name: str) -> bool:
+        """移除适配器"""
+        if self.adapters.pop(name, None) is None:
+            return False
+        self._resident.pop(name, None)
+        logger.info(f"移除LoRA适配器: {name}")
+        return True
+
+    def get(self, name: str) -> Optional[LoRAAdapter]:
+        """按名称查找适配器"""
+        return self.adapters.get(name)
+
+    def acquire(self, name: str) -> Optional[LoRAAdapter]:
+        """请求使用适配器，更新LRU顺序；未注册时返回None"""
+        adapter = self.adapters.get(name)
+        if adapter is None:
+            return None
+
+        adapter.requests += 1
+        adapter.last_used = time.time()
+
+        resident = self._resident
+        if name in resident:
+            resident.move_to_end(name)
+        else:
+            self.loads += 1
+            resident[name] = None
+            if len(resident) > self.max_resident:
+                evicted, _ = resident.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"LoRA适配器 {evicted} 被换出")
+        return adapter
+
+    def is_resident(self, name: str) -> bool:
+        """适配器是否仍驻留在缓存中"""
+        return name in self._resident
+
+    def list_adapters(self) -> List[LoRAAdapter]:
+        """列出所有适配器"""
+        return list(self.adapters.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "adapters": len(self.adapters),
+            "max_resident": self.max_resident,
+            "resident": list(self._resident),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "details": [
+                {**adapter.to_dict(), "resident": self.is_resident(adapter.name)}
+                for adapter in self.adapters.values()
+            ],
+        }
@@ -0,0 +1,341 @@
+"""
+推理指标采集和Prometheus导出
+Inference metrics collection and Prometheus exposition
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+    from prometheus_client.core import GaugeMetricFamily
+
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 延迟分桶（秒）
+TTFT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INTER_TOKEN_BUCKETS = (
+    0.005,
+    0.01,
+    0.02,
+    0.03,
+    0.05,
+    0.075,
+    0.1,
+    0.15,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+E2E_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+THROUGHPUT_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+# 请求结束状态
+STATUS_FINISHED = "finished"
+STATUS_CANCELLED = "cancelled"
+STATUS_ERROR = "error"
+STATUS_REJECTED = "rejected"
+STATUS_CACHED = "cached"
+
+# 不是服务模型或已注册适配器的model值统一使用的标签，避免标签基数无限增长
+MODEL_LABEL_OTHER = "other"
+
+# vLLM引擎上报到默认registry的投机解码计数器（不含_total后缀）
+SPEC_DECODE_COUNTERS = {
+    "drafts": "vllm:spec_decode_num_drafts",
+    "draft_tokens": "vllm:spec_decode_num_draft_tokens",
+    "accepted_tokens": "vllm:spec_decode_num_accepted_tokens",
+}
+
+
+def collect_spec_decode_stats(registry=None) -> Dict[str, Any]:
+    """
+    汇总引擎的投机解码计数，计算接受率和平均接受长度
+
+    接受率 = 被接受的推测token数 / 推测token数；
+    平均接受长度 = 1 + 被接受的推测token数 / 推测次数，即每个解码步平均产出的token数。
+    引擎未开启统计(disable_log_stats)时计数均为0。
+    """
+    totals = {key: 0.0 for key in SPEC_DECODE_COUNTERS}
+    if PROMETHEUS_AVAILABLE:
+        keys = {name: key for key, name in SPEC_DECODE_COUNTERS.items()}
+        for family in (registry or REGISTRY).collect():
+            key = keys.get(family.name)
+            if key is None:
+                continue
+            totals[key] += sum(
+                sample.value
+                for sample in family.samples
+                if sample.name == family.name + "_total"
+            )
+
+    drafts, draft_tokens, accepted = (
+        totals["drafts"],
+        totals["draft_tokens"],
+        totals["accepted_tokens"],
+    )
+    return {
+        **totals,
+        "acceptance_rate": accepted / draft_tokens if draft_tokens else None,
+        "mean_acceptance_length": 1 + accepted / drafts if drafts else None,
+    }
+
+
+class SpecDecodeCollector:
+    """在抓取时把引擎的投机解码计数转换为接受率指标"""
+
+    def __init__(self, namespace: str, source_registry=None):
+        self.namespace = namespace
+        self.source_registry = source_registry
+
+    def collect(self):
+        stats = collect_spec_decode_stats(self.source_registry)
+        for name, documentation, value in (
+            ("spec_decode_acceptance_rate", "投机token接受率", stats["acceptance_rate"]),
+            (
+                "spec_decode_mean_acceptance_length",
+                "每个解码步平均产出的token数",
+                stats["mean_acceptance_length"],
+            ),
+        ):
+            if value is not None:
+                yield GaugeMetricFamily(
+                    f"{self.namespace}_{name}", documentation, value=value
+                )
+
+
+class InferenceMetrics:
+    """
+    推理指标
+
+    按模型和提示词模板统计首token延迟、token间延迟、吞吐、排队时间、
+    token数和请求结束状态。每个实例使用独立的CollectorRegistry，
+    未安装prometheus_client时所有记录操作为空操作。
+    """
+
+    def __init__(self, namespace: str = "vllm_service", registry=None):
+        self.namespace = namespace
+        self.enabled = PROMETHEUS_AVAILABLE
+        if not self.enabled:
+            logger.warning("未安装prometheus_client，指标采集已禁用")
+            self.registry = None
+            return
+
+        self.registry = registry or CollectorRegistry()
+        labels = ["model", "template"]
+
+        self.time_to_first_token = Histogram(
+            "time_to_first_token_seconds",
+            "首个token延迟",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+            buckets=TTFT_BUCKETS,
+        )
+        self.inter_token_latency = Histogram(
+            "inter_token_latency_seconds",
+            "相邻token间延迟",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+            buckets=INTER_TOKEN_BUCKETS,
+        )
+        self.e2e_latency = Histogram(
+            "request_latency_seconds",
+            "请求端到端延迟",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+            buckets=E2E_BUCKETS,
+        )
+        self.queue_wait = Histogram(
+            "queue_wait_seconds",
+            "准入队列等待时间",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+            buckets=QUEUE_BUCKETS,
+        )
+        self.tokens_per_second = Histogram(
+            "generation_tokens_per_second",
+            "单请求生成速度",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+            buckets=THROUGHPUT_BUCKETS,
+        )
+        self.prompt_tokens = Counter(
+            "prompt_tokens",
+            "提示词token数",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.completion_tokens = Counter(
+            "completion_tokens",
+            "生成token数",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.cancelled_tokens = Counter(
+            "cancelled_completion_tokens",
+            "已取消请求浪费的生成token数",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.requests = Counter(
+            "requests",
+            "按结束状态统计的请求数",
+            labels + ["status"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.in_flight = Gauge(
+            "requests_in_flight",
+            "进行中的请求数",
+            labels,
+            namespace=namespace,
+            registry=self.registry,
+        )
+
+    def enable_spec_decode(self, source_registry=None):
+        """导出投机解码接受率，source_registry默认为引擎使用的全局registry"""
+        if self.enabled:
+            self.registry.register(SpecDecodeCollector(self.namespace, source_registry))
+
+    def start_request(
+        self, model: str, template: Optional[str] = None
+    ) -> "RequestMetrics":
+        """开始跟踪一个请求"""
+        return RequestMetrics(self, model, template or "none")
+
+    def record_request(self, model: str, template: Optional[str], status: str):
+        """记录未进入生成阶段的请求（拒绝、缓存命中）"""
+        if self.enabled:
+            self.requests.labels(model, template or "none", status).inc()
+
+    def render(self) -> bytes:
+        """导出Prometheus文本格式"""
+        if not self.enabled:
+            return b""
+        return generate_latest(self.registry)
+
+
+class RequestMetrics:
+    """单个请求的指标跟踪"""
+
+    def __init__(self, metrics: InferenceMetrics, model: str, template: str):
+        self.metrics = metrics
+        self.labels = (model, template)
+        self.start_time = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.last_token_time: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.status: Optional[str] = None
+
+        if metrics.enabled:
+            metrics.in_flight.labels(*self.labels).inc()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """首个token延迟"""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    def record_queue_wait(self, seconds: float):
+        """记录排队时间"""
+        if self.metrics.enabled:
+            self.metrics.queue_wait.labels(*self.labels).observe(seconds)
+
+    def on_tokens(self, count: int = 1, now: Optional[float] = None):
+        """记录新生成的token，同一数据块内的多个token平分间隔"""
+        if count <= 0 or self.status is not None:
+            return
+
+        now = now if now is not None else time.perf_counter()
+        enabled = self.metrics.enabled
+
+        if self.first_token_time is None:
+            self.first_token_time = now
+            if enabled:
+                self.metrics.time_to_first_token.labels(*self.labels).observe(
+                    now - self.start_time
+                )
+        elif enabled:
+            gap = (now - self.last_token_time) / count
+            histogram = self.metrics.inter_token_latency.labels(*self.labels)
+            for _ in range(count):
+                histogram.observe(gap)
+
+        self.completion_tokens += count
+        self.last_token_time = now
+
+    def on_output(self, request_output, now: Optional[float] = None):
+        """根据vLLM的累计输出记录新增token"""
+        prompt_token_ids = getattr(request_output, "prompt_token_ids", None)
+        if prompt_token_ids:
+            self.prompt_tokens = len(prompt_token_ids)
+
+        total = sum(
+            len(getattr(output, "token_ids", None) or ())
+            for output in request_output.outputs
+        )
+        self.on_tokens(total - self.completion_tokens, now)
+
+    def finish(
+        self,
+        status: str = STATUS_FINISHED,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+    ):
+        """结束请求，重复调用无效"""
+        if self.status is not None:
+            return
+        self.status = status
+
+        if prompt_tokens is None:
+            prompt_tokens = self.prompt_tokens
+        if completion_tokens is None:
+            completion_tokens = self.completion_tokens
+
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+
+        metrics.in_flight.labels(*self.labels).dec()
+        metrics.requests.labels(*self.labels, status).inc()
+        metrics.prompt_tokens.labels(*self.labels).inc(prompt_tokens)
+        metrics.completion_tokens.labels(*self.labels).inc(completion_tokens)
+
+        if status == STATUS_CANCELLED:
+            metrics.cancelled_tokens.labels(*self.labels).inc(completion_tokens)
+
+        end = time.perf_counter()
+        if status == STATUS_FINISHED:
+            metrics.e2e_latency.labels(*self.labels).observe(end - self.start_time)
+            if self.first_token_time is not None and completion_tokens > 1:
+                decode_time = end - self.first_token_time
+                if decode_time > 0:
+                    metrics.tokens_per_second.labels(*self.labels).observe(
+                        (completion_tokens - 1) / decode_time
+                    )
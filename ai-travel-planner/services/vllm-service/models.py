@@ -15,6 +15,20 @@ class ChatMessage(BaseModel):
     name: Optional[str] = Field(None, description="消息发送者名称")
 
 
+class DeltaMessage(BaseModel):
+    """流式增量消息模型"""
+    role: Optional[str] = Field(None, description="消息角色，仅首个数据块携带")
+    content: Optional[str] = Field(None, description="本次新增的内容")
+
+
+class StreamOptions(BaseModel):
+    """流式输出选项"""
+    include_usage: bool = Field(default=True, description="结束前是否发送使用统计数据块")
+    continuous_usage_stats: bool = Field(
+        default=False, description="每个数据块后都发送使用统计数据块，中断后可按已生成token数续传"
+    )
+
+
 class ChatCompletionRequest(BaseModel):
     """聊天完成请求模型"""
     model: str = Field(..., description="模型名称")
@@ -36,6 +50,7 @@ class ChatCompletionRequest(BaseModel):
     
     # 流式输出
     stream: bool = Field(default=False, description="是否流式输出")
+    stream_options: Optional[StreamOptions] = Field(default=None, description="流式输出选项")
     
     # 高级参数
     n: int = Field(default=1, ge=1, le=10, description="生成候选数")
@@ -45,6 +60,12 @@ class ChatCompletionRequest(BaseModel):
     early_stopping: bool = Field(default=False, description="早停")
     
     # 其他参数
+    priority: str = Field(default="normal", description="请求优先级: high, normal, low")
+    allow_cached: bool = Field(default=False, description="temperature>0时是否接受缓存结果")
+    prompt_family: Optional[str] = Field(default=None, description="共享系统提示词模板名称")
+    continue_final_message: bool = Field(
+        default=False, description="最后一条assistant消息作为前缀继续生成"
+    )
     user: Optional[str] = Field(default=None, description="用户标识")
     logit_bias: Optional[Dict[str, float]] = Field(default=None, description="logit偏置")
 
@@ -53,7 +74,7 @@ class ChatCompletionChoice(BaseModel):
     """聊天完成选择模型"""
     index: int = Field(..., description="选择索引")
     message: Optional[ChatMessage] = Field(None, description="完成消息")
-    delta: Optional[ChatMessage] = Field(None, description="增量消息(流式)")
+    delta: Optional[DeltaMessage] = Field(None, description="增量消息(流式)")
     finish_reason: Optional[str] = Field(None, description="完成原因")
     logprobs: Optional[Dict[str, Any]] = Field(None, description="对数概率")
 
@@ -94,7 +115,7 @@ class ChatCompletionResponse(BaseModel):
                 # 流式响应使用delta
                 choice = ChatCompletionChoice(
                     index=i,
-                    delta=ChatMessage(
+                    delta=DeltaMessage(
                         role="assistant",
                         content=output.text
                     ),
@@ -130,6 +151,19 @@ class ChatCompletionResponse(BaseModel):
         )
 
 
+class BatchRequestItem(BaseModel):
+    """批处理请求的一行"""
+    custom_id: str = Field(..., description="调用方指定的唯一ID，用于匹配结果和断点续跑")
+    body: ChatCompletionRequest = Field(..., description="聊天完成请求，stream参数被忽略")
+
+
+class BatchResult(BaseModel):
+    """批处理结果的一行"""
+    custom_id: str = Field(..., description="对应请求的custom_id")
+    response: Optional[ChatCompletionResponse] = Field(None, description="成功时的聊天完成响应")
+    error: Optional[str] = Field(None, description="失败原因")
+
+
 class ModelInfo(BaseModel):
     """模型信息模型"""
     id: str = Field(..., description="模型ID")
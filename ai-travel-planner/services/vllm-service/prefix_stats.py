@@ -0,0 +1,124 @@
+"""
+前缀缓存复用统计
+Prefix cache reuse statistics
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .prompt_manager import RenderedPrompt
+
+
+@dataclass
+class PrefixStats:
+    """单个前缀的统计信息"""
+
+    prefix_hash: str
+    family: Optional[str]
+    prefix_length: int
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    reported_requests: int = 0
+    first_seen: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
+
+    @property
+    def token_hit_rate(self) -> Optional[float]:
+        """引擎报告的提示词token命中率"""
+        if self.reported_requests == 0 or self.prompt_tokens == 0:
+            return None
+        return self.cached_tokens / self.prompt_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            "prefix_hash": self.prefix_hash,
+            "family": self.family,
+            "prefix_length": self.prefix_length,
+            "requests": self.requests,
+            "reused_requests": max(self.requests - 1, 0),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "token_hit_rate": self.token_hit_rate,
+            "first_seen": int(self.first_seen),
+            "last_seen": int(self.last_seen),
+        }
+
+
+class PrefixCacheTracker:
+    """
+    前缀复用跟踪器
+
+    按前缀哈希统计请求数，引擎报告num_cached_tokens时同时统计
+    实际命中的KV缓存token数。
+    """
+
+    def __init__(self, max_prefixes: int = 1024):
+        self.max_prefixes = max_prefixes
+        self._prefixes: "OrderedDict[str, PrefixStats]" = OrderedDict()
+
+    def record_request(self, rendered: RenderedPrompt):
+        """记录一次请求使用的前缀"""
+        if not rendered.prefix_hash:
+            return
+
+        stats = self._prefixes.get(rendered.prefix_hash)
+        if stats is None:
+            stats = PrefixStats(
+                prefix_hash=rendered.prefix_hash,
+                family=rendered.family,
+                prefix_length=rendered.prefix_length,
+            )
+            self._prefixes[rendered.prefix_hash] = stats
+            if len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        else:
+            self._prefixes.move_to_end(rendered.prefix_hash)
+
+        stats.requests += 1
+        stats.last_seen = time.time()
+
+    def record_output(self, prefix_hash: Optional[str], request_output):
+        """记录引擎返回的token统计"""
+        if not prefix_hash or request_output is None:
+            return
+
+        stats = self._prefixes.get(prefix_hash)
+        if stats is None:
+            return
+
+        cached_tokens = getattr(request_output, "num_cached_tokens", None)
+        if cached_tokens is None:
+            return
+
+        stats.reported_requests += 1
+        stats.prompt_tokens += len(
+            getattr(request_output, "prompt_token_ids", None) or ()
+        )
+        stats.cached_tokens += cached_tokens
+
+    def get_stats(self, top: int = 20) -> Dict[str, Any]:
+        """获取前缀复用统计，按请求数排序"""
+        prefixes = sorted(
+            self._prefixes.values(), key=lambda s: s.requests, reverse=True
+        )
+        total_requests = sum(s.requests for s in prefixes)
+        reused_requests = sum(max(s.requests - 1, 0) for s in prefixes)
+        prompt_tokens = sum(s.prompt_tokens for s in prefixes)
+        cached_tokens = sum(s.cached_tokens for s in prefixes)
+
+        return {
+            "unique_prefixes": len(prefixes),
+            "total_requests": total_requests,
+            "reused_requests": reused_requests,
+            "prefix_reuse_rate": reused_requests / total_requests
+            if total_requests
+            else 0.0,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "token_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else None,
+            "prefixes": [s.to_dict() for s in prefixes[:top]],
+        }
@@ -3,11 +3,13 @@
 Prompt template management system
 """
 
+import hashlib
 import json
 import logging
-from typing import Dict, List, Optional, Any, Union
+import string
+from typing import Dict, FrozenSet, List, Optional, Any, Tuple, Union
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from enum import Enum
 
 from .models import ChatMessage
@@ -15,6 +17,19 @@ from .models import ChatMessage
 logger = logging.getLogger(__name__)
 
 
+class PromptLayout(Enum):
+    """聊天提示词布局"""
+    # 调用方的系统消息替换默认系统提示词
+    LEGACY = "legacy"
+    # 模板族的共享系统提示词始终位于最前，调用方的系统消息追加在其后
+    STABLE_PREFIX = "stable_prefix"
+
+
+class UnknownPromptFamilyError(ValueError):
+    """请求的提示词模板族不存在"""
+    pass
+
+
 class PromptType(Enum):
     """提示词类型枚举"""
     SYSTEM = "system"
@@ -24,6 +39,28 @@ class PromptType(Enum):
     COMPLETION = "completion"
 
 
+_formatter = string.Formatter()
+
+# 编译后的模板片段: (字面量, 变量名或None)
+TemplateSegments = List[Tuple[str, Optional[str]]]
+
+
+def compile_template(template: str) -> Optional[TemplateSegments]:
+    """
+    将模板解析为片段列表
+
+    含格式说明、转换符或属性访问的模板返回None，由str.format处理。
+    """
+    segments: TemplateSegments = []
+    for literal, field_name, format_spec, conversion in _formatter.parse(template):
+        if field_name is not None and (
+            format_spec or conversion or not field_name.isidentifier()
+        ):
+            return None
+        segments.append((literal, field_name))
+    return segments
+
+
 @dataclass
 class PromptTemplate:
     """提示词模板类"""
@@ -34,14 +71,88 @@ class PromptTemplate:
     variables: Optional[List[str]] = None
     examples: Optional[List[Dict[str, Any]]] = None
     
+    _segments: Optional[TemplateSegments] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _fields: FrozenSet[str] = field(
+        default=frozenset(), init=False, repr=False, compare=False
+    )
+    _compiled_source: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
+    def __post_init__(self):
+        self.compile()
+    
+    def compile(self):
+        """解析模板并在加载时检查变量声明"""
+        self._compiled_source = self.template
+        try:
+            self._segments = compile_template(self.template)
+        except ValueError as e:
+            # 格式错误的模板在格式化时报错
+            logger.warning(f"模板解析失败: {self.name}, {e}")
+            self._segments = None
+        
+        if self._segments is None:
+            self._fields = frozenset()
+            return
+        
+        self._fields = frozenset(name for _, name in self._segments if name is not None)
+        if self.variables is not None:
+            undeclared = self._fields - set(self.variables)
+            if undeclared:
+                logger.warning(f"模板 {self.name} 使用了未声明的变量: {undeclared}")
+    
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """模板中引用的变量名"""
+        self._ensure_compiled()
+        return self._fields
+    
+    def _ensure_compiled(self):
+        if self._compiled_source is not self.template:
+            self.compile()
+    
     def format(self, **kwargs) -> str:
         """格式化模板"""
+        self._ensure_compiled()
+        segments = self._segments
+        
+        if segments is None:
+            try:
+                return self.template.format(**kwargs)
+            except KeyError as e:
+                raise ValueError(f"模板变量缺失: {e}")
+            except Exception as e:
+                raise ValueError(f"模板格式化失败: {e}")
+        
+        parts = []
+        append = parts.append
         try:
-            return self.template.format(**kwargs)
+            for literal, name in segments:
+                append(literal)
+                if name is not None:
+                    value = kwargs[name]
+                    append(value if type(value) is str else str(value))
         except KeyError as e:
             raise ValueError(f"模板变量缺失: {e}")
-        except Exception as e:
-            raise ValueError(f"模板格式化失败: {e}")
+        return "".join(parts)
+    
+    def literal_prefix(self, field_name: str) -> Optional[str]:
+        """返回指定变量之前的固定文本，之前存在其他变量时返回None"""
+        self._ensure_compiled()
+        if self._segments is None:
+            return None
+        
+        parts = []
+        for literal, name in self._segments:
+            parts.append(literal)
+            if name == field_name:
+                return "".join(parts)
+            if name is not None:
+                return None
+        return None
     
     def validate_variables(self, **kwargs) -> bool:
         """验证模板变量"""
@@ -56,12 +167,67 @@ class PromptTemplate:
         return True
 
 
+@dataclass
+class RenderedPrompt:
+    """渲染后的聊天提示词"""
+    text: str
+    prefix_hash: Optional[str] = None
+    prefix_length: int = 0
+    family: Optional[str] = None
+    
+    @property
+    def prefix(self) -> str:
+        """可在请求间共享的前缀"""
+        return self.text[:self.prefix_length]
+
+
+def hash_prefix(prefix: str) -> str:
+    """计算前缀哈希"""
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+
+
+class ConversationRenderer:
+    """
+    多轮对话渲染器
+
+    不缓存渲染结果：按完整历史做键的缓存内存开销随对话长度增长，
+    而单次拼接只需数十微秒，缓存没有可测量的收益。
+    """
+    
+    @staticmethod
+    def render_turn(role: str, content: str) -> str:
+        """渲染单轮消息"""
+        return f"<|im_start|>{role}\n{content}<|im_end|>"
+    
+    def render(self, messages: List[ChatMessage]) -> Tuple[List[str], str]:
+        """渲染对话，返回 (系统消息列表, 对话内容)"""
+        system_messages: List[str] = []
+        turns: List[str] = []
+        for message in messages:
+            role = message.role
+            if role == "system":
+                system_messages.append(message.content)
+            elif role == "user" or role == "assistant":
+                turns.append(f"<|im_start|>{role}\n{message.content}<|im_end|>")
+        
+        return system_messages, "\n".join(turns)
+
+
 class PromptManager:
     """提示词管理器"""
     
-    def __init__(self, templates_dir: Optional[str] = None):
+    def __init__(
+        self,
+        templates_dir: Optional[str] = None,
+        layout: PromptLayout = PromptLayout.LEGACY,
+        default_family: str = "travel_system"
+    ):
         self.templates_dir = Path(templates_dir) if templates_dir else None
         self.templates: Dict[str, PromptTemplate] = {}
+        self.layout = layout
+        self.default_family = default_family
+        self.conversation_renderer = ConversationRenderer()
+        self._prefix_hashes: Dict[Tuple[str, str], str] = {}
         self._load_default_templates()
         
         if self.templates_dir and self.templates_dir.exists():
@@ -238,45 +404,97 @@ class PromptManager:
     
     def format_chat_prompt(self, messages: List[ChatMessage]) -> str:
         """格式化聊天提示词"""
+        return self.render_chat_prompt(messages).text
+    
+    def render_chat_prompt(
+        self,
+        messages: List[ChatMessage],
+        family: Optional[str] = None,
+        continue_final_message: bool = False
+    ) -> RenderedPrompt:
+        """
+        渲染聊天提示词，并计算可共享前缀的哈希
+
+        continue_final_message为True且最后一条是assistant消息时，该消息不闭合，
+        作为回复的已生成部分接在assistant起始标记之后，模型从此处继续生成。
+        family不存在时抛出UnknownPromptFamilyError，不回退到简单拼接。
+        """
+        if self.layout == PromptLayout.STABLE_PREFIX:
+            family = family or self.default_family
+        if family is not None and family not in self.templates:
+            raise UnknownPromptFamilyError(f"模板不存在: {family}")
+        
+        if continue_final_message and messages and messages[-1].role == "assistant":
+            rendered = self.render_chat_prompt(messages[:-1], family=family)
+            return replace(rendered, text=rendered.text + messages[-1].content)
+        
         try:
-            # 分离系统消息和对话消息
-            system_message = ""
-            conversation_parts = []
-            
-            for message in messages:
-                if message.role == "system":
-                    system_message = message.content
-                elif message.role == "user":
-                    conversation_parts.append(f"<|im_start|>user\n{message.content}<|im_end|>")
-                elif message.role == "assistant":
-                    conversation_parts.append(f"<|im_start|>assistant\n{message.content}<|im_end|>")
+            # 分离系统消息并渲染对话
+            system_messages, conversation = self.conversation_renderer.render(messages)
             
-            # 如果没有系统消息，使用默认的
-            if not system_message:
-                system_template = self.get_template("travel_system")
-                if system_template:
-                    system_message = system_template.template
-                else:
-                    system_message = "你是一个有用的AI助手。"
-            
-            # 构建完整对话
-            conversation = "\n".join(conversation_parts)
+            if self.layout == PromptLayout.STABLE_PREFIX:
+                # 共享提示词固定在最前，调用方的系统消息追加在其后
+                shared = self.templates[family].template
+                extra = [
+                    content for content in system_messages
+                    if content and content != shared
+                ]
+                system_message = "\n\n".join([shared] + extra)
+            else:
+                system_message = system_messages[-1] if system_messages else ""
+                family = None
+                
+                # 如果没有系统消息，使用默认的
+                if not system_message:
+                    system_template = self.templates.get(self.default_family)
+                    if system_template:
+                        system_message = system_template.template
+                        family = self.default_family
+                    else:
+                        system_message = "你是一个有用的AI助手。"
+                shared = system_message
             
             # 使用Qwen聊天模板
-            qwen_template = self.get_template("qwen_chat")
+            qwen_template = self.templates.get("qwen_chat")
             if qwen_template:
-                return qwen_template.format(
+                text = qwen_template.format(
                     system_message=system_message,
                     conversation=conversation
                 )
+                head = qwen_template.literal_prefix("system_message")
+                if head is None:
+                    return RenderedPrompt(text=text, family=family)
+                return RenderedPrompt(
+                    text=text,
+                    prefix_hash=self._get_prefix_hash(head, shared),
+                    prefix_length=len(head) + len(shared),
+                    family=family
+                )
             else:
                 # 回退到简单格式
-                return f"System: {system_message}\n\n{conversation}\n\nAssistant:"
+                return RenderedPrompt(
+                    text=f"System: {system_message}\n\n{conversation}\n\nAssistant:",
+                    family=family
+                )
                 
         except Exception as e:
             logger.error(f"格式化聊天提示词失败: {e}")
             # 回退到简单拼接
-            return "\n".join([f"{msg.role}: {msg.content}" for msg in messages]) + "\nassistant:"
+            return RenderedPrompt(
+                text="\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+                + "\nassistant:"
+            )
+    
+    def _get_prefix_hash(self, head: str, shared: str) -> str:
+        """获取前缀哈希，模板族的共享前缀只计算一次"""
+        key = (head, shared)
+        prefix_hash = self._prefix_hashes.get(key)
+        if prefix_hash is None:
+            prefix_hash = hash_prefix(head + shared)
+            if len(self._prefix_hashes) >= 1024:
+                self._prefix_hashes.clear()
+            self._prefix_hashes[key] = prefix_hash
+        return prefix_hash
     
     def create_travel_planning_prompt(
         self,
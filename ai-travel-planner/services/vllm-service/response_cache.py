@@ -0,0 +1,448 @@
+"""
+推理结果缓存
+Response cache in front of the vLLM engine
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import (
+    ChatCompletionChoice,
+    ChatCompletionResponse,
+    ChatMessage,
+    DeltaMessage,
+    Usage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """缓存的生成结果"""
+
+    texts: List[str]
+    finish_reasons: List[Optional[str]]
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def size_bytes(self) -> int:
+        """估算占用字节数"""
+        return sum(len(text.encode("utf-8")) for text in self.texts) + 64 * len(
+            self.texts
+        )
+
+    @classmethod
+    def from_vllm_output(cls, request_output) -> "CachedResponse":
+        """从vLLM最终输出创建缓存条目"""
+        outputs = request_output.outputs
+        return cls(
+            texts=[output.text for output in outputs],
+            finish_reasons=[output.finish_reason for output in outputs],
+            prompt_tokens=len(getattr(request_output, "prompt_token_ids", None) or ()),
+            completion_tokens=sum(
+                len(getattr(output, "token_ids", None) or ()) for output in outputs
+            ),
+        )
+
+    def usage(self) -> Usage:
+        """使用统计"""
+        return Usage(
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+        )
+
+    def to_response(self, request_id: str, model_name: str) -> ChatCompletionResponse:
+        """转换为非流式响应"""
+        return ChatCompletionResponse(
+            id=request_id,
+            model=model_name,
+            choices=[
+                ChatCompletionChoice(
+                    index=i,
+                    message=ChatMessage(role="assistant", content=text),
+                    finish_reason=finish_reason,
+                )
+                for i, (text, finish_reason) in enumerate(
+                    zip(self.texts, self.finish_reasons)
+                )
+            ],
+            usage=self.usage(),
+        )
+
+    def iter_stream_chunks(
+        self, request_id: str, model_name: str, chunk_chars: int = 16
+    ) -> Iterator[ChatCompletionResponse]:
+        """按流式数据块回放缓存结果"""
+        created = int(time.time())
+        for index, (text, finish_reason) in enumerate(
+            zip(self.texts, self.finish_reasons)
+        ):
+            pieces = [
+                text[i : i + chunk_chars] for i in range(0, len(text), chunk_chars)
+            ] or [""]
+            for position, piece in enumerate(pieces):
+                is_last = position == len(pieces) - 1
+                yield ChatCompletionResponse(
+                    id=request_id,
+                    object="chat.completion.chunk",
+                    created=created,
+                    model=model_name,
+                    choices=[
+                        ChatCompletionChoice(
+                            index=index,
+                            delta=DeltaMessage(
+                                role="assistant" if position == 0 else None,
+                                content=piece,
+                            ),
+                            finish_reason=finish_reason if is_last else None,
+                        )
+                    ],
+                )
+
+
+@dataclass
+class CacheStats:
+    """缓存统计信息"""
+
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.semantic_hits + self.misses
+        if total == 0:
+            return 0.0
+        return (self.hits + self.semantic_hits) / total
+
+
+class ResponseCacheBackend(ABC):
+    """精确匹配缓存后端接口"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """获取缓存条目"""
+
+    @abstractmethod
+    def set(self, key: str, entry: CachedResponse):
+        """写入缓存条目"""
+
+    @abstractmethod
+    def clear(self):
+        """清空缓存"""
+
+
+class InMemoryResponseCache(ResponseCacheBackend):
+    """基于LRU和TTL的内存缓存，受字节预算约束"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """当前占用字节数"""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if time.time() - entry.created_at > self.ttl:
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        size = entry.size_bytes
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = entry
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size_bytes
+
+
+def semantic_cache_text(messages: Sequence[ChatMessage], max_chars: int = 512) -> str:
+    """
+    语义缓存使用的对话文本
+
+    只包含user/assistant轮次，系统提示词由精确匹配的命名空间区分。
+    轮次按从新到旧拼接并截断到max_chars（约为bge-small-zh的512个token），
+    长对话中被截掉的是最早的轮次，最新的用户消息始终在最前。
+    """
+    turns = [
+        f"{message.role}: {message.content}"
+        for message in reversed(messages)
+        if message.role in ("user", "assistant")
+    ]
+    return "\n".join(turns)[:max_chars]
+
+
+class _SemanticBucket:
+    """同一命名空间的语义缓存条目，向量已归一化，按需堆叠为矩阵"""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, Tuple[np.ndarray, CachedResponse]]" = (
+            OrderedDict()
+        )
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def put(self, key: str, vector: np.ndarray, entry: CachedResponse):
+        self.entries.pop(key, None)
+        self.entries[key] = (vector, entry)
+        self._matrix = None
+
+    def pop_oldest(self):
+        self.entries.popitem(last=False)
+        self._matrix = None
+
+    def expire(self, cutoff: float):
+        """按写入顺序淘汰过期条目"""
+        while self.entries:
+            _, entry = next(iter(self.entries.values()))
+            if entry.created_at >= cutoff:
+                break
+            self.pop_oldest()
+
+    def search(self, query: np.ndarray) -> Tuple[float, Optional[CachedResponse]]:
+        """返回相似度最高的条目"""
+        if not self.entries:
+            return 0.0, None
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = np.stack([vector for vector, _ in self.entries.values()])
+        scores = self._matrix @ query
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.entries[self._keys[best]][1]
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
+
+class SemanticResponseCache:
+    """
+    语义相似度缓存
+
+    对对话文本做向量化，相同命名空间（采样参数和系统提示词）下相似度超过阈值的
+    请求复用已有结果。get和set会调用向量化模型，由ResponseCache放到线程中执行。
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], Sequence[float]],
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+    ):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._buckets: Dict[str, _SemanticBucket] = {}
+        self._size = 0
+
+    def get(self, namespace: str, text: str) -> Optional[CachedResponse]:
+        """查找相似对话的缓存结果"""
+        bucket = self._buckets.get(namespace)
+        if not bucket:
+            return None
+
+        before = len(bucket)
+        bucket.expire(time.time() - self.ttl)
+        self._size -= before - len(bucket)
+
+        score, entry = bucket.search(_normalize(self.embed_fn(text)))
+        if entry is not None and score >= self.threshold:
+            return entry
+        return None
+
+    def set(self, namespace: str, key: str, text: str, entry: CachedResponse):
+        """写入缓存条目"""
+        vector = _normalize(self.embed_fn(text))
+        bucket = self._buckets.setdefault(namespace, _SemanticBucket())
+        before = len(bucket)
+        bucket.put(key, vector, entry)
+        self._size += len(bucket) - before
+
+        while self._size > self.max_entries:
+            largest = max(self._buckets.values(), key=len)
+            largest.pop_oldest()
+            self._size -= 1
+
+    def clear(self):
+        """清空缓存"""
+        self._buckets.clear()
+        self._size = 0
+
+
+class ResponseCache:
+    """
+    推理结果缓存
+
+    以格式化后的提示词和采样参数为键，先查精确匹配，再查可选的语义缓存。
+    语义缓存的向量化和检索在单独的线程中串行执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        backend: Optional[ResponseCacheBackend] = None,
+        semantic: Optional[SemanticResponseCache] = None,
+    ):
+        self.backend = backend or InMemoryResponseCache()
+        self.semantic = semantic
+        self.stats = CacheStats()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-cache")
+            if semantic
+            else None
+        )
+
+    @staticmethod
+    def make_key(prompt: str, params: Dict[str, Any]) -> Tuple[str, str]:
+        """生成缓存键，返回 (key, namespace)"""
+        namespace = hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        key = hashlib.sha256(f"{namespace}:{prompt}".encode("utf-8")).hexdigest()
+        return key, namespace
+
+    @staticmethod
+    def is_cacheable(temperature: float, allow_cached: bool = False) -> bool:
+        """只有确定性采样或调用方显式允许时才使用缓存"""
+        return temperature == 0 or allow_cached
+
+    async def get(
+        self, key: str, namespace: Optional[str] = None, text: Optional[str] = None
+    ) -> Optional[CachedResponse]:
+        """查找缓存结果，text为语义缓存使用的对话文本"""
+        entry = self.backend.get(key)
+        if entry is not None:
+            self.stats.hits += 1
+            return entry
+
+        if self.semantic and namespace and text:
+            try:
+                entry = await self._run_semantic(self.semantic.get, namespace, text)
+            except Exception as e:
+                logger.warning(f"语义缓存查询失败: {e}")
+                entry = None
+            if entry is not None:
+                self.stats.semantic_hits += 1
+                return entry
+
+        self.stats.misses += 1
+        return None
+
+    async def set(
+        self,
+        key: str,
+        entry: CachedResponse,
+        namespace: Optional[str] = None,
+        text: Optional[str] = None,
+    ):
+        """写入缓存，被中止的结果不缓存"""
+        if any(reason not in ("stop", "length") for reason in entry.finish_reasons):
+            return
+
+        self.backend.set(key, entry)
+
+        if self.semantic and namespace and text:
+            try:
+                await self._run_semantic(self.semantic.set, namespace, key, text, entry)
+            except Exception as e:
+                logger.warning(f"语义缓存写入失败: {e}")
+
+    async def _run_semantic(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def clear(self):
+        """清空缓存"""
+        self.backend.clear()
+        if self.semantic:
+            self.semantic.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        stats = {
+            "hits": self.stats.hits,
+            "semantic_hits": self.stats.semantic_hits,
+            "misses": self.stats.misses,
+            "hit_rate": self.stats.hit_rate,
+            "semantic_enabled": self.semantic is not None,
+        }
+        if isinstance(self.backend, InMemoryResponseCache):
+            stats.update(
+                {
+                    "entries": len(self.backend),
+                    "size_bytes": self.backend.size_bytes,
+                    "max_bytes": self.backend.max_bytes,
+                    "evictions": self.backend.stats.evictions,
+                    "expirations": self.backend.stats.expirations,
+                }
+            )
+        return stats
+
+
+def create_sentence_transformer_embedder(
+    model_name: str,
+) -> Callable[[str], List[float]]:
+    """使用sentence-transformers创建向量化函数"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+
+    def embed(text: str) -> List[float]:
+        return model.encode(text, normalize_embeddings=True).tolist()
+
+    return embed
@@ -5,41 +5,222 @@ vLLM server startup module
 
 import asyncio
 import logging
+import math
 import signal
 import sys
-from typing import Optional
+import uuid
+from typing import (
+    TYPE_CHECKING, Any, AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple
+)
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 
-from vllm import LLM, SamplingParams
-from vllm.engine.arg_utils import AsyncEngineArgs
-from vllm.engine.async_llm_engine import AsyncLLMEngine
-from vllm.utils import random_uuid
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from .admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    AdmissionTicket,
+    RequestPriority,
+)
+from .batch import BATCH_MEDIA_TYPE, encode_batch_result, parse_batch_requests
 from .config import VLLMConfig, DEFAULT_VLLM_CONFIG
-from .models import ChatCompletionRequest, ChatCompletionResponse, ModelInfo
-from .prompt_manager import PromptManager
+from .context_budget import (
+    ContextBudget,
+    ContextBudgetError,
+    TokenCounter,
+    TruncationPolicy,
+)
+from .lora_registry import LoRARegistry
+from .metrics import (
+    CONTENT_TYPE_LATEST,
+    MODEL_LABEL_OTHER,
+    STATUS_CACHED,
+    STATUS_CANCELLED,
+    STATUS_ERROR,
+    STATUS_REJECTED,
+    InferenceMetrics,
+    RequestMetrics,
+    collect_spec_decode_stats,
+)
+from .models import (
+    BatchRequestItem,
+    BatchResult,
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+    ModelInfo,
+)
+from .prefix_stats import PrefixCacheTracker
+from .prompt_manager import (
+    PromptLayout,
+    PromptManager,
+    RenderedPrompt,
+    UnknownPromptFamilyError,
+)
+from .response_cache import (
+    CachedResponse,
+    InMemoryResponseCache,
+    ResponseCache,
+    SemanticResponseCache,
+    create_sentence_transformer_embedder,
+    semantic_cache_text,
+)
+from .sse_codec import SSE_DONE, format_sse
+from .stream_delta import DeltaStreamTracker, collect_final_output
+from .warmup import StartupTimer, WarmupResult, build_warmup_prompts, run_warmup
+
+# vLLM在引擎初始化时才导入，导入torch和CUDA扩展需要数秒，延迟导入使端口尽早可用
+if TYPE_CHECKING:
+    from vllm import SamplingParams
+    from vllm.engine.async_llm_engine import AsyncLLMEngine
+    from vllm.lora.request import LoRARequest
 
 logger = logging.getLogger(__name__)
 
+# 请求被取消时的状态码（Client Closed Request）
+HTTP_CLIENT_CLOSED_REQUEST = 499
+
+
+def random_uuid() -> str:
+    """生成请求ID，与vllm.utils.random_uuid格式一致"""
+    return uuid.uuid4().hex
+
+
+@dataclass
+class GenerationContext:
+    """单次生成请求的上下文"""
+    request: ChatCompletionRequest
+    request_id: str
+    rendered: RenderedPrompt
+    sampling_params: "SamplingParams"
+    ticket: Optional[AdmissionTicket] = None
+    cache_key: Optional[Tuple[str, str]] = None
+    metrics: Optional[RequestMetrics] = None
+    prompt_token_ids: Optional[List[int]] = None
+    lora_request: Optional["LoRARequest"] = None
+    finished: bool = False
+    cancelled: bool = False
+    
+    @property
+    def prompt(self) -> str:
+        """渲染后的提示词"""
+        return self.rendered.text
+    
+    @property
+    def engine_prompt(self):
+        """提交给引擎的输入，已分词时直接传token ID，引擎不再重复分词"""
+        if self.prompt_token_ids is not None:
+            from vllm.inputs import TokensPrompt
+            return TokensPrompt(prompt_token_ids=self.prompt_token_ids)
+        return self.prompt
+
+
+class GenerationStreamingResponse(StreamingResponse):
+    """
+    流式生成响应，响应结束时执行清理回调
+
+    客户端在响应开始前断开时Starlette不会迭代响应体，生成器的finally不会执行，
+    因此在__call__的finally中兜底释放准入槽位，回调需可重复调用。
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
 
 class VLLMServer:
     """vLLM服务器类"""
     
     def __init__(self, config: Optional[VLLMConfig] = None):
         self.config = config or DEFAULT_VLLM_CONFIG
-        self.engine: Optional[AsyncLLMEngine] = None
-        self.prompt_manager = PromptManager()
+        self.engine: Optional["AsyncLLMEngine"] = None
+        self.startup_timer = StartupTimer()
+        self.warmup_result: Optional[WarmupResult] = None
+        self.ready = False
+        self.startup_error: Optional[str] = None
+        self._startup_task: Optional[asyncio.Task] = None
+        self.prompt_manager = PromptManager(
+            layout=PromptLayout(self.config.prompt_layout),
+            default_family=self.config.default_prompt_family
+        )
+        self.prefix_tracker = PrefixCacheTracker()
+        self.context_budget: Optional[ContextBudget] = None
+        self.lora_registry: Optional[LoRARegistry] = None
+        if self.config.enable_lora:
+            self.lora_registry = LoRARegistry(
+                self.config.lora_modules_dir,
+                max_resident=self.config.max_cpu_loras or self.config.max_loras,
+                max_rank=self.config.max_lora_rank,
+                base_model=self.config.model_name
+            )
+        self.metrics = InferenceMetrics()
+        if self.config.speculative_method:
+            self.metrics.enable_spec_decode()
+        self.admission = AdmissionController(
+            max_in_flight=(
+                self.config.max_concurrent_requests or self.config.max_num_seqs
+            ),
+            max_queue_size=self.config.max_queue_size,
+            queue_deadlines={
+                RequestPriority.parse(name): deadline
+                for name, deadline in self.config.queue_deadlines.items()
+            }
+        )
+        self.response_cache = self._create_response_cache()
+        self._active_generations: Dict[str, GenerationContext] = {}
+        self._abort_tasks: Set[asyncio.Task] = set()
+        self._cache_tasks: Set[asyncio.Task] = set()
         self.app: Optional[FastAPI] = None
         self._shutdown_event = asyncio.Event()
         
+    def _create_response_cache(self) -> Optional[ResponseCache]:
+        """根据配置创建结果缓存"""
+        if not self.config.enable_response_cache:
+            return None
+        
+        semantic = None
+        if self.config.enable_semantic_cache:
+            try:
+                semantic = SemanticResponseCache(
+                    embed_fn=create_sentence_transformer_embedder(
+                        self.config.semantic_cache_model
+                    ),
+                    threshold=self.config.semantic_cache_threshold,
+                    ttl=self.config.response_cache_ttl
+                )
+            except ImportError:
+                logger.warning("未安装sentence-transformers，语义缓存已禁用")
+        
+        return ResponseCache(
+            backend=InMemoryResponseCache(
+                max_bytes=self.config.response_cache_max_bytes,
+                ttl=self.config.response_cache_ttl
+            ),
+            semantic=semantic
+        )
+    
     async def initialize_engine(self):
         """初始化vLLM引擎"""
         try:
             logger.info(f"正在初始化vLLM引擎，模型: {self.config.model_name}")
             
+            with self.startup_timer.phase("vllm_import"):
+                from vllm.engine.arg_utils import AsyncEngineArgs
+                from vllm.engine.async_llm_engine import AsyncLLMEngine
+            
+            speculative_config = self.config.speculative_config()
+            if speculative_config:
+                logger.info(f"启用投机解码: {speculative_config}")
+            
             # 构建引擎参数
             engine_args = AsyncEngineArgs(
                 model=self.config.model_path or self.config.model_name,
@@ -54,18 +235,99 @@ class VLLMServer:
                 disable_log_stats=self.config.disable_log_stats,
                 trust_remote_code=self.config.trust_remote_code,
                 served_model_name=self.config.served_model_name or self.config.model_name,
+                speculative_config=speculative_config,
+                enable_lora=self.config.enable_lora,
+                max_loras=self.config.max_loras,
+                max_cpu_loras=self.config.max_cpu_loras,
+                max_lora_rank=self.config.max_lora_rank,
             )
             
-            # 创建异步引擎
-            self.engine = AsyncLLMEngine.from_engine_args(engine_args)
+            # 创建异步引擎，模型加载和CUDA图捕获在此完成
+            with self.startup_timer.phase("engine_init"):
+                self.engine = AsyncLLMEngine.from_engine_args(engine_args)
             logger.info("vLLM引擎初始化成功")
             
+            if self.lora_registry:
+                with self.startup_timer.phase("lora_scan"):
+                    adapters = self.lora_registry.scan()
+                logger.info(f"已注册 {len(adapters)} 个LoRA适配器: {adapters}")
+            
+            if self.config.enable_context_budget:
+                # 复用引擎的分词器，分词结果直接交给引擎
+                with self.startup_timer.phase("tokenizer"):
+                    tokenizer = await self.engine.get_tokenizer()
+                self.context_budget = ContextBudget(
+                    TokenCounter(tokenizer.encode),
+                    self.prompt_manager,
+                    max_model_len=self.config.max_model_len,
+                    policy=TruncationPolicy(self.config.context_truncation_policy),
+                    margin=self.config.context_budget_margin,
+                    summary_max_tokens=self.config.context_summary_max_tokens
+                )
+            
         except Exception as e:
             logger.error(f"vLLM引擎初始化失败: {e}")
             raise
     
+    async def warmup(self):
+        """
+        用模板提示词预热引擎
+
+        首批请求会触发采样内核编译、分词器初始化等一次性开销，预热完成前不报告就绪，
+        这些开销不会落在线上请求上。预热失败或超时不影响启动。
+        """
+        from vllm import SamplingParams
+        
+        prompts = build_warmup_prompts(self.prompt_manager, self.config.warmup_requests)
+        sampling_params = SamplingParams(
+            max_tokens=self.config.warmup_max_tokens, temperature=0.0
+        )
+        
+        def generate(rendered: RenderedPrompt, request_id: str):
+            return self.engine.generate(rendered.text, sampling_params, request_id)
+        
+        logger.info(f"开始预热，{len(prompts)} 个请求")
+        with self.startup_timer.phase("warmup"):
+            self.warmup_result = await run_warmup(
+                generate, prompts, timeout=self.config.warmup_timeout
+            )
+        logger.info(f"预热完成: {self.warmup_result.to_dict()}")
+    
+    async def _startup(self):
+        """后台完成引擎初始化和预热，完成后报告就绪"""
+        try:
+            await self.initialize_engine()
+            if self.config.enable_warmup and self.config.warmup_requests > 0:
+                await self.warmup()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.startup_error = str(e)
+            logger.error(f"服务启动失败: {e}")
+            return
+        
+        self.ready = True
+        self.startup_timer.mark_ready()
+        logger.info(f"服务就绪，启动耗时: {self.startup_timer.to_dict()}")
+    
+    def _ensure_ready(self):
+        """引擎未就绪时返回503"""
+        if not self.ready or not self.engine:
+            raise HTTPException(status_code=503, detail="引擎未就绪")
+    
+    def _readiness_status(self) -> str:
+        """启动状态: ready, starting, warming_up, failed"""
+        if self.startup_error:
+            return "failed"
+        if self.ready:
+            return "ready"
+        return "warming_up" if self.engine else "starting"
+    
     async def shutdown_engine(self):
         """关闭vLLM引擎"""
+        if self._startup_task and not self._startup_task.done():
+            self._startup_task.cancel()
+        self.ready = False
         if self.engine:
             logger.info("正在关闭vLLM引擎...")
             # vLLM引擎没有显式的关闭方法，设置shutdown事件
@@ -78,8 +340,9 @@ class VLLMServer:
         
         @asynccontextmanager
         async def lifespan(app: FastAPI):
-            # 启动时初始化引擎
-            await self.initialize_engine()
+            # uvicorn在lifespan启动完成后才监听端口，引擎初始化和预热放到后台，
+            # 端口立即可用，就绪状态通过/health/ready报告
+            self._startup_task = asyncio.create_task(self._startup())
             yield
             # 关闭时清理引擎
             await self.shutdown_engine()
@@ -111,150 +374,715 @@ class VLLMServer:
         
         @app.get("/health")
         async def health_check():
-            """健康检查"""
+            """健康检查，预热完成后engine_ready才为true"""
             return {
-                "status": "healthy",
+                "status": "healthy" if self.ready else self._readiness_status(),
                 "model": self.config.model_name,
-                "engine_ready": self.engine is not None
+                "engine_ready": self.ready
             }
         
-        @app.get("/v1/models")
-        async def list_models():
-            """列出可用模型"""
+        @app.get("/health/live")
+        async def liveness():
+            """存活检查：进程正常即返回200，启动失败时返回503以便重启"""
+            if self.startup_error:
+                return JSONResponse(
+                    status_code=503,
+                    content={"status": "failed", "error": self.startup_error}
+                )
+            return {"status": "alive"}
+        
+        @app.get("/health/ready")
+        async def readiness():
+            """就绪检查：引擎初始化和预热完成后返回200，附带启动各阶段耗时"""
+            content = {
+                "status": self._readiness_status(),
+                "startup": self.startup_timer.to_dict(),
+                "warmup": self.warmup_result.to_dict() if self.warmup_result else None,
+            }
+            if not self.ready:
+                return JSONResponse(status_code=503, content=content)
+            return content
+        
+        @app.get("/v1/admission/stats")
+        async def admission_stats():
+            """准入控制统计：并发数、队列深度和排队时间"""
+            return self.admission.get_stats()
+        
+        @app.get("/v1/cache/stats")
+        async def cache_stats():
+            """结果缓存统计"""
+            if not self.response_cache:
+                return {"enabled": False}
+            return {"enabled": True, **self.response_cache.get_stats()}
+        
+        @app.get("/v1/prefix_cache/stats")
+        async def prefix_cache_stats():
+            """前缀复用统计：每个共享前缀的请求数和KV缓存命中"""
+            return {
+                "enabled": self.config.enable_prefix_caching,
+                "layout": self.prompt_manager.layout.value,
+                **self.prefix_tracker.get_stats()
+            }
+        
+        @app.get("/v1/context_budget/stats")
+        async def context_budget_stats():
+            """上下文预算统计：截断的请求数、丢弃的消息数和分词缓存命中"""
+            if not self.context_budget:
+                return {"enabled": False}
+            return {"enabled": True, **self.context_budget.get_stats()}
+        
+        @app.get("/v1/speculative/stats")
+        async def speculative_stats():
+            """投机解码统计：推测token数、接受数、接受率和平均接受长度"""
+            if not self.config.speculative_method:
+                return {"enabled": False}
+            return {
+                "enabled": True,
+                "method": self.config.speculative_method,
+                "num_speculative_tokens": self.config.num_speculative_tokens,
+                **collect_spec_decode_stats()
+            }
+        
+        @app.get("/metrics")
+        async def metrics():
+            """Prometheus指标：首token延迟、token间延迟、吞吐、排队时间和token数"""
+            return Response(
+                content=self.metrics.render(), media_type=CONTENT_TYPE_LATEST
+            )
+        
+        @app.get("/v1/requests")
+        async def list_active_requests():
+            """列出进行中的生成请求"""
             return {
                 "object": "list",
                 "data": [
+                    {
+                        "id": request_id,
+                        "model": ctx.request.model,
+                        "stream": ctx.request.stream
+                    }
+                    for request_id, ctx in self._active_generations.items()
+                ]
+            }
+        
+        @app.post("/v1/requests/{request_id}/cancel")
+        async def cancel_request(request_id: str):
+            """按请求ID取消生成，释放引擎批处理槽位"""
+            ctx = self._active_generations.get(request_id)
+            if ctx is None:
+                raise HTTPException(status_code=404, detail=f"请求不存在或已结束: {request_id}")
+            
+            return {"id": request_id, "cancelled": self._abort_generation(ctx, "API取消")}
+        
+        @app.post("/v1/batch")
+        async def batch_completions(http_request: Request):
+            """
+            批量聊天完成
+            
+            请求体为JSONL，每行 {"custom_id": ..., "body": 聊天完成请求}；
+            所有请求同时提交给引擎，结果按完成顺序以JSONL流式返回。
+            """
+            from fastapi.responses import StreamingResponse
+            
+            self._ensure_ready()
+            
+            try:
+                items = parse_batch_requests(
+                    await http_request.body(),
+                    max_requests=self.config.batch_max_requests
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            return StreamingResponse(
+                self._run_batch(items),
+                media_type=BATCH_MEDIA_TYPE,
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        @app.get("/v1/models")
+        async def list_models():
+            """列出可用模型，包括已注册的LoRA适配器"""
+            base_model = self.config.served_model_name or self.config.model_name
+            models = [
+                ModelInfo(
+                    id=base_model,
+                    object="model",
+                    created=0,
+                    owned_by="vllm"
+                ).dict()
+            ]
+            if self.lora_registry:
+                models.extend(
                     ModelInfo(
-                        id=self.config.served_model_name or self.config.model_name,
+                        id=adapter.name,
                         object="model",
-                        created=0,
-                        owned_by="vllm"
+                        created=adapter.created,
+                        owned_by="vllm",
+                        root=adapter.path,
+                        parent=base_model
                     ).dict()
-                ]
-            }
+                    for adapter in self.lora_registry.list_adapters()
+                )
+            return {"object": "list", "data": models}
+        
+        @app.get("/v1/lora_adapters")
+        async def lora_adapters():
+            """LoRA适配器列表和驻留情况"""
+            if not self.lora_registry:
+                return {"enabled": False}
+            return {"enabled": True, **self.lora_registry.get_stats()}
+        
+        @app.post("/v1/lora_adapters/reload")
+        async def reload_lora_adapters():
+            """重新扫描适配器目录，无需重启即可上线新的适配器"""
+            if not self.lora_registry:
+                raise HTTPException(status_code=400, detail="未启用LoRA")
+            return {"adapters": self.lora_registry.scan()}
         
         @app.post("/v1/chat/completions")
-        async def chat_completions(request: ChatCompletionRequest):
-            """聊天完成接口"""
-            if not self.engine:
-                raise HTTPException(status_code=503, detail="引擎未就绪")
+        async def chat_completions(
+            request: ChatCompletionRequest, http_request: Request
+        ):
+            """聊天完成接口，可通过X-Request-ID请求头指定请求ID以便取消"""
+            from vllm import SamplingParams
+            
+            self._ensure_ready()
             
             try:
                 # 处理提示词
-                prompt = self.prompt_manager.format_chat_prompt(request.messages)
+                rendered, prompt_token_ids = self._render_prompt(request)
                 
                 # 构建采样参数
-                sampling_params = SamplingParams(
-                    max_tokens=request.max_tokens,
-                    temperature=request.temperature,
-                    top_p=request.top_p,
-                    top_k=request.top_k or -1,
-                    frequency_penalty=request.frequency_penalty,
-                    presence_penalty=request.presence_penalty,
-                    repetition_penalty=request.repetition_penalty,
-                    stop=request.stop,
-                    use_beam_search=request.use_beam_search,
-                    best_of=request.best_of,
-                    length_penalty=request.length_penalty,
-                    early_stopping=request.early_stopping,
+                sampling_kwargs = self._build_sampling_kwargs(request)
+            except (ContextBudgetError, UnknownPromptFamilyError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                logger.error(f"聊天完成请求处理失败: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+            
+            # 查询结果缓存，命中时不占用引擎槽位
+            cache_key = self._cache_key(request, rendered, sampling_kwargs)
+            if cache_key:
+                cached = await self.response_cache.get(
+                    *cache_key, text=semantic_cache_text(request.messages)
                 )
-                
-                # 生成请求ID
-                request_id = random_uuid()
+                if cached:
+                    self.metrics.record_request(
+                        self._model_label(request.model), rendered.family, STATUS_CACHED
+                    )
+                    return self._serve_cached(cached, request)
+            
+            request_id = http_request.headers.get("x-request-id") or random_uuid()
+            if request_id in self._active_generations:
+                raise HTTPException(status_code=409, detail=f"请求ID已存在: {request_id}")
+            
+            request_metrics = self.metrics.start_request(
+                self._model_label(request.model), rendered.family
+            )
+            try:
+                ticket = await self._admit(request)
+            except HTTPException:
+                request_metrics.finish(STATUS_REJECTED)
+                raise
+            request_metrics.record_queue_wait(ticket.wait_time)
+            handed_off = False
+            
+            try:
+                ctx = GenerationContext(
+                    request=request,
+                    request_id=request_id,
+                    rendered=rendered,
+                    sampling_params=SamplingParams(**sampling_kwargs),
+                    ticket=ticket,
+                    cache_key=cache_key,
+                    metrics=request_metrics,
+                    prompt_token_ids=prompt_token_ids,
+                    lora_request=self._resolve_lora(request.model)
+                )
+                self._active_generations[request_id] = ctx
+                self.prefix_tracker.record_request(rendered)
                 
                 if request.stream:
-                    # 流式响应
-                    return await self._handle_streaming_request(
-                        prompt, sampling_params, request_id, request
-                    )
+                    # 流式响应，槽位在响应结束时释放
+                    response = await self._handle_streaming_request(ctx)
+                    handed_off = True
+                    return response
                 else:
                     # 非流式响应
-                    return await self._handle_non_streaming_request(
-                        prompt, sampling_params, request_id, request
-                    )
+                    return await self._handle_non_streaming_request(ctx, http_request)
                     
+            except HTTPException:
+                raise
+            except asyncio.CancelledError:
+                self._abort_generation(ctx, "请求任务被取消")
+                request_metrics.finish(STATUS_CANCELLED)
+                raise
             except Exception as e:
                 logger.error(f"聊天完成请求处理失败: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
+            finally:
+                if not handed_off:
+                    self._active_generations.pop(request_id, None)
+                    ticket.release()
+                    # 已正常结束时为空操作
+                    request_metrics.finish(STATUS_ERROR)
+    
+    def _model_label(self, model: str) -> str:
+        """
+        指标的model标签
+
+        model由客户端任意传入，只有服务的模型名和已注册的LoRA适配器名原样使用，
+        其他值归为other，避免产生无限多的时间序列。
+        """
+        if model == (self.config.served_model_name or self.config.model_name):
+            return model
+        if self.lora_registry and self.lora_registry.get(model):
+            return model
+        return MODEL_LABEL_OTHER
+    
+    def _resolve_lora(self, model: str) -> Optional["LoRARequest"]:
+        """model为已注册的适配器名称时返回LoRARequest，否则使用基础模型"""
+        from vllm.lora.request import LoRARequest
+        
+        if not self.lora_registry:
+            return None
+        adapter = self.lora_registry.acquire(model)
+        if adapter is None:
+            return None
+        return LoRARequest(adapter.name, adapter.lora_id, adapter.path)
+    
+    def _render_prompt(
+        self, request: ChatCompletionRequest
+    ) -> Tuple[RenderedPrompt, Optional[List[int]]]:
+        """渲染提示词；启用上下文预算时按预算截断历史，并返回分词结果"""
+        if self.context_budget:
+            budgeted = self.context_budget.fit(
+                request.messages,
+                request.max_tokens,
+                family=request.prompt_family,
+                continue_final_message=request.continue_final_message
+            )
+            return budgeted.rendered, budgeted.prompt_token_ids
+        
+        rendered = self.prompt_manager.render_chat_prompt(
+            request.messages,
+            family=request.prompt_family,
+            continue_final_message=request.continue_final_message
+        )
+        return rendered, None
+    
+    @staticmethod
+    def _build_sampling_kwargs(request: ChatCompletionRequest) -> Dict[str, Any]:
+        """从请求构建采样参数"""
+        return dict(
+            n=request.n,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            top_k=request.top_k or -1,
+            frequency_penalty=request.frequency_penalty,
+            presence_penalty=request.presence_penalty,
+            repetition_penalty=request.repetition_penalty,
+            stop=request.stop,
+            use_beam_search=request.use_beam_search,
+            best_of=request.best_of,
+            length_penalty=request.length_penalty,
+            early_stopping=request.early_stopping,
+        )
+    
+    def _cache_key(
+        self,
+        request: ChatCompletionRequest,
+        rendered: RenderedPrompt,
+        sampling_kwargs: Dict[str, Any]
+    ) -> Optional[Tuple[str, str]]:
+        """
+        可缓存时返回 (key, namespace)
+
+        系统提示词（模板族和调用方的系统消息）计入命名空间，
+        语义缓存只在系统提示词相同的请求之间比较对话内容。
+        """
+        if not self.response_cache:
+            return None
+        if not ResponseCache.is_cacheable(request.temperature, request.allow_cached):
+            return None
+        system = [
+            message.content for message in request.messages
+            if message.role == "system"
+        ]
+        return ResponseCache.make_key(
+            rendered.text,
+            {
+                "model": request.model,
+                "family": rendered.family,
+                "system": system,
+                **sampling_kwargs
+            }
+        )
+    
+    def _abort_generation(self, ctx: GenerationContext, reason: str) -> bool:
+        """
+        中止引擎中的生成请求
+        
+        断开处理可能发生在已被取消的任务中，在其中await会再次被取消，
+        因此引擎abort放到独立任务中执行。返回是否发起了中止。
+        """
+        if ctx.finished or ctx.cancelled:
+            return False
+        ctx.cancelled = True
+        
+        if ctx.metrics:
+            logger.info(
+                f"中止生成请求 {ctx.request_id}，原因: {reason}，"
+                f"已生成 {ctx.metrics.completion_tokens} 个token"
+            )
+        
+        if self.engine:
+            task = asyncio.get_running_loop().create_task(
+                self.engine.abort(ctx.request_id)
+            )
+            self._abort_tasks.add(task)
+            task.add_done_callback(self._abort_tasks.discard)
+        return True
+    
+    async def _watch_disconnect(self, http_request: Request, ctx: GenerationContext):
+        """轮询客户端连接，断开时中止生成"""
+        while not ctx.finished:
+            if await http_request.is_disconnected():
+                self._abort_generation(ctx, "客户端断开")
+                return
+            await asyncio.sleep(self.config.disconnect_check_interval)
+    
+    def _on_generation_finished(self, ctx: GenerationContext, final_output):
+        """生成结束后写入结果缓存并记录前缀复用"""
+        ctx.finished = True
+        if final_output is None or ctx.cancelled:
+            return
+        
+        self.prefix_tracker.record_output(ctx.rendered.prefix_hash, final_output)
+        
+        if ctx.cache_key:
+            key, namespace = ctx.cache_key
+            # 语义缓存写入需要向量化，放到后台任务中，不推迟响应结束
+            task = asyncio.get_running_loop().create_task(self.response_cache.set(
+                key,
+                CachedResponse.from_vllm_output(final_output),
+                namespace=namespace,
+                text=semantic_cache_text(ctx.request.messages)
+            ))
+            self._cache_tasks.add(task)
+            task.add_done_callback(self._cache_tasks.discard)
+    
+    def _serve_cached(self, cached: CachedResponse, request: ChatCompletionRequest):
+        """返回缓存结果，流式请求按数据块回放"""
+        from fastapi.responses import StreamingResponse
+        
+        request_id = random_uuid()
+        if not request.stream:
+            return cached.to_response(request_id, request.model).dict()
+        
+        include_usage = (
+            request.stream_options.include_usage if request.stream_options else True
+        )
+        
+        def replay_stream():
+            for chunk in cached.iter_stream_chunks(request_id, request.model):
+                yield self._format_sse(chunk.dict(exclude_none=True))
+            if include_usage:
+                usage_chunk = ChatCompletionResponse(
+                    id=request_id,
+                    object="chat.completion.chunk",
+                    model=request.model,
+                    choices=[],
+                    usage=cached.usage()
+                )
+                yield self._format_sse(usage_chunk.dict(exclude_none=True))
+            yield SSE_DONE
+        
+        return StreamingResponse(
+            replay_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    async def _admit(self, request: ChatCompletionRequest) -> AdmissionTicket:
+        """申请引擎并发槽位，队列饱和时返回429"""
+        try:
+            return await self.admission.acquire(RequestPriority.parse(request.priority))
+        except AdmissionRejectedError as e:
+            logger.warning(f"请求被准入控制拒绝: {e}")
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+    
+    def _can_return_early(self, request: ChatCompletionRequest) -> bool:
+        """束搜索和best_of大于n时最终候选要到结束才确定，不能提前返回"""
+        if not self.config.non_streaming_early_return or request.use_beam_search:
+            return False
+        return (request.best_of or request.n) <= request.n
+    
+    async def _run_to_completion(self, ctx: GenerationContext) -> Optional[Any]:
+        """运行生成直到所有候选结束，只保留最新的累计输出；请求被取消时返回None"""
+        request = ctx.request
+        final_output = None
+        try:
+            final_output = await collect_final_output(
+                self.engine.generate(
+                    ctx.engine_prompt, ctx.sampling_params, ctx.request_id,
+                    lora_request=ctx.lora_request
+                ),
+                expected_choices=request.n,
+                early_return=self._can_return_early(request),
+                on_output=ctx.metrics.on_output
+            )
+        except asyncio.CancelledError:
+            # 引擎中止请求时生成流以CancelledError结束
+            if not ctx.cancelled:
+                raise
+        
+        if ctx.cancelled:
+            ctx.metrics.finish(STATUS_CANCELLED)
+            return None
+        
+        if final_output is None:
+            raise RuntimeError("生成失败")
+        
+        self._on_generation_finished(ctx, final_output)
+        ctx.metrics.finish()
+        return final_output
     
     async def _handle_non_streaming_request(
-        self, 
-        prompt: str, 
-        sampling_params: SamplingParams, 
-        request_id: str,
-        request: ChatCompletionRequest
+        self, ctx: GenerationContext, http_request: Request
     ):
         """处理非流式请求"""
+        watcher = asyncio.create_task(self._watch_disconnect(http_request, ctx))
         try:
-            # 生成响应
-            results = []
-            async for request_output in self.engine.generate(
-                prompt, sampling_params, request_id
-            ):
-                results.append(request_output)
-            
-            if not results:
-                raise HTTPException(status_code=500, detail="生成失败")
-            
-            final_output = results[-1]
+            final_output = await self._run_to_completion(ctx)
+            if final_output is None:
+                raise HTTPException(
+                    status_code=HTTP_CLIENT_CLOSED_REQUEST, detail="请求已取消"
+                )
             
             # 构建响应
             response = ChatCompletionResponse.from_vllm_output(
-                final_output, request.model
+                final_output, ctx.request.model
             )
             
             return response.dict()
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"非流式请求处理失败: {e}")
             raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            ctx.finished = True
+            watcher.cancel()
     
-    async def _handle_streaming_request(
-        self, 
-        prompt: str, 
-        sampling_params: SamplingParams, 
-        request_id: str,
-        request: ChatCompletionRequest
-    ):
+    async def _run_batch(
+        self, items: List[BatchRequestItem]
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        批处理：按并发上限陆续提交给引擎，按完成顺序逐行返回结果
+        
+        批处理请求不经过准入控制，避免大批量请求占满排队队列、让在线请求被拒绝；
+        同时提交的数量由batch_max_in_flight限制，默认与max_num_seqs一致，
+        即最多占满引擎一轮调度的序列数，其余请求等待空位后再创建任务。
+        客户端断开时取消所有未完成的请求。
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        limit = asyncio.Semaphore(
+            self.config.batch_max_in_flight or self.config.max_num_seqs
+        )
+        tasks: Set[asyncio.Task] = set()
+        
+        async def run(item: BatchRequestItem):
+            try:
+                result = await self._generate_batch_item(item)
+            except Exception as e:
+                logger.error(f"批处理请求 {item.custom_id} 失败: {e}")
+                result = BatchResult(custom_id=item.custom_id, error=str(e))
+            finally:
+                limit.release()
+            results.put_nowait(result)
+        
+        async def submit():
+            for item in items:
+                await limit.acquire()
+                task = asyncio.create_task(run(item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        
+        submitter = asyncio.create_task(submit())
+        logger.info(f"批处理开始提交 {len(items)} 个请求")
+        try:
+            for _ in range(len(items)):
+                yield encode_batch_result(await results.get())
+        finally:
+            submitter.cancel()
+            for task in list(tasks):
+                task.cancel()
+    
+    async def _generate_batch_item(self, item: BatchRequestItem) -> BatchResult:
+        """生成批处理中的单个请求，与非流式接口共用缓存、前缀统计和指标"""
+        from vllm import SamplingParams
+        
+        request = item.body.copy(update={"stream": False})
+        rendered, prompt_token_ids = self._render_prompt(request)
+        sampling_kwargs = self._build_sampling_kwargs(request)
+        
+        cache_key = self._cache_key(request, rendered, sampling_kwargs)
+        if cache_key:
+            cached = await self.response_cache.get(
+                *cache_key, text=semantic_cache_text(request.messages)
+            )
+            if cached:
+                self.metrics.record_request(
+                    self._model_label(request.model), rendered.family, STATUS_CACHED
+                )
+                return BatchResult(
+                    custom_id=item.custom_id,
+                    response=cached.to_response(random_uuid(), request.model)
+                )
+        
+        ctx = GenerationContext(
+            request=request,
+            request_id=f"batch-{random_uuid()}",
+            rendered=rendered,
+            sampling_params=SamplingParams(**sampling_kwargs),
+            cache_key=cache_key,
+            metrics=self.metrics.start_request(
+                self._model_label(request.model), rendered.family
+            ),
+            prompt_token_ids=prompt_token_ids,
+            lora_request=self._resolve_lora(request.model)
+        )
+        self._active_generations[ctx.request_id] = ctx
+        self.prefix_tracker.record_request(rendered)
+        
+        try:
+            final_output = await self._run_to_completion(ctx)
+        except asyncio.CancelledError:
+            self._abort_generation(ctx, "批处理中断")
+            ctx.metrics.finish(STATUS_CANCELLED)
+            raise
+        except Exception:
+            ctx.metrics.finish(STATUS_ERROR)
+            raise
+        finally:
+            ctx.finished = True
+            self._active_generations.pop(ctx.request_id, None)
+        
+        if final_output is None:
+            return BatchResult(custom_id=item.custom_id, error="请求已取消")
+        return BatchResult(
+            custom_id=item.custom_id,
+            response=ChatCompletionResponse.from_vllm_output(
+                final_output, request.model
+            )
+        )
+    
+    async def _handle_streaming_request(self, ctx: GenerationContext):
         """处理流式请求"""
-        from fastapi.responses import StreamingResponse
-        import json
+        request = ctx.request
+        tracker = DeltaStreamTracker(
+            request_id=ctx.request_id, model_name=request.model
+        )
+        include_usage = (
+            request.stream_options.include_usage if request.stream_options else True
+        )
+        continuous_usage = bool(
+            request.stream_options and request.stream_options.continuous_usage_stats
+        )
         
         async def generate_stream():
+            final_output = None
             try:
-                async for request_output in self.engine.generate(
-                    prompt, sampling_params, request_id
-                ):
-                    # 构建流式响应
-                    response = ChatCompletionResponse.from_vllm_output(
-                        request_output, request.model, stream=True
+                try:
+                    async for request_output in self.engine.generate(
+                        ctx.engine_prompt, ctx.sampling_params, ctx.request_id,
+                        lora_request=ctx.lora_request
+                    ):
+                        final_output = request_output
+                        # 只发送新增的内容，直接编码为SSE帧
+                        frame = tracker.update_sse(request_output)
+                        if frame is None:
+                            continue
+                        
+                        ctx.metrics.on_output(request_output)
+                        yield frame
+                        if continuous_usage:
+                            yield self._format_sse(
+                                tracker.usage_chunk().dict(exclude_none=True)
+                            )
+                except asyncio.CancelledError:
+                    # 通过API取消时生成流以CancelledError结束，客户端断开时继续向上抛出
+                    if not ctx.cancelled:
+                        raise
+                
+                if ctx.cancelled:
+                    ctx.metrics.finish(STATUS_CANCELLED)
+                    yield self._format_sse({
+                        "error": {"message": "请求已取消", "type": "cancelled"}
+                    })
+                    return
+                
+                self._on_generation_finished(ctx, final_output)
+                ctx.metrics.finish()
+                
+                # 发送使用统计
+                if include_usage:
+                    yield self._format_sse(
+                        tracker.usage_chunk().dict(exclude_none=True)
                     )
-                    
-                    # 发送数据
-                    yield f"data: {json.dumps(response.dict())}\n\n"
                 
                 # 发送结束标记
-                yield "data: [DONE]\n\n"
+                yield SSE_DONE
                 
             except Exception as e:
                 logger.error(f"流式请求处理失败: {e}")
+                ctx.metrics.finish(STATUS_ERROR)
                 error_response = {
                     "error": {
                         "message": str(e),
                         "type": "internal_error"
                     }
                 }
-                yield f"data: {json.dumps(error_response)}\n\n"
+                yield self._format_sse(error_response)
+            finally:
+                self._close_stream(ctx)
         
-        return StreamingResponse(
+        return GenerationStreamingResponse(
             generate_stream(),
-            media_type="text/plain",
+            on_close=lambda: self._close_stream(ctx),
+            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
+                "X-Accel-Buffering": "no",
+                "X-Request-ID": ctx.request_id,
             }
         )
     
+    def _close_stream(self, ctx: GenerationContext):
+        """流式请求结束时释放资源，可重复调用"""
+        # 客户端断开时生成器被关闭，中止引擎中仍在解码的请求
+        self._abort_generation(ctx, "客户端断开")
+        ctx.finished = True
+        self._active_generations.pop(ctx.request_id, None)
+        if ctx.ticket:
+            ctx.ticket.release()
+        # 未结束的请求记为取消
+        ctx.metrics.finish(STATUS_CANCELLED)
+    
+    @staticmethod
+    def _format_sse(data: dict) -> bytes:
+        """格式化SSE数据帧"""
+        return format_sse(data)
+    
     async def start_server(self):
         """启动服务器"""
         app = self.create_app()
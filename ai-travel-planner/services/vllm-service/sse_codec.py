@@ -0,0 +1,240 @@
+"""
+SSE帧编解码
+Fast-path SSE frame codec shared by server and client
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SSE_DONE = b"data: [DONE]\n\n"
+DONE_PAYLOAD = b"[DONE]"
+
+
+@dataclass(frozen=True)
+class JSONCodec:
+    """JSON编解码实现"""
+
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[Union[str, bytes]], Any]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_loads(data: Union[str, bytes]) -> Any:
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+STDLIB_CODEC = JSONCodec(name="stdlib", dumps=_stdlib_dumps, loads=_stdlib_loads)
+
+_CODECS: Dict[str, JSONCodec] = {"stdlib": STDLIB_CODEC}
+
+try:
+    import orjson
+
+    _CODECS["orjson"] = JSONCodec(name="orjson", dumps=orjson.dumps, loads=orjson.loads)
+except ImportError:
+    pass
+
+try:
+    import msgspec
+
+    _CODECS["msgspec"] = JSONCodec(
+        name="msgspec",
+        dumps=msgspec.json.Encoder().encode,
+        loads=msgspec.json.Decoder().decode,
+    )
+except ImportError:
+    pass
+
+
+def available_codecs() -> List[str]:
+    """已安装的编解码实现"""
+    return list(_CODECS)
+
+
+def _default_codec() -> JSONCodec:
+    name = os.getenv("VLLM_JSON_CODEC")
+    if name:
+        if name in _CODECS:
+            return _CODECS[name]
+        logger.warning(f"JSON编解码实现 {name} 不可用，使用默认实现")
+    for name in ("orjson", "msgspec"):
+        if name in _CODECS:
+            return _CODECS[name]
+    return STDLIB_CODEC
+
+
+_codec = _default_codec()
+
+
+def get_json_codec() -> JSONCodec:
+    """获取当前使用的JSON编解码实现"""
+    return _codec
+
+
+def set_json_codec(codec: Union[str, JSONCodec]):
+    """切换JSON编解码实现"""
+    global _codec
+    if isinstance(codec, str):
+        if codec not in _CODECS:
+            raise ValueError(f"不支持的JSON编解码实现: {codec}，可用: {available_codecs()}")
+        codec = _CODECS[codec]
+    _codec = codec
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8 JSON字节"""
+    return _codec.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """解析JSON"""
+    return _codec.loads(data)
+
+
+def format_sse(data: Dict[str, Any]) -> bytes:
+    """格式化SSE数据帧"""
+    return b"data: " + _codec.dumps(data) + b"\n\n"
+
+
+class SSEFrameEncoder:
+    """
+    流式数据块帧编码器
+
+    同一请求的数据块只有choices不同，id/object/created/model部分预先序列化，
+    每帧只对增量文本做JSON编码，不经过pydantic模型。
+    输出与 ChatCompletionResponse.dict(exclude_none=True) 的JSON等价。
+    """
+
+    def __init__(
+        self,
+        request_id: str,
+        model_name: str,
+        created: int,
+        codec: Optional[JSONCodec] = None,
+    ):
+        self.codec = codec or get_json_codec()
+        dumps = self.codec.dumps
+        self._head = (
+            b'data: {"id":'
+            + dumps(request_id)
+            + b',"object":"chat.completion.chunk","created":'
+            + str(created).encode()
+            + b',"model":'
+            + dumps(model_name)
+            + b',"choices":['
+        )
+        self._tail = b"]}\n\n"
+        self._finish_reasons: Dict[str, bytes] = {}
+
+    def _choice(
+        self,
+        index: int,
+        content: Optional[str],
+        role: Optional[str],
+        finish_reason: Optional[str],
+    ) -> bytes:
+        parts = [b'{"index":', str(index).encode(), b',"delta":{']
+        if role is not None:
+            parts.append(b'"role":')
+            parts.append(self.codec.dumps(role))
+            if content is not None:
+                parts.append(b",")
+        if content is not None:
+            parts.append(b'"content":')
+            parts.append(self.codec.dumps(content))
+        parts.append(b"}")
+        if finish_reason is not None:
+            encoded = self._finish_reasons.get(finish_reason)
+            if encoded is None:
+                encoded = b',"finish_reason":' + self.codec.dumps(finish_reason)
+                self._finish_reasons[finish_reason] = encoded
+            parts.append(encoded)
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def encode_delta(
+        self,
+        index: int,
+        content: Optional[str],
+        role: Optional[str] = None,
+        finish_reason: Optional[str] = None,
+    ) -> bytes:
+        """编码单个候选的增量数据帧"""
+        return (
+            self._head + self._choice(index, content, role, finish_reason) + self._tail
+        )
+
+    def encode_choices(
+        self, choices: List[Tuple[int, Optional[str], Optional[str], Optional[str]]]
+    ) -> bytes:
+        """编码多个候选的增量数据帧，元素为 (index, content, role, finish_reason)"""
+        return (
+            self._head
+            + b",".join(self._choice(*choice) for choice in choices)
+            + self._tail
+        )
+
+
+class SSEDecoder:
+    """
+    增量SSE解析器
+
+    直接在原始字节上按空行切分事件，单行data事件只切片一次负载，
+    不逐行解码为字符串。多行data按规范以换行拼接，其他字段和注释忽略。
+    """
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """输入原始字节，返回已完成事件的data负载"""
+        buffer = self._buffer + chunk if self._buffer else bytes(chunk)
+
+        if b"\r" in buffer:
+            # \r\n可能被拆在两个数据块之间，末尾的\r留到下次处理
+            carry = buffer.endswith(b"\r")
+            if carry:
+                buffer = buffer[:-1]
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            if carry:
+                buffer += b"\r"
+
+        raw_events = buffer.split(b"\n\n")
+        self._buffer = raw_events.pop()
+        return self._parse_events(raw_events)
+
+    def flush(self) -> List[bytes]:
+        """流结束时返回未以空行结尾的事件"""
+        buffer, self._buffer = self._buffer.rstrip(b"\r"), b""
+        if not buffer:
+            return []
+        return self._parse_events([buffer])
+
+    @staticmethod
+    def _parse_events(raw_events: List[bytes]) -> List[bytes]:
+        events: List[bytes] = []
+        for event in raw_events:
+            # 快速路径：单行 "data: ..." 事件
+            if event.startswith(b"data: ") and b"\n" not in event:
+                events.append(event[6:])
+                continue
+
+            data = []
+            for line in event.split(b"\n"):
+                if line.startswith(b"data:"):
+                    value = line[5:]
+                    data.append(value[1:] if value.startswith(b" ") else value)
+            if data:
+                events.append(data[0] if len(data) == 1 else b"\n".join(data))
+        return events
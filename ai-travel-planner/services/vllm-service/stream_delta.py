@@ -0,0 +1,170 @@
+"""
+流式增量输出跟踪
+Incremental delta tracking for streaming responses
+"""
+
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from .models import ChatCompletionChoice, ChatCompletionResponse, DeltaMessage, Usage
+from .sse_codec import SSEFrameEncoder
+
+# (index, content, role, finish_reason)
+DeltaTuple = Tuple[int, str, Optional[str], Optional[str]]
+
+
+@dataclass
+class ChoiceOffset:
+    """单个候选的已发送位置"""
+
+    text_offset: int = 0
+    token_count: int = 0
+    role_sent: bool = False
+    finished: bool = False
+
+
+@dataclass
+class DeltaStreamTracker:
+    """
+    流式增量跟踪器
+
+    vLLM每次返回的RequestOutput携带的是累计文本，跟踪器记录每个候选
+    已发送的文本偏移量，只把新增部分作为delta发送给客户端。
+    """
+
+    request_id: str
+    model_name: str
+    created: int = field(default_factory=lambda: int(time.time()))
+    offsets: Dict[int, ChoiceOffset] = field(default_factory=dict)
+    prompt_tokens: int = 0
+
+    _encoder: Optional[SSEFrameEncoder] = field(default=None, init=False, repr=False)
+
+    def _collect(self, request_output) -> List[DeltaTuple]:
+        """计算每个候选的新增内容"""
+        prompt_token_ids = getattr(request_output, "prompt_token_ids", None)
+        if prompt_token_ids:
+            self.prompt_tokens = len(prompt_token_ids)
+
+        deltas: List[DeltaTuple] = []
+        for position, output in enumerate(request_output.outputs):
+            index = getattr(output, "index", position)
+            state = self.offsets.get(index)
+            if state is None:
+                state = self.offsets[index] = ChoiceOffset()
+            if state.finished:
+                continue
+
+            text = output.text or ""
+            new_text = text[state.text_offset :]
+            state.text_offset = len(text)
+            state.token_count = len(getattr(output, "token_ids", None) or ())
+
+            finish_reason = output.finish_reason
+            if not new_text and finish_reason is None and state.role_sent:
+                continue
+
+            role = None
+            if not state.role_sent:
+                role = "assistant"
+                state.role_sent = True
+            if finish_reason is not None:
+                state.finished = True
+
+            deltas.append((index, new_text, role, finish_reason))
+
+        return deltas
+
+    def update(self, request_output) -> Optional[ChatCompletionResponse]:
+        """根据最新的累计输出构建增量数据块，没有新内容时返回None"""
+        deltas = self._collect(request_output)
+        if not deltas:
+            return None
+
+        return self._chunk(
+            [
+                ChatCompletionChoice(
+                    index=index,
+                    delta=DeltaMessage(role=role, content=content),
+                    finish_reason=finish_reason,
+                )
+                for index, content, role, finish_reason in deltas
+            ]
+        )
+
+    def update_sse(self, request_output) -> Optional[bytes]:
+        """与update相同，但直接返回编码好的SSE帧"""
+        deltas = self._collect(request_output)
+        if not deltas:
+            return None
+
+        if self._encoder is None:
+            self._encoder = SSEFrameEncoder(
+                self.request_id, self.model_name, self.created
+            )
+        if len(deltas) == 1:
+            return self._encoder.encode_delta(*deltas[0])
+        return self._encoder.encode_choices(deltas)
+
+    @property
+    def completion_tokens(self) -> int:
+        """已生成的token总数"""
+        return sum(state.token_count for state in self.offsets.values())
+
+    def usage(self) -> Usage:
+        """当前使用统计"""
+        return Usage(
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+        )
+
+    def usage_chunk(self) -> ChatCompletionResponse:
+        """构建结束前的使用统计数据块"""
+        return self._chunk([], usage=self.usage())
+
+    def _chunk(
+        self, choices: List[ChatCompletionChoice], usage: Optional[Usage] = None
+    ) -> ChatCompletionResponse:
+        return ChatCompletionResponse(
+            id=self.request_id,
+            object="chat.completion.chunk",
+            created=self.created,
+            model=self.model_name,
+            choices=choices,
+            usage=usage,
+        )
+
+
+def all_choices_finished(request_output, expected_choices: int = 1) -> bool:
+    """所有候选都已带有finish_reason"""
+    outputs = request_output.outputs
+    return len(outputs) >= expected_choices and all(
+        output.finish_reason is not None for output in outputs
+    )
+
+
+async def collect_final_output(
+    outputs: AsyncIterator[Any],
+    expected_choices: int = 1,
+    early_return: bool = True,
+    on_output: Optional[Callable[[Any], None]] = None,
+) -> Optional[Any]:
+    """
+    消费vLLM累计输出流，只保留最新一次输出
+
+    每次RequestOutput都包含各候选的完整累计文本，保留中间结果会让
+    每个请求占用O(token数)个快照。early_return时所有候选出现finish_reason
+    后立即返回并关闭生成流，不再等待引擎的收尾输出。
+    """
+    final_output = None
+    async with aclosing(outputs) as stream:
+        async for request_output in stream:
+            final_output = request_output
+            if on_output:
+                on_output(request_output)
+            if early_return and all_choices_finished(request_output, expected_choices):
+                break
+    return final_output
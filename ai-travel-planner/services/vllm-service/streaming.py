@@ -5,18 +5,27 @@ Streaming response handling and error retry mechanism
 
 import asyncio
 import logging
-import json
 import time
-from typing import AsyncGenerator, Optional, Dict, Any, Callable, List
+from contextlib import aclosing
+from typing import (
+    AsyncGenerator, AsyncIterator, Optional, Dict, Any, Callable, List, Union
+)
 from dataclasses import dataclass
 from enum import Enum
 import httpx
 
-from .models import ChatCompletionResponse, ChatMessage
+from . import sse_codec
+from .models import ChatCompletionRequest, ChatCompletionResponse, ChatMessage
 from .client import VLLMConnectionError, VLLMTimeoutError
+from .metrics import STATUS_CANCELLED, STATUS_ERROR, InferenceMetrics, RequestMetrics
+from .sse_codec import DONE_PAYLOAD
 
 logger = logging.getLogger(__name__)
 
+# 数据流工厂：接收续传前缀（已收到的文本），返回新的数据流
+StreamFactory = Callable[[str], AsyncIterator[Union[str, bytes]]]
+StreamSource = Union[AsyncIterator[Union[str, bytes]], StreamFactory]
+
 
 class RetryStrategy(Enum):
     """重试策略枚举"""
@@ -43,10 +52,12 @@ class StreamingStats:
     """流式统计信息"""
     start_time: float
     end_time: Optional[float] = None
+    first_chunk_time: Optional[float] = None
     total_tokens: int = 0
     chunks_received: int = 0
     errors_count: int = 0
     retries_count: int = 0
+    continuation_chars: int = 0
     
     @property
     def duration(self) -> Optional[float]:
@@ -55,6 +66,13 @@ class StreamingStats:
             return self.end_time - self.start_time
         return None
     
+    @property
+    def time_to_first_chunk(self) -> Optional[float]:
+        """首个数据块延迟"""
+        if self.first_chunk_time:
+            return self.first_chunk_time - self.start_time
+        return None
+    
     @property
     def tokens_per_second(self) -> Optional[float]:
         """获取每秒token数"""
@@ -73,6 +91,11 @@ class StreamingTimeoutError(StreamingError):
     pass
 
 
+class StreamingDeadlineError(StreamingTimeoutError):
+    """流式处理超过总时限"""
+    pass
+
+
 class StreamingConnectionError(StreamingError):
     """流式连接错误"""
     pass
@@ -116,9 +139,11 @@ class StreamingHandler:
         if attempt >= self.retry_config.max_retries:
             return False
         
-        if isinstance(error, VLLMTimeoutError):
+        if isinstance(error, StreamingDeadlineError):
+            return False
+        elif isinstance(error, (VLLMTimeoutError, StreamingTimeoutError)):
             return self.retry_config.retry_on_timeout
-        elif isinstance(error, VLLMConnectionError):
+        elif isinstance(error, (VLLMConnectionError, StreamingConnectionError)):
             return self.retry_config.retry_on_connection_error
         elif isinstance(error, httpx.HTTPStatusError):
             return (
@@ -128,26 +153,28 @@ class StreamingHandler:
         
         return False
     
-    async def _handle_stream_chunk(self, chunk: str) -> Optional[Dict[str, Any]]:
-        """处理流式数据块"""
+    async def _handle_stream_chunk(
+        self, chunk: Union[str, bytes]
+    ) -> Optional[Dict[str, Any]]:
+        """处理流式数据块，支持字符串和原始字节负载"""
         try:
             # 更新统计信息
             self.stats.chunks_received += 1
             
             # 跳过空行和注释
             chunk = chunk.strip()
-            if not chunk or chunk.startswith('#'):
+            if not chunk or chunk[:1] in ("#", b"#"):
                 return None
             
             # 处理结束标记
-            if chunk == "[DONE]":
+            if chunk == "[DONE]" or chunk == DONE_PAYLOAD:
                 return {"done": True}
             
-            # 解析JSON数据
+            # 解析JSON数据，orjson可直接解析字节
             try:
-                data = json.loads(chunk)
-            except json.JSONDecodeError as e:
-                logger.warning(f"无法解析流式数据块: {chunk}, 错误: {e}")
+                data = sse_codec.loads(chunk)
+            except ValueError as e:
+                logger.warning(f"无法解析流式数据块: {chunk!r}, 错误: {e}")
                 return None
             
             # 检查错误
@@ -157,7 +184,9 @@ class StreamingHandler:
             
             # 调用回调函数
             if self.on_chunk_received:
-                self.on_chunk_received(chunk)
+                self.on_chunk_received(
+                    chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+                )
             
             return data
             
@@ -169,49 +198,66 @@ class StreamingHandler:
     
     async def process_stream(
         self, 
-        stream_generator: AsyncGenerator[str, None]
+        stream_source: StreamSource
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        """处理流式数据"""
+        """
+        处理流式数据
+
+        stream_source可以是异步迭代器，也可以是接收续传前缀并返回新数据流的
+        工厂函数。每个数据块都有空闲时限(chunk_timeout)，整个流有总时限(timeout)。
+        使用工厂函数时，中断后以已收到的文本作为前缀续传，不重新生成已发送的token；
+        续传只跟踪index为0的候选，多候选流在收到数据后中断不再重试。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        factory = stream_source if callable(stream_source) else None
+        
+        received_text: List[str] = []
+        resumable = True
+        finished = False
         attempt = 0
         
-        while attempt <= self.retry_config.max_retries:
+        while True:
+            prefix = "".join(received_text)
+            stream = factory(prefix) if factory else stream_source
+            
             try:
-                # 设置超时
-                timeout_task = asyncio.create_task(
-                    asyncio.sleep(self.timeout)
-                )
-                stream_task = asyncio.create_task(
-                    self._process_stream_internal(stream_generator)
-                )
-                
-                try:
-                    async for chunk_data in stream_task:
+                chunks = self._iterate_with_deadlines(stream, deadline)
+                async with aclosing(chunks):
+                    async for chunk_data in chunks:
                         # 检查是否完成
                         if chunk_data.get("done"):
+                            finished = True
                             break
                         
-                        yield chunk_data
+                        for choice in chunk_data.get("choices") or []:
+                            if choice.get("index", 0) != 0:
+                                resumable = False
+                                continue
+                            delta = choice.get("delta") or {}
+                            if prefix:
+                                # 续传的流不重复发送角色
+                                delta.pop("role", None)
+                            content = delta.get("content")
+                            if content:
+                                received_text.append(content)
+                            if choice.get("finish_reason"):
+                                finished = True
                         
-                        # 重置chunk超时
-                        if not timeout_task.done():
-                            timeout_task.cancel()
-                            timeout_task = asyncio.create_task(
-                                asyncio.sleep(self.chunk_timeout)
-                            )
-                    
-                    # 成功完成
-                    break
-                    
-                except asyncio.TimeoutError:
-                    raise StreamingTimeoutError("流式处理超时")
-                finally:
-                    if not timeout_task.done():
-                        timeout_task.cancel()
-                    if not stream_task.done():
-                        stream_task.cancel()
+                        yield chunk_data
+                
+                # 成功完成
+                break
                 
+            except StreamingDeadlineError:
+                raise
             except Exception as e:
-                if not self._should_retry(e, attempt):
+                if finished:
+                    # 已收到结束原因，忽略结束标记前的中断
+                    break
+                
+                can_resume = factory is not None and (resumable or not received_text)
+                if not can_resume or not self._should_retry(e, attempt):
                     raise
                 
                 # 执行重试
@@ -222,8 +268,16 @@ class StreamingHandler:
                     self.on_retry(attempt, e)
                 
                 delay = self._calculate_delay(attempt - 1)
+                if loop.time() + delay >= deadline:
+                    raise StreamingDeadlineError(f"流式处理超过总时限 {self.timeout}s") from e
+                
+                if received_text:
+                    self.stats.continuation_chars += sum(
+                        len(text) for text in received_text
+                    )
                 logger.warning(
-                    f"流式处理失败，{delay}秒后重试 ({attempt}/{self.retry_config.max_retries}): {e}"
+                    f"流式处理失败，{delay}秒后续传 ({attempt}/{self.retry_config.max_retries}, "
+                    f"已接收 {sum(len(text) for text in received_text)} 字符): {e}"
                 )
                 await asyncio.sleep(delay)
         
@@ -233,15 +287,116 @@ class StreamingHandler:
         if self.on_complete:
             self.on_complete(self.stats)
     
-    async def _process_stream_internal(
+    async def _iterate_with_deadlines(
         self, 
-        stream_generator: AsyncGenerator[str, None]
+        stream: AsyncIterator[Union[str, bytes]],
+        deadline: float
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        """内部流式处理逻辑"""
-        async for chunk in stream_generator:
-            chunk_data = await self._handle_stream_chunk(chunk)
-            if chunk_data:
-                yield chunk_data
+        """逐块读取数据流，超过空闲时限或总时限时中断"""
+        loop = asyncio.get_running_loop()
+        iterator = stream.__aiter__()
+        
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise StreamingDeadlineError(f"流式处理超过总时限 {self.timeout}s")
+                
+                idle_timeout = min(self.chunk_timeout, remaining)
+                try:
+                    chunk = await asyncio.wait_for(
+                        iterator.__anext__(), timeout=idle_timeout
+                    )
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    if idle_timeout < self.chunk_timeout:
+                        raise StreamingDeadlineError(f"流式处理超过总时限 {self.timeout}s")
+                    raise StreamingTimeoutError(f"超过 {self.chunk_timeout}s 未收到数据")
+                
+                chunk_data = await self._handle_stream_chunk(chunk)
+                if chunk_data:
+                    if self.stats.first_chunk_time is None:
+                        self.stats.first_chunk_time = time.time()
+                    yield chunk_data
+        finally:
+            # 关闭底层数据流，释放连接
+            aclose = getattr(iterator, "aclose", None)
+            if aclose:
+                try:
+                    await aclose()
+                except Exception as e:
+                    logger.debug(f"关闭数据流失败: {e}")
+
+
+class StreamBudgetExhaustedError(StreamingError):
+    """续传前已用完max_tokens，服务端没有返回结束原因"""
+    pass
+
+
+def create_chat_stream_factory(
+    client,
+    messages: List[ChatMessage],
+    model: str = "default",
+    token_counter: Optional[Callable[[str], int]] = None,
+    **kwargs
+) -> StreamFactory:
+    """
+    创建可续传的聊天数据流工厂
+
+    续传时把已收到的文本作为最后一条assistant消息，并设置continue_final_message，
+    服务端从该前缀继续生成。请求开启continuous_usage_stats，每个数据块后
+    服务端都返回completion_tokens，续传请求的max_tokens减去之前各次已生成的
+    token数，总长度不超过原请求。传入token_counter（如分词器计数）时改用它
+    计算前缀的token数。预算已用完时抛出StreamBudgetExhaustedError，
+    不在客户端伪造结束数据块。
+    """
+    # 之前各次请求服务端报告的已生成token数，最后一项对应当前请求
+    reported: List[int] = []
+    
+    async def track_usage(
+        stream: AsyncIterator[bytes]
+    ) -> AsyncGenerator[bytes, None]:
+        async with aclosing(stream):
+            async for payload in stream:
+                if b'"usage"' in payload:
+                    usage = sse_codec.loads(payload).get("usage") or {}
+                    if usage.get("completion_tokens") is not None:
+                        reported[-1] = usage["completion_tokens"]
+                yield payload
+    
+    def factory(prefix: str) -> AsyncIterator[bytes]:
+        request_messages = list(messages)
+        params = dict(kwargs)
+        params.setdefault(
+            "stream_options", {"include_usage": True, "continuous_usage_stats": True}
+        )
+        if prefix:
+            request_messages.append(ChatMessage(role="assistant", content=prefix))
+            params["continue_final_message"] = True
+        else:
+            # 没有收到文本时从头生成，之前的计数作废
+            reported.clear()
+        request = ChatCompletionRequest(
+            model=model,
+            messages=request_messages,
+            stream=True,
+            **params
+        )
+        if prefix:
+            used = token_counter(prefix) if token_counter else sum(reported)
+            remaining = request.max_tokens - used
+            if remaining <= 0:
+                raise StreamBudgetExhaustedError(
+                    f"已生成 {used} 个token，用完max_tokens={request.max_tokens}"
+                )
+            request.max_tokens = remaining
+        reported.append(0)
+        return track_usage(
+            client._stream_request("POST", "/v1/chat/completions", request.dict())
+        )
+    
+    return factory
 
 
 class StreamingResponseProcessor:
@@ -251,11 +406,13 @@ class StreamingResponseProcessor:
         self,
         retry_config: Optional[RetryConfig] = None,
         buffer_size: int = 1024,
-        enable_stats: bool = True
+        enable_stats: bool = True,
+        metrics: Optional[InferenceMetrics] = None
     ):
         self.retry_config = retry_config or RetryConfig()
         self.buffer_size = buffer_size
         self.enable_stats = enable_stats
+        self.metrics = metrics
         
         # 缓冲区
         self._buffer: List[str] = []
@@ -266,8 +423,9 @@ class StreamingResponseProcessor:
     
     async def process_chat_stream(
         self,
-        stream_generator: AsyncGenerator[str, None],
-        model_name: str = "default"
+        stream_source: StreamSource,
+        model_name: str = "default",
+        prompt_template: Optional[str] = None
     ) -> AsyncGenerator[ChatCompletionResponse, None]:
         """处理聊天流式响应"""
         handler = StreamingHandler(
@@ -283,17 +441,17 @@ class StreamingResponseProcessor:
             handler.on_complete = self._on_complete
         
         try:
-            async for chunk_data in handler.process_stream(stream_generator):
-                if chunk_data.get("done"):
-                    break
-                
-                # 转换为ChatCompletionResponse
-                try:
-                    response = ChatCompletionResponse(**chunk_data)
-                    yield response
-                except Exception as e:
-                    logger.warning(f"无法解析响应数据: {chunk_data}, 错误: {e}")
-                    continue
+            async with aclosing(
+                self._iter_chunks(handler, stream_source, model_name, prompt_template)
+            ) as chunks:
+                async for chunk_data in chunks:
+                    # 转换为ChatCompletionResponse
+                    try:
+                        response = ChatCompletionResponse(**chunk_data)
+                        yield response
+                    except Exception as e:
+                        logger.warning(f"无法解析响应数据: {chunk_data}, 错误: {e}")
+                        continue
                     
         except Exception as e:
             logger.error(f"流式响应处理失败: {e}")
@@ -301,7 +459,9 @@ class StreamingResponseProcessor:
     
     async def process_text_stream(
         self,
-        stream_generator: AsyncGenerator[str, None]
+        stream_source: StreamSource,
+        model_name: str = "default",
+        prompt_template: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """处理文本流式响应"""
         handler = StreamingHandler(
@@ -311,24 +471,78 @@ class StreamingResponseProcessor:
         )
         
         try:
-            async for chunk_data in handler.process_stream(stream_generator):
-                if chunk_data.get("done"):
-                    break
-                
-                # 提取文本内容
-                if "choices" in chunk_data:
-                    choices = chunk_data["choices"]
-                    if choices and len(choices) > 0:
-                        choice = choices[0]
-                        if "delta" in choice and "content" in choice["delta"]:
-                            content = choice["delta"]["content"]
-                            if content:
-                                yield content
+            async with aclosing(
+                self._iter_chunks(handler, stream_source, model_name, prompt_template)
+            ) as chunks:
+                async for chunk_data in chunks:
+                    # 提取文本内容
+                    if "choices" in chunk_data:
+                        choices = chunk_data["choices"]
+                        if choices and len(choices) > 0:
+                            choice = choices[0]
+                            if "delta" in choice and "content" in choice["delta"]:
+                                content = choice["delta"]["content"]
+                                if content:
+                                    yield content
                                 
         except Exception as e:
             logger.error(f"文本流式处理失败: {e}")
             raise StreamingError(f"文本流式处理失败: {e}")
     
+    async def _iter_chunks(
+        self,
+        handler: StreamingHandler,
+        stream_source: StreamSource,
+        model_name: str,
+        prompt_template: Optional[str]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """遍历数据块，配置了metrics时记录首token延迟、token间延迟和token数"""
+        request_metrics = (
+            self.metrics.start_request(model_name, prompt_template)
+            if self.metrics else None
+        )
+        usage_completion_tokens = None
+        
+        try:
+            async for chunk_data in handler.process_stream(stream_source):
+                if chunk_data.get("done"):
+                    break
+                
+                if request_metrics:
+                    usage_completion_tokens = (
+                        self._observe_chunk(request_metrics, chunk_data)
+                        or usage_completion_tokens
+                    )
+                yield chunk_data
+            
+            if request_metrics:
+                request_metrics.finish(completion_tokens=usage_completion_tokens)
+        except Exception:
+            if request_metrics:
+                request_metrics.finish(STATUS_ERROR)
+            raise
+        finally:
+            # 调用方提前停止读取时记为取消，已结束时为空操作
+            if request_metrics:
+                request_metrics.finish(STATUS_CANCELLED)
+    
+    @staticmethod
+    def _observe_chunk(
+        request_metrics: RequestMetrics, chunk_data: Dict[str, Any]
+    ) -> Optional[int]:
+        """按数据块记录token，服务端每帧对应一个解码步；返回usage中的生成token数"""
+        pieces = sum(
+            1 for choice in chunk_data.get("choices") or []
+            if (choice.get("delta") or {}).get("content")
+        )
+        request_metrics.on_tokens(pieces)
+        
+        usage = chunk_data.get("usage")
+        if usage:
+            request_metrics.prompt_tokens = usage.get("prompt_tokens", 0)
+            return usage.get("completion_tokens")
+        return None
+    
     def _on_chunk_received(self, chunk: str):
         """处理接收到的数据块"""
         if self.stats:
@@ -0,0 +1,143 @@
+"""
+准入控制测试
+Admission control tests
+"""
+
+import asyncio
+
+import pytest
+
+from ..admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    AdmissionTimeoutError,
+    RequestPriority,
+)
+
+
+class TestRequestPriority:
+    """请求优先级测试类"""
+
+    def test_parse(self):
+        """测试优先级解析"""
+        assert RequestPriority.parse("high") == RequestPriority.HIGH
+        assert RequestPriority.parse("low") == RequestPriority.LOW
+        assert RequestPriority.parse(None) == RequestPriority.NORMAL
+        assert RequestPriority.parse("urgent") == RequestPriority.NORMAL
+
+
+class TestAdmissionController:
+    """准入控制器测试类"""
+
+    @pytest.mark.asyncio
+    async def test_admit_within_limit(self):
+        """测试并发数以内直接准入"""
+        controller = AdmissionController(max_in_flight=2)
+
+        first = await controller.acquire()
+        second = await controller.acquire()
+
+        assert controller.in_flight == 2
+        assert controller.queue_depth == 0
+        assert first.wait_time == 0.0
+
+        first.release()
+        second.release()
+        assert controller.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_release_is_idempotent(self):
+        """测试重复释放不影响计数"""
+        controller = AdmissionController(max_in_flight=1)
+
+        ticket = await controller.acquire()
+        ticket.release()
+        ticket.release()
+
+        assert controller.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_full_rejects(self):
+        """测试队列已满时拒绝请求"""
+        controller = AdmissionController(max_in_flight=1, max_queue_size=1)
+
+        ticket = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await controller.acquire()
+
+        assert exc_info.value.retry_after >= 1.0
+        assert controller.stats.rejected_total == 1
+
+        ticket.release()
+        (await waiter).release()
+
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        """测试高优先级请求先出队"""
+        controller = AdmissionController(max_in_flight=1)
+        order = []
+
+        async def worker(name, priority):
+            ticket = await controller.acquire(priority)
+            order.append(name)
+            ticket.release()
+
+        ticket = await controller.acquire()
+        low = asyncio.create_task(worker("low", RequestPriority.LOW))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(worker("high", RequestPriority.HIGH))
+        await asyncio.sleep(0)
+
+        assert controller.queue_depth == 2
+        ticket.release()
+        await asyncio.gather(low, high)
+
+        assert order == ["high", "low"]
+        assert controller.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_deadline(self):
+        """测试排队超时"""
+        controller = AdmissionController(
+            max_in_flight=1, queue_deadlines={RequestPriority.LOW: 0.05}
+        )
+
+        ticket = await controller.acquire()
+
+        with pytest.raises(AdmissionTimeoutError):
+            await controller.acquire(RequestPriority.LOW)
+
+        assert controller.queue_depth == 0
+        assert controller.stats.timed_out_total == 1
+
+        # 超时的等待者不应占用槽位
+        ticket.release()
+        assert controller.in_flight == 0
+        next_ticket = await controller.acquire()
+        assert controller.in_flight == 1
+        next_ticket.release()
+
+    @pytest.mark.asyncio
+    async def test_stats(self):
+        """测试统计信息"""
+        controller = AdmissionController(max_in_flight=1)
+
+        ticket = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        ticket.release()
+        (await waiter).release()
+
+        stats = controller.get_stats()
+        assert stats["admitted_total"] == 2
+        assert stats["queue_depth"] == 0
+        assert stats["max_wait_time"] > 0
+        assert stats["p99_wait_time"] >= stats["p50_wait_time"]
+
+    def test_invalid_limit(self):
+        """测试非法并发数"""
+        with pytest.raises(ValueError):
+            AdmissionController(max_in_flight=0)
@@ -0,0 +1,241 @@
+"""
+批处理测试
+Batch completion tests
+"""
+
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from ..batch import BatchCheckpoint, encode_batch_requests, parse_batch_requests
+from ..client import VLLMClient, VLLMConnectionError
+from ..config import VLLMConfig
+from ..models import BatchRequestItem, BatchResult, ChatCompletionResponse
+from ..server import VLLMServer
+
+
+def make_item(custom_id: str, content: str = "你好") -> dict:
+    return {
+        "custom_id": custom_id,
+        "body": {"model": "qwen", "messages": [{"role": "user", "content": content}]},
+    }
+
+
+def make_result(custom_id: str, error: str = None) -> BatchResult:
+    if error:
+        return BatchResult(custom_id=custom_id, error=error)
+    return BatchResult(
+        custom_id=custom_id,
+        response=ChatCompletionResponse(
+            id=f"resp-{custom_id}",
+            model="qwen",
+            choices=[
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": custom_id},
+                    "finish_reason": "stop",
+                }
+            ],
+        ),
+    )
+
+
+class StubBatchServer:
+    """模拟/v1/batch的本地HTTP服务，可在返回指定行数后断开连接"""
+
+    def __init__(self):
+        self.received = []
+        self.fail_after = None
+        self.base_url = ""
+        self._server = None
+        self._handlers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self._server.close()
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            items = parse_batch_requests(await reader.readexactly(length))
+            self.received.append([item.custom_id for item in items])
+
+            lines = [
+                json.dumps(make_result(item.custom_id).dict(exclude_none=True)).encode()
+                + b"\n"
+                for item in reversed(items)
+            ]
+            body = b"".join(lines)
+            writer.write(
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode()
+            )
+            if self.fail_after is not None:
+                # 只发送部分结果后断开，模拟任务中断
+                writer.write(b"".join(lines[: self.fail_after]))
+                await writer.drain()
+                return
+            writer.write(body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def batch_server():
+    server = StubBatchServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+class TestBatchCodec:
+    """批处理JSONL编解码测试类"""
+
+    def test_roundtrip(self):
+        """测试编码和解析请求"""
+        data = encode_batch_requests([make_item("a"), make_item("b", "北京")])
+
+        items = parse_batch_requests(b"\n" + data + b"\n")
+
+        assert [item.custom_id for item in items] == ["a", "b"]
+        assert items[1].body.messages[0].content == "北京"
+
+    def test_invalid_line(self):
+        """测试格式错误的行"""
+        with pytest.raises(ValueError, match="第2行"):
+            parse_batch_requests(
+                encode_batch_requests([make_item("a")]) + b'{"custom_id": "b"}\n'
+            )
+
+    def test_duplicate_custom_id(self):
+        """测试重复的custom_id"""
+        with pytest.raises(ValueError, match="重复"):
+            parse_batch_requests(
+                encode_batch_requests([make_item("a"), make_item("a")])
+            )
+
+    def test_max_requests(self):
+        """测试行数上限"""
+        data = encode_batch_requests([make_item(str(i)) for i in range(3)])
+
+        with pytest.raises(ValueError):
+            parse_batch_requests(data, max_requests=2)
+
+
+class TestBatchCheckpoint:
+    """断点文件测试类"""
+
+    def test_completed_ids(self, tmp_path):
+        """测试只有成功的结果算作完成"""
+        checkpoint = BatchCheckpoint(tmp_path / "results.jsonl")
+        checkpoint.append(make_result("a"))
+        checkpoint.append(make_result("b", error="引擎错误"))
+        checkpoint.close()
+
+        assert checkpoint.completed_ids() == {"a"}
+
+    def test_truncated_last_line(self, tmp_path):
+        """测试崩溃留下的不完整末行"""
+        path = tmp_path / "results.jsonl"
+        line = json.dumps(make_result("a").dict(exclude_none=True)).encode()
+        path.write_bytes(line + b"\n" + line[:20])
+
+        checkpoint = BatchCheckpoint(path)
+        assert checkpoint.completed_ids() == {"a"}
+
+        checkpoint.append(make_result("b"))
+        checkpoint.close()
+
+        assert checkpoint.completed_ids() == {"a", "b"}
+
+
+class TestBatchGenerate:
+    """客户端批处理测试类"""
+
+    @pytest.mark.asyncio
+    async def test_chunks_and_results(self, batch_server):
+        """测试分段提交和结果返回"""
+        items = [make_item(str(i)) for i in range(5)]
+
+        async with VLLMClient(base_url=batch_server.base_url) as client:
+            results = [r async for r in client.batch_generate(items, chunk_size=2)]
+
+        assert batch_server.received == [["0", "1"], ["2", "3"], ["4"]]
+        assert sorted(r.custom_id for r in results) == ["0", "1", "2", "3", "4"]
+        assert results[0].response.choices[0].message.content == results[0].custom_id
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, batch_server, tmp_path):
+        """测试中断后从断点文件续跑"""
+        checkpoint_path = tmp_path / "results.jsonl"
+        request_path = tmp_path / "requests.jsonl"
+        request_path.write_bytes(
+            encode_batch_requests([make_item(str(i)) for i in range(4)])
+        )
+
+        batch_server.fail_after = 3
+        async with VLLMClient(base_url=batch_server.base_url) as client:
+            with pytest.raises(VLLMConnectionError):
+                async for _ in client.batch_generate(
+                    request_path, checkpoint_path=checkpoint_path
+                ):
+                    pass
+
+            batch_server.fail_after = None
+            results = [
+                r
+                async for r in client.batch_generate(
+                    request_path, checkpoint_path=checkpoint_path
+                )
+            ]
+
+        assert batch_server.received[1] == ["0"]
+        assert [r.custom_id for r in results] == ["0"]
+        assert BatchCheckpoint(checkpoint_path).completed_ids() == {"0", "1", "2", "3"}
+
+
+class TestRunBatch:
+    """服务端批处理测试类"""
+
+    @pytest.mark.asyncio
+    async def test_in_flight_defaults_to_max_num_seqs(self):
+        """测试未配置batch_max_in_flight时同时提交的请求数不超过max_num_seqs"""
+        server = VLLMServer(VLLMConfig(max_num_seqs=3))
+        running = 0
+        peak = 0
+
+        async def generate(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return make_result(item.custom_id)
+
+        server._generate_batch_item = generate
+        items = [BatchRequestItem(**make_item(str(i))) for i in range(20)]
+
+        lines = [line async for line in server._run_batch(items)]
+
+        assert len(lines) == 20
+        assert peak == 3
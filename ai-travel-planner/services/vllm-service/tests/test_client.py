@@ -133,16 +133,20 @@ class TestVLLMClient:
         
         # 模拟流式响应
         stream_data = [
-            '{"id": "test-id", "choices": [{"delta": {"content": "你"}}]}',
-            '{"id": "test-id", "choices": [{"delta": {"content": "好"}}]}',
+            '{"id": "test-id", "object": "chat.completion.chunk", '
+            '"created": 1, "model": "m", '
+            '"choices": [{"index": 0, "delta": {"content": "你"}}]}',
+            '{"id": "test-id", "object": "chat.completion.chunk", '
+            '"created": 1, "model": "m", '
+            '"choices": [{"index": 0, "delta": {"content": "好"}}]}',
             '[DONE]'
         ]
         
         async def mock_stream():
             for data in stream_data:
-                yield data
+                yield data.encode("utf-8")
         
-        with patch.object(client, '_make_request', return_value=mock_stream()):
+        with patch.object(client, '_stream_request', return_value=mock_stream()):
             responses = []
             async for response in client.chat_completion_stream(messages):
                 responses.append(response)
@@ -204,7 +208,7 @@ class TestVLLMConnectionPool:
         
         await pool.initialize()
         assert pool._initialized
-        assert len(pool._pool) == 3
+        assert isinstance(pool._http, httpx.AsyncClient)
         
         await pool.close()
     
@@ -215,38 +219,109 @@ class TestVLLMConnectionPool:
         
         async with pool.get_client() as client:
             assert isinstance(client, VLLMClient)
+            assert pool.in_flight == 1
         
+        assert pool.in_flight == 0
         await pool.close()
     
     @pytest.mark.asyncio
-    async def test_pool_reuse(self, pool):
-        """测试连接池复用"""
+    async def test_shared_transport(self, pool):
+        """测试客户端共享同一个传输"""
         await pool.initialize()
         
-        clients = []
-        
-        # 获取多个客户端
         async with pool.get_client() as client1:
-            clients.append(client1)
             async with pool.get_client() as client2:
-                clients.append(client2)
-                async with pool.get_client() as client3:
-                    clients.append(client3)
+                assert client1 is client2
+                assert client1._client is pool._http
+                assert not client1._owns_client
+        
+        await pool.close()
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self, pool):
+        """测试并发数受限"""
+        await pool.initialize()
+        max_seen = 0
+        
+        async def worker():
+            nonlocal max_seen
+            async with pool.get_client():
+                max_seen = max(max_seen, pool.in_flight)
+                await asyncio.sleep(0.01)
+        
+        await asyncio.gather(*(worker() for _ in range(10)))
         
-        # 所有客户端应该不同
-        assert len(set(id(c) for c in clients)) == 3
+        assert max_seen == 3
+        assert pool.in_flight == 0
+        await pool.close()
+    
+    @pytest.mark.asyncio
+    async def test_recycle_after_transport_errors(self, pool):
+        """测试连续连接错误后重建传输"""
+        await pool.initialize()
+        old_http = pool._http
+        
+        for _ in range(pool.unhealthy_threshold):
+            pool._client._notify_transport_error(httpx.ConnectError("连接失败"))
+        
+        assert pool._http is not old_http
+        assert pool.recycle_count == 1
+        assert pool.consecutive_failures == 0
         
         await pool.close()
+        assert old_http.is_closed
+    
+    @pytest.mark.asyncio
+    async def test_recycle_waits_for_in_flight_requests(self, pool):
+        """测试旧传输上的请求结束后才关闭旧传输"""
+        await pool.initialize()
+        
+        async with pool.get_client() as client:
+            old_http = client._client
+            pool.recycle()
+            await asyncio.sleep(0.01)
+            
+            assert pool._http is not old_http
+            assert not old_http.is_closed
+        
+        await asyncio.sleep(0.01)
+        assert old_http.is_closed
+        assert not pool._retired
+        
+        await pool.close()
+    
+    @pytest.mark.asyncio
+    async def test_success_resets_failures(self, pool):
+        """测试请求成功后连续错误计数清零"""
+        await pool.initialize()
+        
+        for _ in range(pool.unhealthy_threshold - 1):
+            pool._client._notify_transport_error(httpx.ConnectError("连接失败"))
+        pool._client._notify_request_success()
+        pool._client._notify_transport_error(httpx.ConnectError("连接失败"))
+        
+        assert pool.consecutive_failures == 1
+        assert pool.recycle_count == 0
+        
+        await pool.close()
+    
+    def test_grace_period_covers_timeout(self):
+        """测试旧传输的宽限期不短于请求超时"""
+        pool = VLLMConnectionPool(timeout=300.0, retire_grace_period=30.0)
+        assert pool.retire_grace_period == 300.0
+        assert VLLMConnectionPool(timeout=60.0).retire_grace_period == 60.0
     
     @pytest.mark.asyncio
     async def test_pool_close(self, pool):
         """测试连接池关闭"""
         await pool.initialize()
         assert pool._initialized
+        http = pool._http
         
         await pool.close()
         assert not pool._initialized
-        assert len(pool._pool) == 0
+        assert http.is_closed
+        assert pool._http is None
 
 
 class TestGlobalFunctions:
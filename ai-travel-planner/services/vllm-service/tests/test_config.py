@@ -37,7 +37,12 @@ class TestVLLMConfig:
             gpu_memory_utilization=0.9
         )
         
-        assert config.model_name == "custom- 0.9
+        assert config.model_name == "custom-model"
+        assert config.host == "127.0.0.1"
+        assert config.port == 8002
+        assert config.tensor_parallel_size == 2
+        assert config.max_model_len == 8192
+        assert config.gpu_memory_utilization == 0.9
     
     @patch.dict(os.environ, {
         'VLLM_MODEL_NAME': 'test-model',
@@ -74,6 +79,69 @@ class TestVLLMConfig:
         # 测试边界值
         config = VLLMConfig(gpu_memory_utilization=1.0)
         assert config.gpu_memory_utilization == 1.0
+    
+    def test_speculative_disabled_by_default(self):
+        """测试默认不启用投机解码"""
+        assert VLLMConfig().speculative_config() is None
+    
+    def test_ngram_speculative_config(self):
+        """测试n-gram提示词查找配置"""
+        config = VLLMConfig(
+            speculative_method="ngram",
+            num_speculative_tokens=4,
+            ngram_prompt_lookup_max=5,
+            ngram_prompt_lookup_min=2,
+            speculative_disable_by_batch_size=32
+        )
+        
+        assert config.speculative_config() == {
+            "method": "ngram",
+            "num_speculative_tokens": 4,
+            "prompt_lookup_max": 5,
+            "prompt_lookup_min": 2,
+            "disable_by_batch_size": 32,
+        }
+    
+    def test_draft_model_speculative_config(self):
+        """测试草稿模型配置"""
+        config = VLLMConfig(
+            speculative_method="draft_model",
+            speculative_model="Qwen/Qwen2.5-0.5B-Instruct",
+            speculative_draft_tensor_parallel_size=1
+        )
+        
+        assert config.speculative_config() == {
+            "method": "draft_model",
+            "num_speculative_tokens": 5,
+            "model": "Qwen/Qwen2.5-0.5B-Instruct",
+            "draft_tensor_parallel_size": 1,
+        }
+    
+    def test_invalid_speculative_config(self):
+        """测试无效的投机解码配置"""
+        with pytest.raises(ValueError):
+            VLLMConfig(speculative_method="draft_model").speculative_config()
+        
+        with pytest.raises(ValueError):
+            VLLMConfig(
+                speculative_method="ngram",
+                ngram_prompt_lookup_max=2,
+                ngram_prompt_lookup_min=3
+            ).speculative_config()
+    
+    @patch.dict(os.environ, {
+        'VLLM_SPECULATIVE_METHOD': 'ngram',
+        'VLLM_NUM_SPECULATIVE_TOKENS': '3',
+        'VLLM_NGRAM_PROMPT_LOOKUP_MAX': '6'
+    })
+    def test_speculative_from_env(self):
+        """测试从环境变量读取投机解码配置"""
+        config = VLLMConfig.from_env()
+        
+        assert config.speculative_method == "ngram"
+        assert config.num_speculative_tokens == 3
+        assert config.ngram_prompt_lookup_max == 6
+        assert config.speculative_disable_by_batch_size is None
 
 
 class TestGenerationConfig:
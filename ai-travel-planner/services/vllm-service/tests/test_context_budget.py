@@ -0,0 +1,157 @@
+"""
+上下文预算测试
+Context budget tests
+"""
+
+import pytest
+
+from ..context_budget import (
+    ContextBudget,
+    ContextBudgetError,
+    TokenCounter,
+    TruncationPolicy,
+)
+from ..models import ChatMessage
+from ..prompt_manager import PromptLayout, PromptManager
+
+
+def char_encode(text: str):
+    """每个字符一个token的模拟分词器"""
+    return [ord(c) for c in text]
+
+
+def make_conversation(turns: int, length: int = 100):
+    messages = [ChatMessage(role="system", content="请用中文回答")]
+    for i in range(turns):
+        messages.append(ChatMessage(role="user", content=f"问题{i}" + "问" * length))
+        messages.append(ChatMessage(role="assistant", content=f"回答{i}" + "答" * length))
+    messages.append(ChatMessage(role="user", content="最后的问题"))
+    return messages
+
+
+@pytest.fixture
+def prompt_manager():
+    return PromptManager(layout=PromptLayout.STABLE_PREFIX)
+
+
+def make_budget(prompt_manager, max_model_len: int, **kwargs) -> ContextBudget:
+    return ContextBudget(
+        TokenCounter(char_encode),
+        prompt_manager,
+        max_model_len=max_model_len,
+        margin=0,
+        **kwargs,
+    )
+
+
+class TestTokenCounter:
+    """token计数器测试类"""
+
+    def test_cached_count(self):
+        """测试相同文本只分词一次"""
+        calls = []
+
+        def encode(text):
+            calls.append(text)
+            return char_encode(text)
+
+        counter = TokenCounter(encode)
+
+        assert counter.count("北京") == 2
+        assert counter.count("北京") == 2
+        assert calls == ["北京"]
+        assert counter.hits == 1 and counter.misses == 1
+
+
+class TestContextBudget:
+    """上下文预算测试类"""
+
+    def test_fits_without_truncation(self, prompt_manager):
+        """测试预算充足时不截断，返回分词结果"""
+        messages = make_conversation(2)
+        budget = make_budget(prompt_manager, max_model_len=100000)
+
+        result = budget.fit(messages, max_tokens=1024)
+
+        expected = prompt_manager.render_chat_prompt(messages).text
+        assert result.rendered.text == expected
+        assert result.prompt_tokens == len(expected)
+        assert result.dropped_messages == 0
+
+    def test_drop_oldest(self, prompt_manager):
+        """测试丢弃最早的轮次并为输出预留空间"""
+        messages = make_conversation(5)
+        full = len(prompt_manager.render_chat_prompt(messages).text)
+        budget = make_budget(prompt_manager, max_model_len=full)
+
+        result = budget.fit(messages, max_tokens=450)
+
+        assert result.prompt_tokens <= full - 450
+        assert result.dropped_messages % 2 == 0 and result.dropped_messages > 0
+        assert "问题0" not in result.rendered.text
+        assert "最后的问题" in result.rendered.text
+        assert "请用中文回答" in result.rendered.text
+        assert budget.get_stats()["truncated_requests"] == 1
+
+    def test_incremental_counting(self, prompt_manager):
+        """测试同一会话追加轮次时只为新轮次分词"""
+        budget = make_budget(prompt_manager, max_model_len=100000)
+        messages = make_conversation(3)
+        budget.fit(messages, max_tokens=10)
+        misses = budget.counter.misses
+
+        messages = messages + [
+            ChatMessage(role="assistant", content="好的"),
+            ChatMessage(role="user", content="继续"),
+        ]
+        budget.fit(messages, max_tokens=10)
+
+        # 两条新消息 + 最终提示词分词不走缓存
+        assert budget.counter.misses - misses == 2
+
+    def test_summarize(self, prompt_manager):
+        """测试摘要策略保留被丢弃轮次的片段"""
+        messages = make_conversation(5)
+        full = len(prompt_manager.render_chat_prompt(messages).text)
+        budget = make_budget(
+            prompt_manager,
+            max_model_len=full,
+            policy=TruncationPolicy.SUMMARIZE,
+            summary_max_tokens=200,
+        )
+
+        result = budget.fit(messages, max_tokens=600)
+
+        assert result.summarized
+        assert ContextBudget.SUMMARY_HEADER in result.rendered.text
+        assert result.prompt_tokens <= full - 600
+        # 摘要不改变共享前缀
+        assert (
+            result.rendered.prefix_hash
+            == prompt_manager.render_chat_prompt(messages).prefix_hash
+        )
+
+    def test_error_policy(self, prompt_manager):
+        """测试拒绝策略"""
+        messages = make_conversation(5)
+        budget = make_budget(
+            prompt_manager, max_model_len=500, policy=TruncationPolicy.ERROR
+        )
+
+        with pytest.raises(ContextBudgetError):
+            budget.fit(messages, max_tokens=100)
+
+    def test_latest_message_too_long(self, prompt_manager):
+        """测试最新消息本身超出预算"""
+        messages = [ChatMessage(role="user", content="长" * 1000)]
+        budget = make_budget(prompt_manager, max_model_len=2000)
+
+        with pytest.raises(ContextBudgetError):
+            budget.fit(messages, max_tokens=1500)
+
+    def test_max_tokens_exceeds_context(self, prompt_manager):
+        """测试max_tokens超出上下文长度"""
+        budget = make_budget(prompt_manager, max_model_len=1000)
+
+        with pytest.raises(ContextBudgetError):
+            budget.fit([ChatMessage(role="user", content="你好")], max_tokens=1000)
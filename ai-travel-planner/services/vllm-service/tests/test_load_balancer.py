@@ -0,0 +1,290 @@
+"""
+多副本负载均衡测试
+Multi-replica load balancing tests
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+import pytest_asyncio
+
+from ..client import VLLMConnectionError
+from ..load_balancer import LoadBalancingStrategy, MultiEndpointVLLMClient
+from ..models import ChatMessage
+
+
+class StubReplica:
+    """模拟vLLM副本的本地HTTP服务"""
+
+    def __init__(self, name: str, latency: float = 0.0, status: int = 200):
+        self.name = name
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+        self.base_url = ""
+        self._server = None
+        self._handlers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self._server.close()
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def _body(self, path: bytes) -> bytes:
+        if path == b"/health":
+            return json.dumps(
+                {"status": "healthy", "model": self.name, "engine_ready": True}
+            ).encode()
+        if path == b"/v1/chat/completions":
+            return json.dumps(
+                {
+                    "id": self.name,
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": self.name,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": self.name},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            ).encode()
+        return b"{}"
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+
+                path = head.split(b" ")[1]
+                if path != b"/health":
+                    self.requests += 1
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+
+                status = (
+                    200 if path == b"/health" and self.status < 500 else self.status
+                )
+                body = self._body(path) if status == 200 else b'{"error": "stub"}'
+                writer.write(
+                    f"HTTP/1.1 {status} STUB\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def replicas():
+    """启动三个副本"""
+    stubs = [StubReplica(f"replica-{i}") for i in range(3)]
+    for stub in stubs:
+        await stub.start()
+    yield stubs
+    for stub in stubs:
+        await stub.stop()
+
+
+MESSAGES = [ChatMessage(role="user", content="你好")]
+
+
+class TestMultiEndpointVLLMClient:
+    """多副本客户端测试类"""
+
+    @pytest.mark.asyncio
+    async def test_requires_replicas(self):
+        """测试副本列表不能为空"""
+        with pytest.raises(ValueError):
+            MultiEndpointVLLMClient([])
+
+    @pytest.mark.asyncio
+    async def test_least_outstanding_spreads_load(self, replicas):
+        """测试最少未完成请求策略分散负载"""
+        for stub in replicas:
+            stub.latency = 0.05
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas], health_check_interval=None
+        ) as client:
+            await asyncio.gather(*(client.chat_completion(MESSAGES) for _ in range(6)))
+
+        assert [s.requests for s in replicas] == [2, 2, 2]
+
+    @pytest.mark.asyncio
+    async def test_power_of_two_prefers_fast_replica(self, replicas):
+        """测试二选一策略偏向低延迟副本"""
+        replicas[0].latency = 0.05
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas],
+            strategy=LoadBalancingStrategy.POWER_OF_TWO,
+            health_check_interval=None,
+        ) as client:
+            for _ in range(30):
+                await client.chat_completion(MESSAGES)
+
+        assert replicas[0].requests < replicas[1].requests + replicas[2].requests
+
+    @pytest.mark.asyncio
+    async def test_failover_and_ejection(self, replicas):
+        """测试失败切换和摘除副本"""
+        replicas[0].status = 503
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas],
+            failure_threshold=2,
+            health_check_interval=None,
+            enable_hedging=False,
+        ) as client:
+            for _ in range(6):
+                response = await client.chat_completion(MESSAGES)
+                assert response.id != "replica-0"
+
+            stats = client.get_stats()
+
+        assert replicas[0].requests == 2
+        assert stats["failovers"] == 2
+        assert stats["replicas"][0]["available"] is False
+        assert stats["replicas"][0]["ejections"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ejection_backoff_capped_and_reset(self):
+        """测试摘除时长封顶不溢出，请求成功后退避重新开始"""
+        client = MultiEndpointVLLMClient(
+            ["http://127.0.0.1:1"],
+            failure_threshold=1,
+            ejection_time=30.0,
+            max_ejection_time=300.0,
+            health_check_interval=None,
+        )
+        replica = client.replicas[0]
+        error = VLLMConnectionError("连接失败")
+
+        for _ in range(2000):
+            replica.reinstate()
+            client._record_failure(replica, error)
+
+        assert replica.ejections == 2000
+        assert replica.ejected_until - time.time() <= 300.0
+
+        replica.reinstate()
+        replica.record_success(0.1)
+        client._record_failure(replica, error)
+
+        assert replica.ejection_streak == 1
+        assert replica.ejected_until - time.time() <= 30.0
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_not_retried(self, replicas):
+        """测试4xx错误不切换副本"""
+        for stub in replicas:
+            stub.status = 400
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas], health_check_interval=None
+        ) as client:
+            with pytest.raises(VLLMConnectionError) as exc_info:
+                await client.chat_completion(MESSAGES)
+
+        assert exc_info.value.status_code == 400
+        assert sum(s.requests for s in replicas) == 1
+
+    @pytest.mark.asyncio
+    async def test_all_replicas_down(self, replicas):
+        """测试所有副本失败"""
+        for stub in replicas:
+            stub.status = 500
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas], health_check_interval=None
+        ) as client:
+            with pytest.raises(VLLMConnectionError):
+                await client.chat_completion(MESSAGES)
+
+        assert [s.requests for s in replicas] == [1, 1, 1]
+
+    @pytest.mark.asyncio
+    async def test_health_check_reinstates(self, replicas):
+        """测试健康检查恢复被摘除的副本"""
+        replicas[0].status = 503
+
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas],
+            failure_threshold=1,
+            health_check_interval=None,
+        ) as client:
+            await client.chat_completion(MESSAGES)
+            assert client.get_stats()["replicas"][0]["available"] is False
+
+            replicas[0].status = 200
+            results = await client.check_replicas()
+
+            assert all(results.values())
+            assert client.get_stats()["replicas"][0]["available"] is True
+
+    @pytest.mark.asyncio
+    async def test_hedging_slow_replica(self, replicas):
+        """测试慢副本触发对冲请求"""
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas[:2]],
+            health_check_interval=None,
+            hedge_min_samples=5,
+        ) as client:
+            primary = client.replicas[0]
+            for _ in range(5):
+                primary.record_success(0.01, primary.latencies)
+            client.replicas[1].outstanding = 1  # 让第一个副本被选为主副本
+
+            replicas[0].latency = 1.0
+            response = await client.chat_completion(MESSAGES)
+            client.replicas[1].outstanding = 0
+
+            assert response.id == "replica-1"
+            assert client.hedged_requests == 1
+            assert client.hedge_wins == 1
+
+    @pytest.mark.asyncio
+    async def test_hedge_ignores_ttft_and_health_latency(self, replicas):
+        """测试流式首字延迟和健康检查不影响对冲等待时间"""
+        async with MultiEndpointVLLMClient(
+            [s.base_url for s in replicas[:2]],
+            health_check_interval=None,
+            hedge_min_samples=5,
+        ) as client:
+            primary = client.replicas[0]
+            for _ in range(5):
+                primary.record_success(0.01, primary.ttft_latencies)
+            for _ in range(5):
+                await client.health_check()
+
+            assert client._hedge_delay(primary, "/v1/chat/completions") is None
+            assert client._hedge_delay(primary, "/health") is None
+
+            for _ in range(5):
+                primary.record_success(2.0, primary.latencies)
+            assert client._hedge_delay(primary, "/v1/chat/completions") == 2.0
+            assert primary.to_dict()["p95_ttft"] == 0.01
@@ -0,0 +1,126 @@
+"""
+LoRA适配器注册表测试
+LoRA adapter registry tests
+"""
+
+import json
+
+import pytest
+
+from ..lora_registry import LoRARegistry
+
+
+def make_adapter(
+    root, name: str, rank: int = 16, base_model: str = "unsloth/Llama-3.2-3B-Instruct"
+):
+    """创建模拟的适配器目录，与unsloth save_pretrained的输出结构一致"""
+    adapter_dir = root / name
+    adapter_dir.mkdir()
+    (adapter_dir / "adapter_config.json").write_text(
+        json.dumps(
+            {
+                "r": rank,
+                "base_model_name_or_path": base_model,
+                "peft_type": "LORA",
+            }
+        )
+    )
+    (adapter_dir / "adapter_model.safetensors").write_bytes(b"weights")
+    return adapter_dir
+
+
+@pytest.fixture
+def adapters_dir(tmp_path):
+    for name in ("beijing", "shanghai", "chengdu"):
+        make_adapter(tmp_path, name)
+    (tmp_path / "not_an_adapter").mkdir()
+    return tmp_path
+
+
+class TestLoRARegistry:
+    """LoRA适配器注册表测试类"""
+
+    def test_scan(self, adapters_dir):
+        """测试从目录发现适配器"""
+        registry = LoRARegistry(adapters_dir)
+
+        assert sorted(registry.scan()) == ["beijing", "chengdu", "shanghai"]
+        adapter = registry.get("beijing")
+        assert adapter.rank == 16
+        assert adapter.base_model == "unsloth/Llama-3.2-3B-Instruct"
+        assert len({a.lora_id for a in registry.list_adapters()}) == 3
+
+    def test_rescan_keeps_ids(self, adapters_dir):
+        """测试重新扫描时保留已有ID并移除已删除的适配器"""
+        registry = LoRARegistry(adapters_dir)
+        registry.scan()
+        beijing_id = registry.get("beijing").lora_id
+
+        (adapters_dir / "chengdu" / "adapter_config.json").unlink()
+        make_adapter(adapters_dir, "xian")
+        names = registry.scan()
+
+        assert sorted(names) == ["beijing", "shanghai", "xian"]
+        assert registry.get("beijing").lora_id == beijing_id
+        assert registry.get("xian").lora_id not in {
+            registry.get("beijing").lora_id,
+            registry.get("shanghai").lora_id,
+        }
+
+    def test_rank_limit(self, tmp_path):
+        """测试跳过rank超过上限的适配器"""
+        make_adapter(tmp_path, "large", rank=64)
+        registry = LoRARegistry(tmp_path, max_rank=16)
+
+        assert registry.scan() == []
+
+    def test_lru_residency(self, adapters_dir):
+        """测试按LRU换出适配器"""
+        registry = LoRARegistry(adapters_dir, max_resident=2)
+        registry.scan()
+
+        registry.acquire("beijing")
+        registry.acquire("shanghai")
+        registry.acquire("beijing")
+        registry.acquire("chengdu")
+
+        assert registry.is_resident("beijing")
+        assert registry.is_resident("chengdu")
+        assert not registry.is_resident("shanghai")
+        stats = registry.get_stats()
+        assert stats["loads"] == 3
+        assert stats["evictions"] == 1
+        assert registry.get("beijing").requests == 2
+
+    def test_unknown_model(self, adapters_dir):
+        """测试未注册的名称使用基础模型"""
+        registry = LoRARegistry(adapters_dir)
+        registry.scan()
+
+        assert registry.acquire("default") is None
+
+    def test_base_model_mismatch_skipped(self, tmp_path):
+        """测试跳过基于其他基础模型训练的适配器"""
+        make_adapter(tmp_path, "llama")
+        make_adapter(tmp_path, "qwen", base_model="/models/Qwen2.5-7B-Instruct")
+        registry = LoRARegistry(tmp_path, base_model="Qwen/Qwen2.5-7B-Instruct")
+
+        assert registry.scan() == ["qwen"]
+
+    def test_rewritten_adapter_gets_new_id(self, adapters_dir):
+        """测试适配器被原地覆盖后分配新的lora_id"""
+        registry = LoRARegistry(adapters_dir)
+        registry.scan()
+        registry.acquire("beijing")
+        old = registry.get("beijing")
+        shanghai_id = registry.get("shanghai").lora_id
+
+        (adapters_dir / "beijing" / "adapter_model.safetensors").write_bytes(
+            b"retrained weights"
+        )
+        registry.scan()
+
+        assert registry.get("beijing").lora_id != old.lora_id
+        assert registry.get("beijing").version != old.version
+        assert not registry.is_resident("beijing")
+        assert registry.get("shanghai").lora_id == shanghai_id
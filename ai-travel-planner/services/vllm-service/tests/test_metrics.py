@@ -0,0 +1,211 @@
+"""
+推理指标测试
+Inference metrics tests
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from ..metrics import (  # noqa: E402
+    STATUS_CANCELLED,
+    STATUS_REJECTED,
+    InferenceMetrics,
+    collect_spec_decode_stats,
+)
+from ..streaming import RetryConfig, StreamingResponseProcessor  # noqa: E402
+
+
+def sample(metrics: InferenceMetrics, name: str, **labels) -> float:
+    """读取指标样本值"""
+    value = metrics.registry.get_sample_value(f"vllm_service_{name}", labels)
+    return value or 0.0
+
+
+LABELS = {"model": "qwen", "template": "qwen"}
+
+
+def make_output(token_count: int, prompt_tokens: int = 8):
+    """构造vLLM累计输出"""
+    return SimpleNamespace(
+        prompt_token_ids=list(range(prompt_tokens)),
+        outputs=[SimpleNamespace(token_ids=list(range(token_count)))],
+    )
+
+
+class TestRequestMetrics:
+    """单请求指标测试类"""
+
+    def test_token_latencies(self):
+        """测试首token延迟和token间延迟"""
+        metrics = InferenceMetrics()
+        request = metrics.start_request("qwen", "qwen")
+        start = request.start_time
+
+        request.on_output(make_output(1), now=start + 0.2)
+        request.on_output(make_output(3), now=start + 0.3)
+        request.finish()
+
+        assert request.ttft == pytest.approx(0.2)
+        assert sample(metrics, "time_to_first_token_seconds_count", **LABELS) == 1
+        assert sample(
+            metrics, "time_to_first_token_seconds_sum", **LABELS
+        ) == pytest.approx(0.2)
+        assert sample(metrics, "inter_token_latency_seconds_count", **LABELS) == 2
+        assert sample(
+            metrics, "inter_token_latency_seconds_sum", **LABELS
+        ) == pytest.approx(0.1)
+        assert sample(metrics, "prompt_tokens_total", **LABELS) == 8
+        assert sample(metrics, "completion_tokens_total", **LABELS) == 3
+        assert sample(metrics, "requests_total", status="finished", **LABELS) == 1
+        assert sample(metrics, "request_latency_seconds_count", **LABELS) == 1
+
+    def test_in_flight_and_idempotent_finish(self):
+        """测试进行中请求数和重复结束"""
+        metrics = InferenceMetrics()
+        request = metrics.start_request("qwen", "qwen")
+        assert sample(metrics, "requests_in_flight", **LABELS) == 1
+
+        request.finish(STATUS_CANCELLED)
+        request.finish()
+
+        assert sample(metrics, "requests_in_flight", **LABELS) == 0
+        assert sample(metrics, "requests_total", status="cancelled", **LABELS) == 1
+        assert sample(metrics, "requests_total", status="finished", **LABELS) == 0
+        assert sample(metrics, "request_latency_seconds_count", **LABELS) == 0
+
+    def test_cancelled_tokens(self):
+        """测试取消请求浪费的token数"""
+        metrics = InferenceMetrics()
+        request = metrics.start_request("qwen", "qwen")
+
+        request.on_output(make_output(4))
+        request.finish(STATUS_CANCELLED)
+
+        assert sample(metrics, "cancelled_completion_tokens_total", **LABELS) == 4
+        assert sample(metrics, "completion_tokens_total", **LABELS) == 4
+
+    def test_record_request_and_render(self):
+        """测试未进入生成的请求和文本导出"""
+        metrics = InferenceMetrics()
+        metrics.record_request("qwen", None, STATUS_REJECTED)
+
+        body = metrics.render().decode()
+
+        assert (
+            "vllm_service_requests_total"
+            '{model="qwen",status="rejected",template="none"} 1.0' in body
+        )
+        assert "vllm_service_time_to_first_token_seconds" in body
+
+
+class TestClientStreamMetrics:
+    """客户端流式指标测试类"""
+
+    @staticmethod
+    def chunk(content=None, usage=None):
+        data = {
+            "id": "c1",
+            "object": "chat.completion.chunk",
+            "created": 1,
+            "model": "qwen",
+            "choices": [{"index": 0, "delta": {"content": content}}] if content else [],
+        }
+        if usage:
+            data["usage"] = usage
+        return json.dumps(data, ensure_ascii=False)
+
+    @pytest.mark.asyncio
+    async def test_stream_records_tokens(self):
+        """测试流式响应记录token和usage"""
+        metrics = InferenceMetrics()
+        processor = StreamingResponseProcessor(
+            retry_config=RetryConfig(max_retries=0), metrics=metrics
+        )
+        frames = [
+            self.chunk("北京"),
+            self.chunk("故宫"),
+            self.chunk(usage={"prompt_tokens": 12, "completion_tokens": 5}),
+        ]
+
+        async def stream():
+            for frame in frames:
+                yield frame
+
+        texts = [
+            text
+            async for text in processor.process_text_stream(stream(), "qwen", "qwen")
+        ]
+
+        assert texts == ["北京", "故宫"]
+        assert sample(metrics, "time_to_first_token_seconds_count", **LABELS) == 1
+        assert sample(metrics, "inter_token_latency_seconds_count", **LABELS) == 1
+        assert sample(metrics, "prompt_tokens_total", **LABELS) == 12
+        assert sample(metrics, "completion_tokens_total", **LABELS) == 5
+        assert sample(metrics, "requests_in_flight", **LABELS) == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_stopped_early(self):
+        """测试调用方提前停止读取记为取消"""
+        metrics = InferenceMetrics()
+        processor = StreamingResponseProcessor(
+            retry_config=RetryConfig(max_retries=0), metrics=metrics
+        )
+
+        async def stream():
+            for _ in range(5):
+                yield self.chunk("好")
+
+        texts = processor.process_text_stream(stream(), "qwen", "qwen")
+        await texts.__anext__()
+        await texts.aclose()
+
+        assert sample(metrics, "requests_total", status="cancelled", **LABELS) == 1
+        assert sample(metrics, "requests_in_flight", **LABELS) == 0
+
+
+class TestSpecDecodeMetrics:
+    """投机解码指标测试类"""
+
+    @staticmethod
+    def engine_registry(
+        drafts: int, draft_tokens: int, accepted: int
+    ) -> "prometheus_client.CollectorRegistry":
+        """模拟vLLM引擎上报的计数器"""
+        registry = prometheus_client.CollectorRegistry()
+        for name, value in (
+            ("vllm:spec_decode_num_drafts_total", drafts),
+            ("vllm:spec_decode_num_draft_tokens_total", draft_tokens),
+            ("vllm:spec_decode_num_accepted_tokens_total", accepted),
+        ):
+            prometheus_client.Counter(
+                name, "engine", ["engine"], registry=registry
+            ).labels("0").inc(value)
+        return registry
+
+    def test_collect_stats(self):
+        """测试接受率和平均接受长度"""
+        stats = collect_spec_decode_stats(self.engine_registry(10, 40, 30))
+
+        assert stats["acceptance_rate"] == pytest.approx(0.75)
+        assert stats["mean_acceptance_length"] == pytest.approx(4.0)
+
+    def test_no_drafts(self):
+        """测试没有推测时不计算比率"""
+        stats = collect_spec_decode_stats(prometheus_client.CollectorRegistry())
+
+        assert stats["draft_tokens"] == 0
+        assert stats["acceptance_rate"] is None
+
+    def test_exported_gauges(self):
+        """测试导出到/metrics的接受率"""
+        metrics = InferenceMetrics()
+        metrics.enable_spec_decode(self.engine_registry(4, 20, 5))
+
+        assert sample(metrics, "spec_decode_acceptance_rate") == pytest.approx(0.25)
+        assert sample(metrics, "spec_decode_mean_acceptance_length") == pytest.approx(
+            2.25
+        )
@@ -0,0 +1,74 @@
+"""
+前缀复用统计测试
+Prefix cache statistics tests
+"""
+
+from types import SimpleNamespace
+
+from ..prefix_stats import PrefixCacheTracker
+from ..prompt_manager import RenderedPrompt
+
+
+def make_rendered(prefix_hash="abc123", family="travel_system"):
+    """构造渲染结果"""
+    return RenderedPrompt(
+        text="prefix-body", prefix_hash=prefix_hash, prefix_length=6, family=family
+    )
+
+
+class TestPrefixCacheTracker:
+    """前缀复用跟踪器测试类"""
+
+    def test_record_requests(self):
+        """测试按前缀统计请求数"""
+        tracker = PrefixCacheTracker()
+
+        for _ in range(3):
+            tracker.record_request(make_rendered())
+        tracker.record_request(make_rendered(prefix_hash="other", family=None))
+
+        stats = tracker.get_stats()
+        assert stats["unique_prefixes"] == 2
+        assert stats["total_requests"] == 4
+        assert stats["reused_requests"] == 2
+        assert stats["prefixes"][0]["prefix_hash"] == "abc123"
+        assert stats["prefixes"][0]["requests"] == 3
+
+    def test_record_output_cached_tokens(self):
+        """测试记录引擎报告的缓存命中token数"""
+        tracker = PrefixCacheTracker()
+        tracker.record_request(make_rendered())
+
+        tracker.record_output(
+            "abc123",
+            SimpleNamespace(prompt_token_ids=list(range(100)), num_cached_tokens=80),
+        )
+
+        stats = tracker.get_stats()
+        assert stats["prompt_tokens"] == 100
+        assert stats["cached_tokens"] == 80
+        assert stats["token_hit_rate"] == 0.8
+
+    def test_output_without_cached_tokens_ignored(self):
+        """测试引擎未报告缓存token时不计入命中率"""
+        tracker = PrefixCacheTracker()
+        tracker.record_request(make_rendered())
+
+        tracker.record_output("abc123", SimpleNamespace(prompt_token_ids=[1, 2]))
+
+        assert tracker.get_stats()["token_hit_rate"] is None
+
+    def test_prompt_without_hash_ignored(self):
+        """测试没有前缀哈希的请求不统计"""
+        tracker = PrefixCacheTracker()
+        tracker.record_request(make_rendered(prefix_hash=None))
+
+        assert tracker.get_stats()["total_requests"] == 0
+
+    def test_bounded(self):
+        """测试跟踪的前缀数量受限"""
+        tracker = PrefixCacheTracker(max_prefixes=2)
+        for i in range(5):
+            tracker.record_request(make_rendered(prefix_hash=f"p{i}"))
+
+        assert tracker.get_stats()["unique_prefixes"] == 2
@@ -13,6 +13,10 @@ from ..prompt_manager import (
     PromptTemplate, 
     PromptType, 
     PromptManager, 
+    ConversationRenderer,
+    PromptLayout,
+    UnknownPromptFamilyError,
+    compile_template,
     get_prompt_manager
 )
 from ..models import ChatMessage
@@ -95,6 +99,91 @@ class TestPromptTemplate:
         assert template.validate_variables() is True
 
 
+class TestCompiledTemplate:
+    """模板编译测试类"""
+    
+    def test_compile_segments(self):
+        """测试模板解析为片段"""
+        segments = compile_template("Hello {name}, welcome to {place}!")
+        
+        assert segments == [("Hello ", "name"), (", welcome to ", "place"), ("!", None)]
+    
+    def test_escaped_braces(self):
+        """测试转义花括号"""
+        template = PromptTemplate(
+            name="test",
+            type=PromptType.USER,
+            template='{{"city": "{city}"}}',
+            variables=["city"]
+        )
+        
+        assert template.format(city="北京") == '{"city": "北京"}'
+    
+    def test_format_spec_falls_back(self):
+        """测试含格式说明的模板回退到str.format"""
+        assert compile_template("{price:.2f}") is None
+        
+        template = PromptTemplate(
+            name="test",
+            type=PromptType.USER,
+            template="价格: {price:.2f}",
+            variables=["price"]
+        )
+        assert template.format(price=3.14159) == "价格: 3.14"
+    
+    def test_fields_computed_at_load(self):
+        """测试加载时计算模板变量"""
+        manager = PromptManager()
+        
+        assert manager.get_template("travel_planning").fields == frozenset({
+            "destination", "duration", "budget", "travelers",
+            "interests", "special_requirements"
+        })
+    
+    def test_template_change_recompiles(self):
+        """测试修改模板后重新编译"""
+        template = PromptTemplate(name="test", type=PromptType.USER, template="A {x}")
+        template.template = "B {y}"
+        
+        assert template.format(y="1") == "B 1"
+    
+    def test_matches_str_format(self):
+        """测试编译渲染结果与str.format一致"""
+        manager = PromptManager()
+        kwargs = dict(
+            destination="成都",
+            duration="5天",
+            budget="8000元",
+            travelers="3人",
+            interests="美食",
+            special_requirements="带老人"
+        )
+        template = manager.get_template("travel_planning")
+        
+        assert template.format(**kwargs) == template.template.format(**kwargs)
+
+
+class TestConversationRenderer:
+    """对话渲染测试类"""
+    
+    def test_render(self):
+        """测试渲染对话"""
+        renderer = ConversationRenderer()
+        messages = [
+            ChatMessage(role="system", content="S"),
+            ChatMessage(role="user", content="你好"),
+            ChatMessage(role="assistant", content="您好")
+        ]
+        
+        system_messages, conversation = renderer.render(messages)
+        
+        assert system_messages == ["S"]
+        assert conversation == (
+            "<|im_start|>user\n你好<|im_end|>\n"
+            "<|im_start|>assistant\n您好<|im_end|>"
+        )
+
+
 class TestPromptManager:
     """提示词管理器测试类"""
     
@@ -224,6 +313,27 @@ class TestPromptManager:
         assert "<|im_start|>system" in result
         assert "旅行规划助手" in result or "AI助手" in result
     
+    def test_format_chat_prompt_layout(self, manager):
+        """测试聊天提示词的完整格式"""
+        messages = [
+            ChatMessage(role="system", content="S"),
+            ChatMessage(role="user", content="U1"),
+            ChatMessage(role="assistant", content="A1"),
+            ChatMessage(role="user", content="U2")
+        ]
+        
+        expected = (
+            "<|im_start|>system\nS<|im_end|>\n"
+            "<|im_start|>user\nU1<|im_end|>\n"
+            "<|im_start|>assistant\nA1<|im_end|>\n"
+            "<|im_start|>user\nU2<|im_end|>"
+            "<|im_start|>assistant\n"
+        )
+        
+        assert manager.format_chat_prompt(messages) == expected
+        # 第二次渲染命中缓存，结果保持一致
+        assert manager.format_chat_prompt(messages) == expected
+    
     def test_create_travel_planning_prompt(self, manager):
         """测试创建旅行规划提示词"""
         result = manager.create_travel_planning_prompt(
@@ -341,6 +451,97 @@ class TestPromptManager:
             assert template.variables == ["param"]
 
 
+class TestStablePrefixLayout:
+    """稳定前缀布局测试类"""
+    
+    @pytest.fixture
+    def manager(self):
+        """稳定前缀布局管理器fixture"""
+        return PromptManager(layout=PromptLayout.STABLE_PREFIX)
+    
+    def test_shared_prompt_first(self, manager):
+        """测试共享系统提示词始终位于最前"""
+        shared = manager.get_template("travel_system").template
+        messages = [
+            ChatMessage(role="system", content="用户偏好：喜欢博物馆"),
+            ChatMessage(role="user", content="去西安玩两天")
+        ]
+        
+        rendered = manager.render_chat_prompt(messages)
+        
+        assert rendered.text.startswith(f"<|im_start|>system\n{shared}\n\n用户偏好：喜欢博物馆")
+        assert rendered.prefix == f"<|im_start|>system\n{shared}"
+        assert rendered.family == "travel_system"
+    
+    def test_prefix_hash_stable_across_requests(self, manager):
+        """测试不同请求的前缀哈希一致"""
+        first = manager.render_chat_prompt([
+            ChatMessage(role="system", content="用户A的偏好"),
+            ChatMessage(role="user", content="去北京")
+        ])
+        second = manager.render_chat_prompt([
+            ChatMessage(role="user", content="去上海")
+        ])
+        
+        assert first.prefix_hash == second.prefix_hash
+        assert first.prefix == second.prefix
+    
+    def test_duplicate_shared_prompt_not_repeated(self, manager):
+        """测试调用方传入的共享提示词不重复"""
+        shared = manager.get_template("travel_system").template
+        rendered = manager.render_chat_prompt([
+            ChatMessage(role="system", content=shared),
+            ChatMessage(role="user", content="你好")
+        ])
+        
+        assert rendered.text.count(shared) == 1
+    
+    def test_continue_final_message(self, manager):
+        """测试最后一条assistant消息作为续写前缀"""
+        messages = [ChatMessage(role="user", content="去成都玩两天")]
+        partial = ChatMessage(role="assistant", content="第一天：宽窄巷子")
+        
+        base = manager.render_chat_prompt(messages)
+        rendered = manager.render_chat_prompt(
+            messages + [partial], continue_final_message=True
+        )
+        closed = manager.render_chat_prompt(messages + [partial])
+        
+        assert rendered.text == base.text + "第一天：宽窄巷子"
+        assert rendered.prefix_hash == base.prefix_hash
+        assert closed.text.endswith("<|im_start|>assistant\n")
+    
+    def test_unknown_family_raises(self, manager):
+        """测试未知模板族报错而不是回退到简单格式"""
+        with pytest.raises(UnknownPromptFamilyError, match="模板不存在"):
+            manager.render_chat_prompt(
+                [ChatMessage(role="user", content="你好")], family="nonexistent"
+            )
+        
+        with pytest.raises(UnknownPromptFamilyError):
+            PromptManager().render_chat_prompt(
+                [ChatMessage(role="user", content="你好")], family="nonexistent"
+            )
+    
+    def test_legacy_layout_hash(self):
+        """测试旧布局下系统消息不同则前缀不同"""
+        manager = PromptManager()
+        first = manager.render_chat_prompt([
+            ChatMessage(role="system", content="A"),
+            ChatMessage(role="user", content="你好")
+        ])
+        second = manager.render_chat_prompt([
+            ChatMessage(role="system", content="B"),
+            ChatMessage(role="user", content="你好")
+        ])
+        
+        assert first.prefix_hash != second.prefix_hash
+        assert first.text == manager.format_chat_prompt([
+            ChatMessage(role="system", content="A"),
+            ChatMessage(role="user", content="你好")
+        ])
+
+
 class TestGlobalPromptManager:
     """全局提示词管理器测试"""
     
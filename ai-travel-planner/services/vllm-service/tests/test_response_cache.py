@@ -0,0 +1,277 @@
+"""
+推理结果缓存测试
+Response cache tests
+"""
+
+import re
+import time
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from ..models import ChatMessage
+from ..prompt_manager import PromptManager
+from ..response_cache import (
+    CachedResponse,
+    InMemoryResponseCache,
+    ResponseCache,
+    SemanticResponseCache,
+    semantic_cache_text,
+)
+
+
+def bag_of_words_embed(text, dimensions=256):
+    """词袋向量：英文按单词，中文按单字"""
+    vector = np.zeros(dimensions)
+    for token, count in Counter(
+        re.findall(r"[a-z]+|\d+|[^\sa-z\d]", text.lower())
+    ).items():
+        vector[zlib.crc32(token.encode()) % dimensions] += count
+    return vector
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def make_entry(text="行程安排", finish_reason="stop"):
+    """构造缓存条目"""
+    return CachedResponse(
+        texts=[text],
+        finish_reasons=[finish_reason],
+        prompt_tokens=10,
+        completion_tokens=4,
+    )
+
+
+class TestCachedResponse:
+    """缓存条目测试类"""
+
+    def test_from_vllm_output(self):
+        """测试从vLLM输出创建"""
+        request_output = SimpleNamespace(
+            prompt_token_ids=[1, 2, 3],
+            outputs=[
+                SimpleNamespace(text="你好", token_ids=[7, 8], finish_reason="stop")
+            ],
+        )
+
+        entry = CachedResponse.from_vllm_output(request_output)
+
+        assert entry.texts == ["你好"]
+        assert entry.prompt_tokens == 3
+        assert entry.completion_tokens == 2
+
+    def test_to_response(self):
+        """测试转换为非流式响应"""
+        response = make_entry().to_response("req-1", "test-model")
+
+        assert response.object == "chat.completion"
+        assert response.choices[0].message.content == "行程安排"
+        assert response.usage.total_tokens == 14
+
+    def test_stream_replay(self):
+        """测试流式回放"""
+        entry = make_entry(text="第一天故宫第二天长城")
+
+        chunks = list(entry.iter_stream_chunks("req-1", "test-model", chunk_chars=3))
+
+        assert chunks[0].choices[0].delta.role == "assistant"
+        assert "".join(c.choices[0].delta.content for c in chunks) == "第一天故宫第二天长城"
+        assert chunks[-1].choices[0].finish_reason == "stop"
+        assert all(c.choices[0].finish_reason is None for c in chunks[:-1])
+
+
+class TestInMemoryResponseCache:
+    """内存缓存测试类"""
+
+    def test_get_set(self):
+        """测试读写"""
+        cache = InMemoryResponseCache()
+        entry = make_entry()
+
+        cache.set("k1", entry)
+
+        assert cache.get("k1") is entry
+        assert cache.get("missing") is None
+
+    def test_byte_budget_evicts_lru(self):
+        """测试超出字节预算时淘汰最久未使用的条目"""
+        entry_size = make_entry(text="a" * 100).size_bytes
+        cache = InMemoryResponseCache(max_bytes=entry_size * 2)
+
+        cache.set("k1", make_entry(text="a" * 100))
+        cache.set("k2", make_entry(text="b" * 100))
+        cache.get("k1")
+        cache.set("k3", make_entry(text="c" * 100))
+
+        assert cache.get("k1") is not None
+        assert cache.get("k2") is None
+        assert cache.get("k3") is not None
+        assert cache.size_bytes <= cache.max_bytes
+        assert cache.stats.evictions == 1
+
+    def test_ttl_expiration(self):
+        """测试过期条目"""
+        cache = InMemoryResponseCache(ttl=10.0)
+        entry = make_entry()
+        entry.created_at = time.time() - 20
+
+        cache.set("k1", entry)
+
+        assert cache.get("k1") is None
+        assert cache.stats.expirations == 1
+        assert cache.size_bytes == 0
+
+    def test_oversized_entry_not_stored(self):
+        """测试超过预算的单个条目不缓存"""
+        cache = InMemoryResponseCache(max_bytes=10)
+        cache.set("k1", make_entry(text="x" * 100))
+
+        assert len(cache) == 0
+
+
+class TestResponseCache:
+    """结果缓存测试类"""
+
+    def test_key_depends_on_params(self):
+        """测试缓存键包含采样参数"""
+        key1, ns1 = ResponseCache.make_key(
+            "prompt", {"temperature": 0, "max_tokens": 10}
+        )
+        key2, ns2 = ResponseCache.make_key(
+            "prompt", {"max_tokens": 10, "temperature": 0}
+        )
+        key3, ns3 = ResponseCache.make_key(
+            "prompt", {"temperature": 0, "max_tokens": 20}
+        )
+
+        assert key1 == key2
+        assert ns1 == ns2
+        assert key1 != key3
+        assert ns1 != ns3
+
+    def test_is_cacheable(self):
+        """测试缓存策略"""
+        assert ResponseCache.is_cacheable(0.0) is True
+        assert ResponseCache.is_cacheable(0.7) is False
+        assert ResponseCache.is_cacheable(0.7, allow_cached=True) is True
+
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_stats(self):
+        """测试命中统计"""
+        cache = ResponseCache()
+        key, namespace = ResponseCache.make_key("prompt", {"temperature": 0})
+
+        assert await cache.get(key, namespace, "prompt") is None
+        await cache.set(key, make_entry(), namespace, "prompt")
+        assert await cache.get(key, namespace, "prompt") is not None
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_aborted_results_not_cached(self):
+        """测试中止的结果不缓存"""
+        cache = ResponseCache()
+        await cache.set("k1", make_entry(finish_reason="abort"))
+
+        assert await cache.get("k1") is None
+
+    @pytest.mark.asyncio
+    async def test_semantic_tier(self):
+        """测试语义缓存命中近似请求"""
+        vectors = {
+            "去北京玩三天": [1.0, 0.0, 0.1],
+            "北京三日游": [0.99, 0.0, 0.12],
+            "上海美食推荐": [0.0, 1.0, 0.0],
+        }
+        semantic = SemanticResponseCache(embed_fn=vectors.__getitem__, threshold=0.95)
+        cache = ResponseCache(semantic=semantic)
+
+        key, namespace = ResponseCache.make_key("去北京玩三天", {"temperature": 0})
+        await cache.set(key, make_entry(), namespace, "去北京玩三天")
+
+        near_key, _ = ResponseCache.make_key("北京三日游", {"temperature": 0})
+        assert await cache.get(near_key, namespace, "北京三日游") is not None
+        assert cache.stats.semantic_hits == 1
+
+        far_key, _ = ResponseCache.make_key("上海美食推荐", {"temperature": 0})
+        assert await cache.get(far_key, namespace, "上海美食推荐") is None
+
+        # 不同采样参数不共享语义缓存
+        _, other_namespace = ResponseCache.make_key("北京三日游", {"temperature": 0.5})
+        assert await cache.get(near_key, other_namespace, "北京三日游") is None
+
+    @pytest.mark.asyncio
+    async def test_semantic_tier_ignores_shared_system_prompt(self):
+        """测试共享的系统提示词不会让不同目的地的请求互相命中"""
+        manager = PromptManager()
+        params = {
+            "model": "qwen",
+            "family": "travel_system",
+            "system": [],
+            "temperature": 0,
+        }
+
+        def request(content):
+            messages = [ChatMessage(role="user", content=content)]
+            rendered = manager.render_chat_prompt(messages)
+            key, namespace = ResponseCache.make_key(rendered.text, params)
+            return rendered.text, key, namespace, semantic_cache_text(messages)
+
+        tokyo_prompt, tokyo_key, namespace, tokyo_text = request("Plan 5 days in Tokyo")
+        osaka_prompt, osaka_key, _, osaka_text = request("Plan 5 days in Osaka")
+        _, again_key, _, again_text = request("Please plan 5 days in Tokyo")
+
+        # 整个提示词的相似度被系统提示词主导
+        assert (
+            cosine(bag_of_words_embed(tokyo_prompt), bag_of_words_embed(osaka_prompt))
+            > 0.95
+        )
+
+        semantic = SemanticResponseCache(embed_fn=bag_of_words_embed, threshold=0.9)
+        cache = ResponseCache(semantic=semantic)
+        await cache.set(tokyo_key, make_entry("东京五日游"), namespace, tokyo_text)
+
+        assert await cache.get(osaka_key, namespace, osaka_text) is None
+        hit = await cache.get(again_key, namespace, again_text)
+        assert hit is not None and hit.texts == ["东京五日游"]
+
+    def test_semantic_text_keeps_latest_turn(self):
+        """测试长对话截断时保留最新的用户消息"""
+        messages = [ChatMessage(role="system", content="系统提示词")]
+        for i in range(50):
+            messages.append(ChatMessage(role="user", content=f"第{i}个问题" * 10))
+            messages.append(ChatMessage(role="assistant", content=f"第{i}个回答" * 10))
+        messages.append(ChatMessage(role="user", content="最后一个问题"))
+
+        text = semantic_cache_text(messages, max_chars=512)
+
+        assert text.startswith("user: 最后一个问题")
+        assert "系统提示词" not in text
+        assert len(text) == 512
+
+    def test_semantic_eviction_keeps_max_entries(self):
+        """测试语义缓存条目数不超过上限"""
+        semantic = SemanticResponseCache(embed_fn=bag_of_words_embed, max_entries=3)
+        for i in range(5):
+            semantic.set("ns", f"k{i}", f"trip {i}", make_entry())
+
+        assert semantic.get("ns", "trip 4") is not None
+        assert semantic.get("ns", "trip 0") is None
+        assert sum(len(bucket) for bucket in semantic._buckets.values()) == 3
+
+    @pytest.mark.asyncio
+    async def test_clear(self):
+        """测试清空缓存"""
+        cache = ResponseCache()
+        await cache.set("k1", make_entry())
+        cache.clear()
+
+        assert await cache.get("k1") is None
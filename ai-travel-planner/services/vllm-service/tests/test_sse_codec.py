@@ -0,0 +1,137 @@
+"""
+SSE帧编解码测试
+SSE frame codec tests
+"""
+
+import json
+
+import pytest
+
+from .. import sse_codec
+from ..models import ChatCompletionChoice, ChatCompletionResponse, DeltaMessage
+from ..sse_codec import STDLIB_CODEC, SSEDecoder, SSEFrameEncoder
+
+
+@pytest.fixture(params=sse_codec.available_codecs())
+def codec(request):
+    """遍历已安装的编解码实现"""
+    previous = sse_codec.get_json_codec()
+    sse_codec.set_json_codec(request.param)
+    yield sse_codec.get_json_codec()
+    sse_codec.set_json_codec(previous)
+
+
+class TestJSONCodec:
+    """JSON编解码测试类"""
+
+    def test_roundtrip(self, codec):
+        """测试序列化和解析"""
+        data = {"content": '北京\n"故宫"', "index": 0}
+
+        encoded = sse_codec.dumps(data)
+
+        assert isinstance(encoded, bytes)
+        assert "北京".encode("utf-8") in encoded
+        assert sse_codec.loads(encoded) == data
+
+    def test_format_sse(self, codec):
+        """测试SSE帧格式"""
+        frame = sse_codec.format_sse({"a": 1})
+
+        assert frame == b'data: {"a":1}\n\n'
+
+    def test_unknown_codec(self):
+        """测试不支持的编解码实现"""
+        with pytest.raises(ValueError):
+            sse_codec.set_json_codec("unknown")
+
+
+class TestSSEFrameEncoder:
+    """SSE帧编码器测试类"""
+
+    def make_chunk(self, choices):
+        return ChatCompletionResponse(
+            id="req-1",
+            object="chat.completion.chunk",
+            created=123,
+            model="qwen",
+            choices=choices,
+        ).dict(exclude_none=True)
+
+    def test_matches_pydantic(self, codec):
+        """测试与pydantic序列化结果等价"""
+        encoder = SSEFrameEncoder("req-1", "qwen", 123)
+
+        frame = encoder.encode_delta(0, '你好"\n', role="assistant")
+        expected = self.make_chunk(
+            [
+                ChatCompletionChoice(
+                    index=0, delta=DeltaMessage(role="assistant", content='你好"\n')
+                )
+            ]
+        )
+        assert json.loads(frame[6:]) == expected
+
+        frame = encoder.encode_delta(0, "", finish_reason="stop")
+        expected = self.make_chunk(
+            [
+                ChatCompletionChoice(
+                    index=0, delta=DeltaMessage(content=""), finish_reason="stop"
+                )
+            ]
+        )
+        assert json.loads(frame[6:]) == expected
+
+    def test_multiple_choices(self, codec):
+        """测试多个候选"""
+        encoder = SSEFrameEncoder("req-1", "qwen", 123)
+
+        frame = encoder.encode_choices([(0, "a", None, None), (1, "b", None, "length")])
+
+        choices = json.loads(frame[6:])["choices"]
+        assert [c["delta"]["content"] for c in choices] == ["a", "b"]
+        assert "finish_reason" not in choices[0]
+        assert choices[1]["finish_reason"] == "length"
+
+
+class TestSSEDecoder:
+    """SSE解析器测试类"""
+
+    def test_split_across_chunks(self):
+        """测试跨数据块的事件"""
+        decoder = SSEDecoder()
+        stream = 'data: {"a":"北京"}\n\ndata: [DONE]\n\n'.encode("utf-8")
+
+        events = []
+        for i in range(0, len(stream), 3):
+            events.extend(decoder.feed(stream[i : i + 3]))
+
+        assert events == ['{"a":"北京"}'.encode("utf-8"), b"[DONE]"]
+
+    def test_crlf_and_comments(self):
+        """测试CRLF换行、注释和其他字段"""
+        decoder = SSEDecoder()
+
+        events = decoder.feed(b': ping\r\nevent: message\r\ndata:{"a":1}\r\n\r\n')
+
+        assert events == [b'{"a":1}']
+
+    def test_multiline_data(self):
+        """测试多行data字段"""
+        decoder = SSEDecoder()
+
+        assert decoder.feed(b"data: line1\ndata: line2\n\n") == [b"line1\nline2"]
+
+    def test_flush_unterminated_event(self):
+        """测试流结束时未以空行结尾的事件"""
+        decoder = SSEDecoder()
+
+        assert decoder.feed(b"data: [DONE]") == []
+        assert decoder.flush() == [b"[DONE]"]
+
+    def test_stdlib_codec_parses_bytes(self):
+        """测试标准库实现解析字节负载"""
+        decoder = SSEDecoder()
+        payload = decoder.feed('data: {"content":"你好"}\n\n'.encode("utf-8"))[0]
+
+        assert STDLIB_CODEC.loads(payload) == {"content": "你好"}
@@ -0,0 +1,200 @@
+"""
+流式增量跟踪测试
+Streaming delta tracker tests
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ..stream_delta import (
+    DeltaStreamTracker,
+    all_choices_finished,
+    collect_final_output,
+)
+
+
+def make_output(texts, finish_reasons=None, prompt_tokens=5):
+    """构造模拟的vLLM RequestOutput"""
+    finish_reasons = finish_reasons or [None] * len(texts)
+    return SimpleNamespace(
+        request_id="req-1",
+        prompt_token_ids=list(range(prompt_tokens)),
+        outputs=[
+            SimpleNamespace(
+                index=i,
+                text=text,
+                token_ids=list(range(len(text))),
+                finish_reason=finish_reason,
+            )
+            for i, (text, finish_reason) in enumerate(zip(texts, finish_reasons))
+        ],
+    )
+
+
+class TestDeltaStreamTracker:
+    """流式增量跟踪器测试类"""
+
+    def test_only_new_text_is_sent(self):
+        """测试只发送新增文本"""
+        tracker = DeltaStreamTracker(request_id="req-1", model_name="test-model")
+
+        first = tracker.update(make_output(["北京"]))
+        second = tracker.update(make_output(["北京欢迎"]))
+        third = tracker.update(make_output(["北京欢迎你"], ["stop"]))
+
+        assert first.object == "chat.completion.chunk"
+        assert first.choices[0].delta.role == "assistant"
+        assert first.choices[0].delta.content == "北京"
+        assert second.choices[0].delta.role is None
+        assert second.choices[0].delta.content == "欢迎"
+        assert third.choices[0].delta.content == "你"
+        assert third.choices[0].finish_reason == "stop"
+
+    def test_no_chunk_without_new_text(self):
+        """测试没有新内容时不发送数据块"""
+        tracker = DeltaStreamTracker(request_id="req-1", model_name="test-model")
+
+        assert tracker.update(make_output(["你好"])) is not None
+        assert tracker.update(make_output(["你好"])) is None
+
+    def test_multiple_choices_tracked_independently(self):
+        """测试多个候选独立跟踪偏移量"""
+        tracker = DeltaStreamTracker(request_id="req-1", model_name="test-model")
+
+        tracker.update(make_output(["a", "x"]))
+        chunk = tracker.update(make_output(["ab", "x"]))
+
+        assert len(chunk.choices) == 1
+        assert chunk.choices[0].index == 0
+        assert chunk.choices[0].delta.content == "b"
+
+        chunk = tracker.update(make_output(["ab", "xyz"], [None, "length"]))
+        assert chunk.choices[0].index == 1
+        assert chunk.choices[0].delta.content == "yz"
+        assert chunk.choices[0].finish_reason == "length"
+
+    def test_usage_chunk(self):
+        """测试使用统计数据块"""
+        tracker = DeltaStreamTracker(request_id="req-1", model_name="test-model")
+        tracker.update(make_output(["abc", "de"], prompt_tokens=7))
+
+        chunk = tracker.usage_chunk()
+
+        assert chunk.choices == []
+        assert chunk.usage.prompt_tokens == 7
+        assert chunk.usage.completion_tokens == 5
+        assert chunk.usage.total_tokens == 12
+
+    def test_concatenated_deltas_equal_full_text(self):
+        """测试增量拼接后等于完整文本"""
+        tracker = DeltaStreamTracker(request_id="req-1", model_name="test-model")
+        full_text = "第一天：故宫、景山公园；第二天：长城"
+
+        received = []
+        for end in range(1, len(full_text) + 1):
+            finish_reason = "stop" if end == len(full_text) else None
+            chunk = tracker.update(make_output([full_text[:end]], [finish_reason]))
+            received.append(chunk.choices[0].delta.content)
+
+        assert "".join(received) == full_text
+
+    def test_update_sse_matches_model_output(self):
+        """测试直接编码的SSE帧与模型序列化结果一致"""
+        tracker = DeltaStreamTracker(
+            request_id="req-1", model_name="test-model", created=1
+        )
+        reference = DeltaStreamTracker(
+            request_id="req-1", model_name="test-model", created=1
+        )
+
+        for texts, reasons in (
+            (["北京", "上"], None),
+            (["北京欢迎", "上海"], None),
+            (["北京欢迎你", '上海"见"'], ["stop", "length"]),
+        ):
+            frame = tracker.update_sse(make_output(texts, reasons))
+            chunk = reference.update(make_output(texts, reasons))
+
+            assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+            assert json.loads(frame[6:]) == chunk.dict(exclude_none=True)
+
+        assert (
+            tracker.update_sse(make_output(["北京欢迎你", '上海"见"'], ["stop", "length"]))
+            is None
+        )
+
+
+class TestCollectFinalOutput:
+    """非流式输出收集测试类"""
+
+    @staticmethod
+    def make_stream(outputs):
+        state = {"consumed": 0, "closed": False}
+
+        async def stream():
+            try:
+                for output in outputs:
+                    state["consumed"] += 1
+                    yield output
+            finally:
+                state["closed"] = True
+
+        return stream(), state
+
+    def test_all_choices_finished(self):
+        """测试所有候选结束判断"""
+        assert not all_choices_finished(make_output(["a", "b"], ["stop", None]), 2)
+        assert not all_choices_finished(make_output(["a"], ["stop"]), 2)
+        assert all_choices_finished(make_output(["a", "b"], ["stop", "length"]), 2)
+
+    @pytest.mark.asyncio
+    async def test_keeps_latest_output(self):
+        """测试只返回最新输出并回调每一步"""
+        outputs = [
+            make_output(["北"]),
+            make_output(["北京"]),
+            make_output(["北京"], ["stop"]),
+        ]
+        stream, _ = self.make_stream(outputs)
+        seen = []
+
+        final_output = await collect_final_output(stream, on_output=seen.append)
+
+        assert final_output is outputs[-1]
+        assert seen == outputs
+
+    @pytest.mark.asyncio
+    async def test_early_return_with_multiple_choices(self):
+        """测试所有候选结束后提前返回并关闭生成流"""
+        outputs = [
+            make_output(["a", "b"]),
+            make_output(["ab", "b"], ["stop", None]),
+            make_output(["ab", "bc"], ["stop", "length"]),
+            make_output(["ab", "bc"], ["stop", "length"]),
+        ]
+        stream, state = self.make_stream(outputs)
+
+        final_output = await collect_final_output(stream, expected_choices=2)
+
+        assert final_output is outputs[2]
+        assert state == {"consumed": 3, "closed": True}
+
+    @pytest.mark.asyncio
+    async def test_without_early_return(self):
+        """测试关闭提前返回时消费完整个生成流"""
+        outputs = [make_output(["a"], ["stop"]), make_output(["a"], ["stop"])]
+        stream, state = self.make_stream(outputs)
+
+        final_output = await collect_final_output(stream, early_return=False)
+
+        assert final_output is outputs[-1]
+        assert state["consumed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_stream(self):
+        """测试没有输出"""
+        stream, _ = self.make_stream([])
+
+        assert await collect_final_output(stream) is None
@@ -19,10 +19,14 @@ from ..streaming import (
     StreamingManager,
     StreamingError,
     StreamingTimeoutError,
+    StreamingDeadlineError,
     StreamingConnectionError,
+    StreamBudgetExhaustedError,
+    create_chat_stream_factory,
     get_streaming_manager
 )
 from ..client import VLLMTimeoutError, VLLMConnectionError
+from ..models import ChatMessage
 
 
 class TestRetryConfig:
@@ -273,4 +277,219 @@ class TestStreamingResponseProcessor:
     @pytest.fixture
     def processor(self):
         """处理器fixture"""
-        return StreamingResponseP
\ No newline at end of file
+        return StreamingResponseProcessor(
+            retry_config=RetryConfig(max_retries=2, base_delay=0.01)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_process_text_stream(self, processor):
+        """测试文本流式处理"""
+        async def stream():
+            yield b'{"choices": [{"index": 0, "delta": {"content": "\\u4f60"}}]}'
+            yield b'{"choices": [{"index": 0, "delta": {"content": "\\u597d"}}]}'
+            yield b"[DONE]"
+        
+        texts = [text async for text in processor.process_text_stream(stream())]
+        
+        assert "".join(texts) == "你好"
+
+
+def make_chunk(content, finish_reason=None, role=None):
+    """构造流式数据块"""
+    delta = {"content": content}
+    if role:
+        delta["role"] = role
+    return json.dumps({
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    })
+
+
+class TestProcessStream:
+    """流式处理超时和续传测试类"""
+    
+    @pytest.mark.asyncio
+    async def test_chunk_idle_timeout(self):
+        """测试数据块空闲超时"""
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=0),
+            timeout=5.0,
+            chunk_timeout=0.05
+        )
+        
+        async def stalled_stream():
+            yield make_chunk("北京")
+            await asyncio.sleep(10)
+            yield make_chunk("不会到达")
+        
+        received = []
+        start = time.monotonic()
+        with pytest.raises(StreamingTimeoutError):
+            async for chunk in handler.process_stream(stalled_stream()):
+                received.append(chunk)
+        
+        assert len(received) == 1
+        assert time.monotonic() - start < 1.0
+    
+    @pytest.mark.asyncio
+    async def test_overall_deadline(self):
+        """测试总时限"""
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=5, base_delay=0.01),
+            timeout=0.2,
+            chunk_timeout=0.1
+        )
+        
+        async def slow_stream():
+            while True:
+                await asyncio.sleep(0.05)
+                yield make_chunk("a")
+        
+        start = time.monotonic()
+        with pytest.raises(StreamingDeadlineError):
+            async for _ in handler.process_stream(slow_stream()):
+                pass
+        
+        assert time.monotonic() - start < 0.5
+        assert handler.stats.retries_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_resume_with_continuation_prefix(self):
+        """测试中断后以已收到的文本续传"""
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=2, base_delay=0.01),
+            timeout=5.0,
+            chunk_timeout=0.05
+        )
+        prefixes = []
+        
+        def factory(prefix):
+            prefixes.append(prefix)
+            
+            async def stream():
+                if not prefix:
+                    yield make_chunk("第一天", role="assistant")
+                    yield make_chunk("故宫")
+                    await asyncio.sleep(10)
+                else:
+                    yield make_chunk("，第二天长城", "stop", role="assistant")
+                    yield "[DONE]"
+            
+            return stream()
+        
+        chunks = [chunk async for chunk in handler.process_stream(factory)]
+        
+        text = "".join(c["choices"][0]["delta"]["content"] for c in chunks)
+        assert text == "第一天故宫，第二天长城"
+        assert prefixes == ["", "第一天故宫"]
+        assert "role" not in chunks[-1]["choices"][0]["delta"]
+        assert handler.stats.retries_count == 1
+        assert handler.stats.continuation_chars == len("第一天故宫")
+    
+    @pytest.mark.asyncio
+    async def test_resume_reduces_max_tokens_by_reported_usage(self):
+        """测试续传请求的max_tokens扣除服务端报告的已生成token数"""
+        requests = []
+        
+        def usage(tokens):
+            return json.dumps({"choices": [], "usage": {"completion_tokens": tokens}})
+        
+        async def stream_request(method, endpoint, data):
+            requests.append(data)
+            if len(requests) == 1:
+                yield make_chunk("第一天", role="assistant").encode()
+                yield usage(2).encode()
+                yield make_chunk("故宫").encode()
+                yield usage(3).encode()
+                raise VLLMConnectionError("连接断开")
+            yield make_chunk("，第二天长城", "stop").encode()
+            yield b"[DONE]"
+        
+        client = Mock()
+        client._stream_request = stream_request
+        factory = create_chat_stream_factory(
+            client, [ChatMessage(role="user", content="去北京")], max_tokens=100
+        )
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=1, base_delay=0.01)
+        )
+        
+        chunks = [chunk async for chunk in handler.process_stream(factory)]
+        
+        first, resumed = requests
+        assert first["max_tokens"] == 100
+        assert first["stream_options"]["continuous_usage_stats"] is True
+        assert resumed["max_tokens"] == 97
+        assert resumed["continue_final_message"] is True
+        assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    
+    def test_resume_with_token_counter(self):
+        """测试传入token_counter时按其计算前缀的token数"""
+        client = Mock()
+        client._stream_request = Mock(return_value=AsyncMock())
+        factory = create_chat_stream_factory(
+            client,
+            [ChatMessage(role="user", content="去北京")],
+            token_counter=lambda text: 4,
+            max_tokens=100
+        )
+        
+        factory("")
+        factory("第一天故宫")
+        
+        resumed = client._stream_request.call_args_list[-1].args[2]
+        assert resumed["max_tokens"] == 96
+    
+    @pytest.mark.asyncio
+    async def test_resume_with_exhausted_budget_raises(self):
+        """测试已用完max_tokens时抛出错误，不伪造结束数据块"""
+        client = Mock()
+        factory = create_chat_stream_factory(
+            client,
+            [ChatMessage(role="user", content="去北京")],
+            token_counter=lambda text: 10,
+            max_tokens=10
+        )
+        
+        with pytest.raises(StreamBudgetExhaustedError):
+            factory("第一天故宫")
+        
+        client._stream_request.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_plain_stream_not_retried_after_failure(self):
+        """测试普通数据流中断后不重试"""
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=2, base_delay=0.01)
+        )
+        
+        async def failing_stream():
+            yield make_chunk("北京")
+            raise VLLMConnectionError("连接断开")
+        
+        with pytest.raises(VLLMConnectionError):
+            async for _ in handler.process_stream(failing_stream()):
+                pass
+        
+        assert handler.stats.retries_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_finished_stream_ignores_trailing_error(self):
+        """测试收到结束原因后的中断不重试"""
+        handler = StreamingHandler(
+            retry_config=RetryConfig(max_retries=2, base_delay=0.01)
+        )
+        calls = []
+        
+        def factory(prefix):
+            calls.append(prefix)
+            
+            async def stream():
+                yield make_chunk("完成", "stop")
+                raise VLLMConnectionError("连接断开")
+            
+            return stream()
+        
+        chunks = [chunk async for chunk in handler.process_stream(factory)]
+        
+        assert len(chunks) == 1
+        assert calls == [""]
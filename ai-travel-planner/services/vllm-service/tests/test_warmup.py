@@ -0,0 +1,85 @@
+"""
+引擎预热测试
+Engine warm-up tests
+"""
+
+import asyncio
+
+import pytest
+
+from ..prompt_manager import PromptLayout, PromptManager
+from ..warmup import StartupTimer, build_warmup_prompts, run_warmup
+
+
+@pytest.fixture
+def prompts():
+    return build_warmup_prompts(PromptManager(layout=PromptLayout.STABLE_PREFIX), 6)
+
+
+class TestStartupTimer:
+    """启动耗时统计测试类"""
+
+    def test_phases(self):
+        """测试记录各阶段耗时，失败的阶段同样记录"""
+        timer = StartupTimer()
+        with timer.phase("engine_init"):
+            pass
+        with pytest.raises(RuntimeError):
+            with timer.phase("warmup"):
+                raise RuntimeError("boom")
+
+        stats = timer.to_dict()
+        assert set(stats["phases"]) == {"engine_init", "warmup"}
+        assert not stats["ready"]
+
+        timer.mark_ready()
+        assert timer.to_dict()["ready"]
+        assert timer.total >= 0
+
+
+class TestWarmup:
+    """预热测试类"""
+
+    def test_build_prompts(self, prompts):
+        """测试覆盖三类模板并共享系统前缀"""
+        assert len(prompts) == 6
+        assert len({p.prefix_hash for p in prompts}) == 1
+        assert len({p.text for p in prompts}) == 6
+
+    @pytest.mark.asyncio
+    async def test_single_then_concurrent(self, prompts):
+        """测试先单独执行一个请求，再并发执行其余请求"""
+        active = 0
+        peaks = []
+
+        async def generate(rendered, request_id):
+            nonlocal active
+            active += 1
+            peaks.append((request_id, active))
+            await asyncio.sleep(0)
+            yield rendered.text
+            active -= 1
+
+        result = await run_warmup(generate, prompts)
+
+        assert result.completed == 6 and result.failed == 0
+        assert peaks[0] == ("warmup-0", 1)
+        assert max(count for _, count in peaks) == 5
+
+    @pytest.mark.asyncio
+    async def test_failures_and_timeout(self, prompts):
+        """测试预热失败和超时不抛出异常"""
+
+        async def failing(rendered, request_id):
+            raise RuntimeError("engine error")
+            yield
+
+        result = await run_warmup(failing, prompts)
+        assert result.failed == 6 and not result.timed_out
+
+        async def slow(rendered, request_id):
+            await asyncio.sleep(10)
+            yield
+
+        result = await run_warmup(slow, prompts, timeout=0.01)
+        assert result.timed_out and result.completed == 0
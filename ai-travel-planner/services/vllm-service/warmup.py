@@ -0,0 +1,147 @@
+"""
+引擎预热和启动耗时统计
+Engine warm-up and startup timing
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from .models import ChatMessage
+from .prompt_manager import PromptManager, RenderedPrompt
+
+logger = logging.getLogger(__name__)
+
+WARMUP_DESTINATIONS = ("北京", "上海", "成都", "杭州", "西安")
+
+
+class StartupTimer:
+    """记录启动各阶段的耗时"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready_at: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """记录一个阶段的耗时，阶段失败时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def mark_ready(self):
+        """标记服务就绪"""
+        self.ready_at = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        """从启动到就绪的耗时，未就绪时为到目前为止的耗时"""
+        end = self.ready_at if self.ready_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phases": {
+                name: round(seconds, 3) for name, seconds in self.phases.items()
+            },
+            "total_seconds": round(self.total, 3),
+            "ready": self.ready_at is not None,
+        }
+
+
+@dataclass
+class WarmupResult:
+    """预热结果"""
+
+    requests: int
+    completed: int = 0
+    failed: int = 0
+    timed_out: bool = False
+    duration: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "duration_seconds": round(self.duration, 3),
+        }
+
+
+def build_warmup_prompts(
+    prompt_manager: PromptManager, count: int
+) -> List[RenderedPrompt]:
+    """
+    用旅行规划、景点推荐和美食推荐模板生成有代表性的预热提示词
+
+    提示词经过与线上请求相同的渲染流程，共享的系统前缀在预热后已进入前缀缓存。
+    """
+    builders = (
+        lambda destination: prompt_manager.create_travel_planning_prompt(
+            destination, "3天"
+        ),
+        lambda destination: prompt_manager.create_attraction_prompt(destination),
+        lambda destination: prompt_manager.create_food_prompt(destination),
+    )
+
+    prompts = []
+    for i in range(count):
+        destination = WARMUP_DESTINATIONS[
+            (i // len(builders)) % len(WARMUP_DESTINATIONS)
+        ]
+        content = builders[i % len(builders)](destination)
+        prompts.append(
+            prompt_manager.render_chat_prompt(
+                [ChatMessage(role="user", content=content)]
+            )
+        )
+    return prompts
+
+
+async def run_warmup(
+    generate: Callable[[RenderedPrompt, str], AsyncIterator[Any]],
+    prompts: List[RenderedPrompt],
+    timeout: Optional[float] = None,
+) -> WarmupResult:
+    """
+    执行预热请求
+
+    先单独执行一个请求，覆盖单序列的解码路径和首次调用的编译开销；
+    再同时提交全部请求，覆盖批量解码的路径。超时后放弃剩余的预热请求。
+    """
+    result = WarmupResult(requests=len(prompts))
+    if not prompts:
+        return result
+
+    async def run_one(index: int, rendered: RenderedPrompt):
+        try:
+            async for _ in generate(rendered, f"warmup-{index}"):
+                pass
+            result.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.failed += 1
+            logger.warning(f"预热请求 warmup-{index} 失败: {e}")
+
+    async def run_all():
+        await run_one(0, prompts[0])
+        await asyncio.gather(
+            *(run_one(i, p) for i, p in enumerate(prompts[1:], start=1))
+        )
+
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(run_all(), timeout=timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        logger.warning(f"预热超过 {timeout} 秒，已完成 {result.completed}/{result.requests} 个请求")
+    result.duration = time.perf_counter() - start
+    return result
@@ -1,17 +1,54 @@
 # Database package
 
-from .config import Base, get_db, init_db, close_db, engine, AsyncSessionLocal
+from .config import (
+    Base,
+    get_db,
+    get_read_db,
+    init_db,
+    close_db,
+    engine,
+    router,
+    AsyncSessionLocal,
+    ReadOnlySessionLocal,
+    DatabaseRouter,
+)
 from .models import UserORM, TravelPlanORM, ConversationORM, MessageORM
+from .repository import (
+    ConversationRepository,
+    MessageRepository,
+    MessageWriteBuffer,
+    NewMessage,
+    TravelPlanRepository,
+)
+from .cache import LocalSharedCache, SharedCache, UserContext, UserContextCache
+from .archive import MessageArchiver, ParquetMessageArchive
+from .partitions import ensure_message_partitions
 
 __all__ = [
     "Base",
     "get_db",
+    "get_read_db",
     "init_db", 
     "close_db",
     "engine",
+    "router",
     "AsyncSessionLocal",
+    "ReadOnlySessionLocal",
+    "DatabaseRouter",
     "UserORM",
     "TravelPlanORM",
     "ConversationORM",
     "MessageORM",
+    "ConversationRepository",
+    "MessageRepository",
+    "MessageWriteBuffer",
+    "NewMessage",
+    "TravelPlanRepository",
+    "LocalSharedCache",
+    "SharedCache",
+    "UserContext",
+    "UserContextCache",
+    "MessageArchiver",
+    "ParquetMessageArchive",
+    "ensure_message_partitions",
 ]
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Cold storage for messages of closed conversations.
+
+``MessageArchiver`` moves the messages of conversations that have been
+``COMPLETED`` for a while out of the hot ``messages`` table into one
+zstd-compressed Parquet file per conversation, then marks the
+conversation ``ARCHIVED``. A ``MessageRepository`` constructed with the
+archive rehydrates such a conversation on first read: the messages are
+inserted back and the conversation returns to ``COMPLETED``, so it is
+archived again once it has been idle long enough.
+
+The store is a local directory (``MESSAGE_ARCHIVE_DIR``); point it at a
+mounted bucket or network volume to share it between services.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+from uuid import UUID
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models.base import ConversationStatus, MessageRole
+from .config import AsyncSessionLocal
+from .models import ConversationORM
+from .repository import NewMessage, conversations_table, messages_table
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "data/message_archive")
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("conversation_id", pa.string()),
+            ("role", pa.string()),
+            ("content", pa.large_string()),
+            ("metadata", pa.string()),
+            ("tokens_used", pa.int32()),
+            ("model_name", pa.string()),
+            ("processing_time_ms", pa.int32()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+
+class ParquetMessageArchive:
+    """One Parquet file of messages per conversation under ``root``."""
+
+    def __init__(
+        self, root: Union[str, Path] = MESSAGE_ARCHIVE_DIR, compression: str = "zstd"
+    ):
+        self.root = Path(root)
+        self.compression = compression
+
+    def path(self, conversation_id: UUID) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.root / conversation_id.hex[:2] / f"{conversation_id}.parquet"
+
+    async def write(
+        self, conversation_id: UUID, rows: Sequence[Mapping[str, Any]]
+    ) -> Path:
+        """Write messages table rows, replacing any earlier archive of them."""
+        return await asyncio.to_thread(self._write, conversation_id, rows)
+
+    async def read(self, conversation_id: UUID) -> Optional[List[NewMessage]]:
+        """The archived messages, oldest first, or None if there is no archive."""
+        return await asyncio.to_thread(self._read, conversation_id)
+
+    async def delete(self, conversation_id: UUID) -> None:
+        await asyncio.to_thread(self.path(conversation_id).unlink, missing_ok=True)
+
+    def _write(self, conversation_id: UUID, rows: Sequence[Mapping[str, Any]]) -> Path:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns: Dict[str, List[Any]] = {name: [] for name in _schema().names}
+        for row in rows:
+            columns["id"].append(str(row["id"]))
+            columns["conversation_id"].append(str(row["conversation_id"]))
+            columns["role"].append(MessageRole(row["role"]).value)
+            columns["content"].append(row["content"])
+            columns["metadata"].append(
+                json.dumps(row["metadata"] or {}, ensure_ascii=False)
+            )
+            columns["tokens_used"].append(row["tokens_used"])
+            columns["model_name"].append(row["model_name"])
+            columns["processing_time_ms"].append(row["processing_time_ms"])
+            timestamp = row["timestamp"]
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            columns["timestamp"].append(timestamp)
+
+        path = self.path(conversation_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(
+            pa.table(columns, schema=_schema()), tmp_path, compression=self.compression
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    def _read(self, conversation_id: UUID) -> Optional[List[NewMessage]]:
+        import pyarrow.parquet as pq
+
+        path = self.path(conversation_id)
+        if not path.exists():
+            return None
+        return [
+            NewMessage(
+                id=UUID(row["id"]),
+                conversation_id=UUID(row["conversation_id"]),
+                role=MessageRole(row["role"]),
+                content=row["content"],
+                metadata=json.loads(row["metadata"]),
+                tokens_used=row["tokens_used"],
+                model_name=row["model_name"],
+                processing_time_ms=row["processing_time_ms"],
+                timestamp=row["timestamp"],
+            )
+            for row in pq.read_table(path, schema=_schema()).to_pylist()
+        ]
+
+
+class MessageArchiver:
+    """
+    Moves messages of idle closed conversations to the cold store.
+
+    A conversation qualifies once it has been ``COMPLETED`` and not updated
+    for ``closed_after``. Each conversation is archived in its own
+    transaction under a row lock (``SKIP LOCKED``, so several archivers and
+    a concurrent rehydration never collide); the file is written before
+    the rows are deleted, so a failure leaves the hot copy in place.
+    """
+
+    def __init__(
+        self,
+        archive: ParquetMessageArchive,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        closed_after: timedelta = timedelta(days=30),
+        batch_size: int = 100,
+    ):
+        self.archive = archive
+        self.session_factory = session_factory
+        self.closed_after = closed_after
+        self.batch_size = batch_size
+
+        # Statistics
+        self.archived_conversations = 0
+        self.archived_messages = 0
+
+    async def archive_batch(self) -> int:
+        """Archive up to ``batch_size`` conversations. Returns how many."""
+        cutoff = datetime.now(timezone.utc) - self.closed_after
+        async with self.session_factory() as session:
+            conversation_ids = list(
+                (
+                    await session.execute(
+                        select(ConversationORM.id)
+                        .where(
+                            ConversationORM.status == ConversationStatus.COMPLETED,
+                            ConversationORM.updated_at < cutoff,
+                        )
+                        .order_by(ConversationORM.updated_at)
+                        .limit(self.batch_size)
+                    )
+                ).scalars()
+            )
+
+        archived = 0
+        for conversation_id in conversation_ids:
+            if await self.archive_conversation(conversation_id):
+                archived += 1
+        return archived
+
+    async def archive_all(self) -> int:
+        """Archive batches until no conversation qualifies."""
+        total = 0
+        while True:
+            archived = await self.archive_batch()
+            total += archived
+            if archived < self.batch_size:
+                return total
+
+    async def archive_conversation(self, conversation_id: UUID) -> bool:
+        """Archive one completed conversation. Returns False if it was skipped."""
+        async with self.session_factory() as session:
+            async with session.begin():
+                locked = await session.scalar(
+                    select(ConversationORM.id)
+                    .where(
+                        ConversationORM.id == conversation_id,
+                        ConversationORM.status == ConversationStatus.COMPLETED,
+                    )
+                    .with_for_update(skip_locked=True)
+                )
+                if locked is None:
+                    return False
+
+                rows = (
+                    (
+                        await session.execute(
+                            select(messages_table)
+                            .where(messages_table.c.conversation_id == conversation_id)
+                            .order_by(messages_table.c.timestamp, messages_table.c.id)
+                        )
+                    )
+                    .mappings()
+                    .all()
+                )
+                await self.archive.write(conversation_id, rows)
+
+                await session.execute(
+                    delete(messages_table).where(
+                        messages_table.c.conversation_id == conversation_id
+                    )
+                )
+                await session.execute(
+                    update(conversations_table)
+                    .where(conversations_table.c.id == conversation_id)
+                    .values(status=ConversationStatus.ARCHIVED)
+                )
+
+        self.archived_conversations += 1
+        self.archived_messages += len(rows)
+        logger.info(f"Archived {len(rows)} messages of conversation {conversation_id}")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Archiver statistics."""
+        return {
+            "archived_conversations": self.archived_conversations,
+            "archived_messages": self.archived_messages,
+        }
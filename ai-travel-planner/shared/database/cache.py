@@ -0,0 +1,334 @@
+"""
+Read-through cache for per-user agent context.
+
+Every agent turn needs the user's preferences, travel history and active
+travel plan. ``UserContextCache`` keeps them, already converted to plain
+JSON-safe values, in an in-process LRU with a TTL and an optional shared
+tier. Entries older than ``revalidate_after`` are checked against a cheap
+version query (``updated_at`` of the user and of the active plan) and
+reloaded only when it changed. Concurrent misses for the same user share
+one database load.
+"""
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+from uuid import UUID
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models.base import PlanStatus
+from .config import ReadOnlySessionLocal
+from .models import TravelPlanORM, UserORM
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_PLAN_STATUSES = (PlanStatus.PLANNING, PlanStatus.CONFIRMED)
+
+V = TypeVar("V")
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert ORM column values to JSON-safe types."""
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+@dataclass
+class UserContext:
+    """A user's preferences, travel history and active plan, as JSON-safe values."""
+
+    user_id: str
+    preferences: Dict[str, Any]
+    travel_history: List[Any]
+    active_plan: Optional[Dict[str, Any]]
+    version: Tuple[Optional[str], ...]
+
+    def to_json(self) -> bytes:
+        return json.dumps(asdict(self)).encode()
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "UserContext":
+        fields = json.loads(data)
+        fields["version"] = tuple(fields["version"])
+        return cls(**fields)
+
+
+class LRUCache(Generic[V]):
+    """In-process LRU cache with a TTL per entry."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[V, float]]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[Tuple[V, float]]:
+        """Return ``(value, stored_at)``, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Any, value: V, stored_at: Optional[float] = None) -> None:
+        self._entries[key] = (
+            value,
+            time.monotonic() if stored_at is None else stored_at,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedCache(ABC):
+    """
+    Interface of the shared cache tier (e.g. Redis) used by several processes.
+
+    Values are opaque bytes; implementations handle expiry.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+
+class LocalSharedCache(SharedCache):
+    """In-memory stand-in for the shared tier, for tests and single-process setups."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class UserContextCache:
+    """
+    Read-through cache of ``UserContext`` keyed by user ID.
+
+    Lookup order: in-process LRU, then the shared tier, then the database.
+    Local entries younger than ``revalidate_after`` are served as is; older
+    ones, and every shared-tier hit, are validated with a version query
+    that reads only ``updated_at`` values. Writers should call
+    ``invalidate`` after changing a user or their plans; the version check
+    also catches writes made by other processes.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = ReadOnlySessionLocal,
+        max_entries: int = 10000,
+        ttl: float = 300.0,
+        revalidate_after: float = 5.0,
+        shared: Optional[SharedCache] = None,
+        key_prefix: str = "user_context:",
+    ):
+        self.session_factory = session_factory
+        self.revalidate_after = revalidate_after
+        self.ttl = ttl
+        self.shared = shared
+        self.key_prefix = key_prefix
+        self._local: LRUCache[UserContext] = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._inflight: Dict[UUID, asyncio.Task] = {}
+
+        # Statistics
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stale_reloads = 0
+        self.loads = 0
+        self.coalesced = 0
+
+    async def get(self, user_id: UUID) -> Optional[UserContext]:
+        """Return the user's context, or None if the user does not exist."""
+        entry = self._local.get(user_id)
+        if entry is not None:
+            context, checked_at = entry
+            if time.monotonic() - checked_at < self.revalidate_after:
+                self.hits += 1
+                return context
+            if await self._is_current(user_id, context):
+                self.hits += 1
+                self._local.set(user_id, context)
+                return context
+            self.stale_reloads += 1
+            return await self._load_once(user_id)
+
+        if self.shared is not None:
+            data = await self.shared.get(self._key(user_id))
+            if data is not None:
+                context = UserContext.from_json(data)
+                if await self._is_current(user_id, context):
+                    self.shared_hits += 1
+                    self._local.set(user_id, context)
+                    return context
+                self.stale_reloads += 1
+
+        self.misses += 1
+        return await self._load_once(user_id)
+
+    async def invalidate(self, user_id: UUID) -> None:
+        """Drop the cached context after the user or one of their plans changed."""
+        self._local.delete(user_id)
+        if self.shared is not None:
+            await self.shared.delete(self._key(user_id))
+
+    def _key(self, user_id: UUID) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    async def _load_once(self, user_id: UUID) -> Optional[UserContext]:
+        """Single-flight: concurrent misses for one user await the same load."""
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        else:
+            self.coalesced += 1
+        # shield: a cancelled caller must not cancel the load other callers wait on
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: UUID) -> Optional[UserContext]:
+        self.loads += 1
+        async with self.session_factory() as session:
+            user = (
+                await session.execute(
+                    select(
+                        UserORM.preferences, UserORM.travel_history, UserORM.updated_at
+                    ).where(UserORM.id == user_id)
+                )
+            ).one_or_none()
+            if user is None:
+                return None
+            plan = (
+                await session.execute(
+                    self._active_plan_query(user_id, select(TravelPlanORM))
+                )
+            ).scalar_one_or_none()
+
+        preferences, travel_history, user_updated_at = user
+        active_plan = None
+        if plan is not None:
+            active_plan = to_jsonable(
+                {
+                    column.key: getattr(plan, column.key)
+                    for column in TravelPlanORM.__mapper__.column_attrs
+                }
+            )
+        context = UserContext(
+            user_id=str(user_id),
+            preferences=to_jsonable(preferences or {}),
+            travel_history=to_jsonable(travel_history or []),
+            active_plan=active_plan,
+            version=self._version(
+                user_updated_at,
+                plan.id if plan is not None else None,
+                plan.updated_at if plan is not None else None,
+            ),
+        )
+
+        self._local.set(user_id, context)
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._key(user_id), context.to_json(), self.ttl)
+            except Exception as e:
+                logger.warning(f"Failed to write user context to shared cache: {e}")
+        return context
+
+    async def _is_current(self, user_id: UUID, context: UserContext) -> bool:
+        """Compare the cached version with the current ``updated_at`` values."""
+        self.revalidations += 1
+        plan = self._active_plan_query(
+            user_id, select(TravelPlanORM.id, TravelPlanORM.updated_at)
+        ).subquery()
+        statement = (
+            select(UserORM.updated_at, plan.c.id, plan.c.updated_at)
+            .select_from(UserORM)
+            .outerjoin(plan, true())
+            .where(UserORM.id == user_id)
+        )
+        async with self.session_factory() as session:
+            row = (await session.execute(statement)).one_or_none()
+        return row is not None and self._version(*row) == context.version
+
+    @staticmethod
+    def _active_plan_query(user_id: UUID, statement):
+        """The user's most recently updated plan still in planning or confirmed."""
+        return (
+            statement.where(
+                TravelPlanORM.user_id == user_id,
+                TravelPlanORM.status.in_(ACTIVE_PLAN_STATUSES),
+            )
+            .order_by(TravelPlanORM.updated_at.desc())
+            .limit(1)
+        )
+
+    @staticmethod
+    def _version(
+        user_updated_at: Any, plan_id: Any, plan_updated_at: Any
+    ) -> Tuple[Optional[str], ...]:
+        return tuple(
+            None if value is None else str(to_jsonable(value))
+            for value in (user_updated_at, plan_id, plan_updated_at)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics."""
+        return {
+            "entries": len(self._local),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "stale_reloads": self.stale_reloads,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+        }
@@ -1,22 +1,26 @@
 """
 SQLAlchemy ORM models for the AI Travel Planner system.
 """
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from decimal import Decimal
 from typing import List, Optional
 from uuid import uuid4
 
 from sqlalchemy import (
     String, Text, Integer, Float, Boolean, DateTime, Date, 
-    ForeignKey, JSON, Enum as SQLEnum, DECIMAL, Index
+    ForeignKey, JSON, Enum as SQLEnum, DECIMAL, Index, DDL, event
 )
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
 from .config import Base
 from ..models.base import TravelStyle, PlanStatus, ConversationStatus, MessageRole, Currency
 
+# JSONB on PostgreSQL so plan contents can be filtered with GIN-indexed
+# containment (@>); plain JSON elsewhere (e.g. SQLite in tests)
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 
 class UserORM(Base):
     """User ORM model."""
@@ -83,7 +87,7 @@ class TravelPlanORM(Base):
     # Basic info
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     destination: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
-    destinations: Mapped[list] = mapped_column(JSON, default=list)
+    destinations: Mapped[list] = mapped_column(JSONDocument, default=list)
     
     # Dates
     start_date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
@@ -101,9 +105,9 @@ class TravelPlanORM(Base):
     travel_style: Mapped[str] = mapped_column(String(50), nullable=False)
     
     # JSON fields for complex data
-    flights: Mapped[list] = mapped_column(JSON, default=list)
-    hotels: Mapped[list] = mapped_column(JSON, default=list)
-    itinerary: Mapped[list] = mapped_column(JSON, default=list)
+    flights: Mapped[list] = mapped_column(JSONDocument, default=list)
+    hotels: Mapped[list] = mapped_column(JSONDocument, default=list)
+    itinerary: Mapped[list] = mapped_column(JSONDocument, default=list)
     special_requirements: Mapped[list] = mapped_column(JSON, default=list)
     
     # Notes
@@ -129,6 +133,19 @@ class TravelPlanORM(Base):
     __table_args__ = (
         Index('ix_travel_plans_user_status', 'user_id', 'status'),
         Index('ix_travel_plans_dates', 'start_date', 'end_date'),
+        # GIN indexes for TravelPlanRepository's containment filters
+        Index(
+            'ix_travel_plans_destinations_gin', 'destinations',
+            postgresql_using='gin', postgresql_ops={'destinations': 'jsonb_path_ops'}
+        ),
+        Index(
+            'ix_travel_plans_hotels_gin', 'hotels',
+            postgresql_using='gin', postgresql_ops={'hotels': 'jsonb_path_ops'}
+        ),
+        Index(
+            'ix_travel_plans_itinerary_gin', 'itinerary',
+            postgresql_using='gin', postgresql_ops={'itinerary': 'jsonb_path_ops'}
+        ),
     )
     
     def __repr__(self) -> str:
@@ -173,17 +190,24 @@ class ConversationORM(Base):
     
     # Relationships
     user: Mapped["UserORM"] = relationship("UserORM", back_populates="conversations")
+    # Never lazy-loaded: long conversations have thousands of messages.
+    # Use MessageRepository.history() or load explicitly with selectinload().
     messages: Mapped[List["MessageORM"]] = relationship(
         "MessageORM", 
         back_populates="conversation",
         cascade="all, delete-orphan",
-        order_by="MessageORM.timestamp"
+        order_by="MessageORM.timestamp",
+        lazy="raise_on_sql"
     )
     
     # Indexes
     __table_args__ = (
         Index('ix_conversations_user_status', 'user_id', 'status'),
         Index('ix_conversations_updated', 'updated_at'),
+        # Archival job: closed conversations that have been idle long enough
+        Index('ix_conversations_status_updated', 'status', 'updated_at'),
+        # Keyset pagination of a user's conversations, most recently updated first
+        Index('ix_conversations_user_updated_id', 'user_id', 'updated_at', 'id'),
     )
     
     def __repr__(self) -> str:
@@ -191,11 +215,18 @@ class ConversationORM(Base):
 
 
 class MessageORM(Base):
-    """Message ORM model."""
+    """
+    Message ORM model.
+
+    On PostgreSQL the table is range-partitioned by month on ``timestamp``
+    (see ``shared.database.partitions``), so ``timestamp`` is part of the
+    primary key. Messages of archived conversations live in the cold store
+    (see ``shared.database.archive``) until they are read again.
+    """
     
     __tablename__ = "messages"
     
-    # Primary key
+    # Primary key (a partitioned table's key must include the partition column)
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     
     # Foreign key
@@ -215,9 +246,12 @@ class MessageORM(Base):
     model_name: Mapped[Optional[str]] = mapped_column(String(100))
     processing_time_ms: Mapped[Optional[int]] = mapped_column(Integer)
     
-    # Timestamp
+    # Timestamp (partition key); set client-side so the primary key is known
+    # before insert
     timestamp: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
+        primary_key=True,
+        default=lambda: datetime.now(timezone.utc),
         server_default=func.now(),
         nullable=False
     )
@@ -227,9 +261,31 @@ class MessageORM(Base):
     
     # Indexes
     __table_args__ = (
-        Index('ix_messages_conversation_timestamp', 'conversation_id', 'timestamp'),
+        # Keyset pagination of history; id breaks ties between equal timestamps.
+        # role and tokens_used are included so token-budget scans are index-only.
+        Index(
+            'ix_messages_conversation_timestamp_id',
+            'conversation_id', 'timestamp', 'id',
+            postgresql_include=['role', 'tokens_used']
+        ),
         Index('ix_messages_role', 'role'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
     
     def __repr__(self) -> str:
-        return f"<Message(id={self.id}, role={self.role}, conversation_id={self.conversation_id})>"
\ No newline at end of file
+        return (
+            f"<Message(id={self.id}, role={self.role}, "
+            f"conversation_id={self.conversation_id})>"
+        )
+
+
+# A partitioned table accepts no rows until a partition covers them. The
+# default partition catches anything outside the monthly partitions that
+# ensure_message_partitions() creates ahead of time.
+event.listen(
+    MessageORM.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
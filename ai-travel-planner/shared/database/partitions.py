@@ -0,0 +1,127 @@
+"""
+Monthly range partitions of the messages table (PostgreSQL only).
+
+Each month of messages lives in its own partition (``messages_y2026m10``),
+so indexes and vacuum work on the hot table stay bounded by one month of
+chat volume, and months emptied by archival can be dropped outright.
+Partitions are created ahead of time by ``ensure_message_partitions``;
+rows outside every monthly partition land in ``messages_default``.
+
+All functions are no-ops on other databases, where ``messages`` is a
+plain table.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+
+
+@dataclass(frozen=True)
+class MonthPartition:
+    """One month of the messages table: rows with ``lower <= timestamp < upper``."""
+
+    lower: date
+    upper: date
+
+    @property
+    def name(self) -> str:
+        return f"{PARENT_TABLE}_y{self.lower.year:04d}m{self.lower.month:02d}"
+
+    def create_sql(self) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {self.name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{self.lower.isoformat()}') "
+            f"TO ('{self.upper.isoformat()}')"
+        )
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """First day of the month ``months`` after ``value``'s month."""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_partitions(start: date, end: date) -> List[MonthPartition]:
+    """Partitions covering every month from ``start``'s through ``end``'s, inclusive."""
+    partitions = []
+    lower = month_start(start)
+    while lower <= end:
+        upper = add_months(lower, 1)
+        partitions.append(MonthPartition(lower, upper))
+        lower = upper
+    return partitions
+
+
+async def ensure_message_partitions(
+    conn: AsyncConnection,
+    months_ahead: int = 3,
+    start: Optional[date] = None,
+) -> List[str]:
+    """
+    Create monthly partitions from ``start`` (default: this month) through
+    ``months_ahead`` months from now. Returns the partitions checked.
+
+    Run it regularly (the archival job does): a month must exist before its
+    first message arrives, because creating a partition fails if the
+    default partition already holds rows for that range.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+
+    today = datetime.now(timezone.utc).date()
+    partitions = month_partitions(start or today, add_months(today, months_ahead))
+    for partition in partitions:
+        await conn.execute(text(partition.create_sql()))
+    return [partition.name for partition in partitions]
+
+
+async def drop_empty_message_partitions(
+    conn: AsyncConnection, before: date
+) -> List[str]:
+    """
+    Drop monthly partitions that end on or before ``before`` and hold no rows.
+
+    Once archival has moved every conversation of a month to the cold store
+    its partition is empty; dropping it is instant, unlike deleting rows.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = :parent AND child.relname <> :default"
+        ),
+        {"parent": PARENT_TABLE, "default": DEFAULT_PARTITION},
+    )
+
+    dropped = []
+    for (name,) in result.all():
+        try:
+            lower = date(int(name[-7:-3]), int(name[-2:]), 1)
+        except ValueError:
+            continue
+        if add_months(lower, 1) > before:
+            continue
+        has_rows = await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {name})"))
+        if has_rows:
+            continue
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Dropped empty message partition {name}")
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,745 @@
+"""
+Repository layer for high-volume database reads and writes.
+
+Committing one ``MessageORM`` per turn costs a round trip and a transaction
+per row. These helpers batch messages into multi-row ``INSERT ... VALUES``
+statements (or ``COPY`` on asyncpg), apply conversation counters as SQL
+expressions so concurrent turns never overwrite each other, and buffer
+messages in memory so a single transaction carries many turns.
+
+History is read with keyset pagination on ``(timestamp, id)``: each page
+seeks directly into the composite index, so loading the last N turns
+costs O(N) no matter how long the conversation is.
+
+Travel plan filters use JSONB containment on PostgreSQL, served by GIN
+indexes instead of scanning and deserialising every plan in Python.
+
+Given a message archive, history reads transparently rehydrate
+conversations whose messages were moved to cold storage.
+"""
+import asyncio
+import base64
+import binascii
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import (
+    and_,
+    bindparam,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker
+from sqlalchemy.sql.elements import ColumnElement
+
+from ..models.base import ConversationStatus, MessageRole
+from .config import AsyncSessionLocal
+from .models import ConversationORM, MessageORM, TravelPlanORM
+
+if TYPE_CHECKING:
+    from .archive import ParquetMessageArchive
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL accepts at most 32767 bind parameters per statement
+MAX_BIND_PARAMS = 32000
+
+messages_table = MessageORM.__table__
+conversations_table = ConversationORM.__table__
+
+
+@dataclass
+class NewMessage:
+    """
+    A chat message waiting to be written.
+
+    ``id`` and ``timestamp`` are assigned when the turn happens rather than
+    when the row is flushed, so buffered messages keep their order.
+    ``cost`` is not stored on the message; it is added to the
+    conversation's ``total_cost``.
+    """
+
+    conversation_id: UUID
+    role: MessageRole
+    content: str
+    tokens_used: Optional[int] = None
+    model_name: Optional[str] = None
+    processing_time_ms: Optional[int] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    cost: float = 0.0
+    id: UUID = field(default_factory=uuid4)
+    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def to_row(self) -> Dict[str, Any]:
+        """Column values for the messages table."""
+        return {
+            "id": self.id,
+            "conversation_id": self.conversation_id,
+            "role": self.role,
+            "content": self.content,
+            "metadata": self.metadata,
+            "tokens_used": self.tokens_used,
+            "model_name": self.model_name,
+            "processing_time_ms": self.processing_time_ms,
+            "timestamp": self.timestamp,
+        }
+
+
+def encode_cursor(timestamp: datetime, row_id: UUID) -> str:
+    """Encode a keyset position as an opaque URL-safe token."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a token produced by ``encode_cursor``. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), UUID(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+@dataclass
+class Page:
+    """One page of keyset-paginated results."""
+
+    items: List[Any]
+    next_cursor: Optional[str] = None
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether a failed write may succeed if retried as is.
+
+    Covers lost connections, failovers and lock timeouts.
+    """
+    if isinstance(error, OperationalError):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def sum_usage(messages: Iterable[NewMessage]) -> Dict[UUID, Tuple[int, float]]:
+    """Sum token and cost deltas per conversation."""
+    usage: Dict[UUID, Tuple[int, float]] = {}
+    for message in messages:
+        tokens, cost = usage.get(message.conversation_id, (0, 0.0))
+        usage[message.conversation_id] = (
+            tokens + (message.tokens_used or 0),
+            cost + message.cost,
+        )
+    return usage
+
+
+class MessageRepository:
+    """
+    Bulk writes and history queries for the messages table. Callers own the transaction.
+
+    With an ``archive``, a read that reaches the start of the hot history of
+    an ``ARCHIVED`` conversation first restores its messages from the cold
+    store; the caller must commit for the restore to persist.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        use_copy: bool = False,
+        archive: Optional["ParquetMessageArchive"] = None,
+    ):
+        self.session = session
+        self.use_copy = use_copy
+        self.archive = archive
+
+    async def history(
+        self,
+        conversation_id: UUID,
+        limit: int = 50,
+        before: Optional[str] = None,
+    ) -> Page:
+        """
+        Return up to ``limit`` messages older than the ``before`` cursor.
+
+        Messages in the page are in chronological order. Pass the returned
+        ``next_cursor`` as ``before`` to load the preceding page.
+        """
+        statement = (
+            select(MessageORM)
+            .where(MessageORM.conversation_id == conversation_id)
+            .order_by(MessageORM.timestamp.desc(), MessageORM.id.desc())
+            .limit(limit + 1)
+        )
+        if before is not None:
+            statement = statement.where(
+                tuple_(MessageORM.timestamp, MessageORM.id) < decode_cursor(before)
+            )
+
+        messages = list((await self.session.execute(statement)).scalars())
+        if len(messages) <= limit and await self.restore_archived(conversation_id):
+            messages = list((await self.session.execute(statement)).scalars())
+        next_cursor = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            oldest = messages[-1]
+            next_cursor = encode_cursor(oldest.timestamp, oldest.id)
+        messages.reverse()
+        return Page(items=messages, next_cursor=next_cursor)
+
+    async def recent(self, conversation_id: UUID, limit: int) -> List[MessageORM]:
+        """The last ``limit`` messages of a conversation, oldest first."""
+        return (await self.history(conversation_id, limit=limit)).items
+
+    async def recent_within_tokens(
+        self,
+        conversation_id: UUID,
+        max_tokens: int,
+        scan_batch: int = 200,
+    ) -> List[MessageORM]:
+        """
+        The most recent messages whose ``tokens_used`` sum fits ``max_tokens``.
+
+        Messages are returned oldest first.
+
+        The token walk reads only ``(timestamp, id, tokens_used)``, which the
+        covering index serves without touching the table; full rows are
+        fetched once for the messages that fit.
+        """
+        table = messages_table
+        used = 0
+        boundary: Optional[Tuple[datetime, UUID]] = None
+        position: Optional[Tuple[datetime, UUID]] = None
+        done = False
+        while not done:
+            statement = (
+                select(table.c.timestamp, table.c.id, table.c.tokens_used)
+                .where(table.c.conversation_id == conversation_id)
+                .order_by(table.c.timestamp.desc(), table.c.id.desc())
+                .limit(scan_batch)
+            )
+            if position is not None:
+                statement = statement.where(
+                    tuple_(table.c.timestamp, table.c.id) < position
+                )
+
+            rows = (await self.session.execute(statement)).all()
+            if len(rows) < scan_batch and await self.restore_archived(conversation_id):
+                rows = (await self.session.execute(statement)).all()
+            for timestamp, row_id, tokens in rows:
+                if used + (tokens or 0) > max_tokens:
+                    done = True
+                    break
+                used += tokens or 0
+                boundary = (timestamp, row_id)
+            if len(rows) < scan_batch:
+                done = True
+            elif rows:
+                position = (rows[-1][0], rows[-1][1])
+
+        if boundary is None:
+            return []
+        statement = (
+            select(MessageORM)
+            .where(
+                MessageORM.conversation_id == conversation_id,
+                tuple_(MessageORM.timestamp, MessageORM.id) >= boundary,
+            )
+            .order_by(MessageORM.timestamp, MessageORM.id)
+        )
+        return list((await self.session.execute(statement)).scalars())
+
+    async def restore_archived(self, conversation_id: UUID) -> bool:
+        """
+        Move an archived conversation's messages back into the messages table.
+
+        Returns False without touching anything unless an archive is
+        configured and the conversation is ``ARCHIVED``. The status is first
+        read without a lock, so reads of live conversations stay on a
+        replica and do not block usage updates; only an archived
+        conversation's row is locked (which moves a read-only session to
+        the primary) and set back to ``COMPLETED``. Returns True when the
+        caller should re-read, including when another session restored the
+        conversation in the meantime.
+        """
+        if self.archive is None:
+            return False
+
+        status_query = select(ConversationORM.status).where(
+            ConversationORM.id == conversation_id
+        )
+        if await self.session.scalar(status_query) != ConversationStatus.ARCHIVED:
+            return False
+        if (
+            await self.session.scalar(status_query.with_for_update())
+            != ConversationStatus.ARCHIVED
+        ):
+            return True
+
+        messages = await self.archive.read(conversation_id)
+        if messages is None:
+            logger.error(
+                f"Conversation {conversation_id} is archived but its archive is missing"
+            )
+            return False
+
+        await self.bulk_insert(messages)
+        await self.session.execute(
+            update(conversations_table)
+            .where(conversations_table.c.id == conversation_id)
+            .values(status=ConversationStatus.COMPLETED)
+        )
+        logger.info(
+            f"Restored {len(messages)} archived messages "
+            f"of conversation {conversation_id}"
+        )
+        return True
+
+    async def bulk_insert(self, messages: Sequence[NewMessage]) -> int:
+        """
+        Insert messages in as few statements as possible.
+
+        Uses ``COPY`` when ``use_copy`` is set and the driver is asyncpg,
+        otherwise multi-row ``INSERT ... VALUES`` chunked to stay under the
+        bind parameter limit.
+        """
+        if not messages:
+            return 0
+
+        rows = [message.to_row() for message in messages]
+        connection = await self.session.connection()
+        if self.use_copy and connection.dialect.driver == "asyncpg":
+            await self._copy(connection, rows)
+            return len(rows)
+
+        chunk_size = max(1, MAX_BIND_PARAMS // len(rows[0]))
+        for start in range(0, len(rows), chunk_size):
+            await self.session.execute(
+                insert(messages_table).values(rows[start : start + chunk_size])
+            )
+        return len(rows)
+
+    async def _copy(
+        self, connection: AsyncConnection, rows: List[Dict[str, Any]]
+    ) -> None:
+        """Load rows with COPY through the underlying asyncpg connection."""
+        dialect = connection.dialect
+        columns = list(rows[0])
+        # Apply the same conversions SQLAlchemy uses for INSERT (enums, JSON)
+        processors = [
+            messages_table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+            for name in columns
+        ]
+        records = [
+            tuple(
+                processor(row[name]) if processor else row[name]
+                for name, processor in zip(columns, processors)
+            )
+            for row in rows
+        ]
+
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            messages_table.name,
+            records=records,
+            columns=columns,
+            schema_name=messages_table.schema,
+        )
+
+
+class ConversationRepository:
+    """
+    Listing and counter updates for the conversations table.
+
+    Callers own the transaction.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_for_user(
+        self,
+        user_id: UUID,
+        limit: int = 20,
+        before: Optional[str] = None,
+    ) -> Page:
+        """A user's conversations, most recently updated first, keyset-paginated."""
+        statement = (
+            select(ConversationORM)
+            .where(ConversationORM.user_id == user_id)
+            .order_by(ConversationORM.updated_at.desc(), ConversationORM.id.desc())
+            .limit(limit + 1)
+        )
+        if before is not None:
+            statement = statement.where(
+                tuple_(ConversationORM.updated_at, ConversationORM.id)
+                < decode_cursor(before)
+            )
+
+        conversations = list((await self.session.execute(statement)).scalars())
+        next_cursor = None
+        if len(conversations) > limit:
+            conversations = conversations[:limit]
+            last = conversations[-1]
+            next_cursor = encode_cursor(last.updated_at, last.id)
+        return Page(items=conversations, next_cursor=next_cursor)
+
+    async def add_usage(self, conversation_id: UUID, tokens: int, cost: float) -> None:
+        """
+        Increment ``total_tokens`` and ``total_cost`` in SQL.
+
+        The increment is evaluated by the database, so concurrent turns in
+        the same conversation cannot lose each other's updates.
+        """
+        await self.add_usage_many({conversation_id: (tokens, cost)})
+
+    async def add_usage_many(self, usage: Dict[UUID, Tuple[int, float]]) -> None:
+        """Apply per-conversation deltas with a single executemany."""
+        if not usage:
+            return
+
+        table = conversations_table
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                total_tokens=func.coalesce(table.c.total_tokens, 0)
+                + bindparam("b_tokens"),
+                total_cost=func.coalesce(table.c.total_cost, 0.0) + bindparam("b_cost"),
+                updated_at=func.now(),
+            )
+        )
+        # Update rows in a fixed order so concurrent flushes lock them in the same order
+        params = [
+            {"b_id": conversation_id, "b_tokens": tokens, "b_cost": cost}
+            for conversation_id, (tokens, cost) in sorted(
+                usage.items(), key=lambda item: str(item[0])
+            )
+        ]
+        await self.session.execute(statement, params)
+
+
+def json_array_contains(column: Any, element: Any, dialect_name: str) -> ColumnElement:
+    """
+    Match rows whose JSON array column contains ``element``.
+
+    ``element`` is a scalar (``"Kyoto"``) or a dict matched as a subset of
+    an array item (``{"name": "Tokyo Hotel"}``). On PostgreSQL this is
+    JSONB ``@>``, which the GIN ``jsonb_path_ops`` indexes serve; other
+    dialects fall back to an EXISTS over ``json_each``.
+    """
+    if dialect_name == "postgresql":
+        # type_coerce keeps the bare column in SQL so the GIN index applies
+        return type_coerce(column, JSONB).contains([element])
+
+    item = func.json_each(column).table_valued("value").alias()
+    if isinstance(element, dict):
+        condition = and_(
+            *(
+                func.json_extract(item.c.value, f"$.{key}") == value
+                for key, value in element.items()
+            )
+        )
+    else:
+        condition = item.c.value == element
+    return select(1).select_from(item).where(condition).exists()
+
+
+class TravelPlanRepository:
+    """Filters over the JSON contents of travel plans."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def _contains(self, column: Any, element: Any) -> ColumnElement:
+        return json_array_contains(
+            column, element, self.session.get_bind().dialect.name
+        )
+
+    async def _find(self, condition: ColumnElement, limit: int) -> List[TravelPlanORM]:
+        statement = (
+            select(TravelPlanORM)
+            .where(condition)
+            .order_by(TravelPlanORM.start_date.desc(), TravelPlanORM.id)
+            .limit(limit)
+        )
+        return list((await self.session.execute(statement)).scalars())
+
+    async def find_by_city(self, city: str, limit: int = 100) -> List[TravelPlanORM]:
+        """Plans whose main destination or destination list includes ``city``."""
+        return await self._find(
+            or_(
+                TravelPlanORM.destination == city,
+                self._contains(TravelPlanORM.destinations, city),
+            ),
+            limit,
+        )
+
+    async def find_by_hotel(
+        self, hotel_name: str, limit: int = 100
+    ) -> List[TravelPlanORM]:
+        """Plans that book a hotel with this name."""
+        return await self._find(
+            self._contains(TravelPlanORM.hotels, {"name": hotel_name}), limit
+        )
+
+    async def find_by_itinerary(
+        self, limit: int = 100, **fields: Any
+    ) -> List[TravelPlanORM]:
+        """
+        Plans with an itinerary item matching all ``fields``.
+
+        For example ``find_by_itinerary(location="Tokyo Tower")``.
+        """
+        if not fields:
+            raise ValueError("At least one itinerary field is required")
+        return await self._find(self._contains(TravelPlanORM.itinerary, fields), limit)
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    ``add`` only appends to memory. A background task flushes when
+    ``max_batch_size`` messages are pending or every ``flush_interval``
+    seconds. Each flush inserts the batch and applies the summed token and
+    cost deltas per conversation in one transaction. When ``max_pending``
+    messages pile up, ``add`` waits for the background task to make room
+    before queueing, so callers slow down to the database's pace. Messages
+    are never queued by a call that then raises, so retrying ``add`` does
+    not write twice.
+
+    A batch that fails with a transient error (see ``is_transient_error``)
+    is kept and retried with exponential backoff, however long the outage
+    lasts. Any other error splits the batch in halves until the messages
+    that cannot be written are isolated; those are logged, counted and kept
+    in ``dead_letters`` until taken with ``drain_dead_letters``.
+
+    Messages that have not been flushed are lost if the process dies, so
+    call ``close`` on shutdown.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        max_batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        use_copy: bool = False,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.use_copy = use_copy
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._pending: List[NewMessage] = []
+        self._retries = 0
+        self.dead_letters: List[NewMessage] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Statistics
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of messages waiting to be flushed."""
+        return len(self._pending)
+
+    async def start(self) -> None:
+        """Start the background flush task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, message: NewMessage) -> None:
+        """Queue a message for writing."""
+        await self.add_many([message])
+
+    async def add_many(self, messages: Sequence[NewMessage]) -> None:
+        """Queue several messages, e.g. the user and assistant side of a turn."""
+        while len(self._pending) >= self.max_pending and not self._closed:
+            if self._task is None:
+                # Without a background task, flush here before queueing
+                await self.flush()
+                continue
+            self._drained.clear()
+            self._wakeup.set()
+            await self._drained.wait()
+
+        if self._closed:
+            raise RuntimeError("MessageWriteBuffer is closed")
+
+        self._pending.extend(messages)
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Write all pending messages. Returns the number written.
+
+        Raises the error of a transient failure after putting the unwritten
+        messages back ahead of messages queued meanwhile.
+        """
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.failed_flushes += 1
+                if is_transient_error(e):
+                    self._retries += 1
+                    self._pending[:0] = batch
+                    raise
+                logger.warning(
+                    f"Message flush failed ({e}), isolating failing messages"
+                )
+                written = await self._write_isolating(batch)
+            else:
+                written = len(batch)
+                self.flushed_messages += written
+
+            self._retries = 0
+            self.flushes += 1
+            self._drained.set()
+            return written
+
+    async def _write(self, batch: List[NewMessage]) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                await MessageRepository(session, use_copy=self.use_copy).bulk_insert(
+                    batch
+                )
+                await ConversationRepository(session).add_usage_many(sum_usage(batch))
+
+    async def _write_isolating(self, batch: List[NewMessage]) -> int:
+        """
+        Write ``batch`` by halves, dead-lettering single messages that still fail.
+
+        A transient error stops the split and puts the unwritten halves back
+        in the queue, since the failure is not caused by those messages.
+        """
+        written = 0
+        parts = deque([batch[: len(batch) // 2], batch[len(batch) // 2 :]])
+        while parts:
+            part = parts.popleft()
+            if not part:
+                continue
+            try:
+                await self._write(part)
+            except Exception as e:
+                if is_transient_error(e):
+                    self._retries += 1
+                    parts.appendleft(part)
+                    self._pending[:0] = [message for rest in parts for message in rest]
+                    raise
+                if len(part) > 1:
+                    parts.extendleft([part[len(part) // 2 :], part[: len(part) // 2]])
+                    continue
+                message = part[0]
+                logger.error(
+                    f"Moving message of conversation {message.conversation_id} "
+                    f"to the dead letter queue ({len(self.dead_letters) + 1} "
+                    f"held): {e}"
+                )
+                self.dead_letters.append(message)
+                self.dead_lettered += 1
+            else:
+                written += len(part)
+                self.flushed_messages += len(part)
+        return written
+
+    def drain_dead_letters(self) -> List[NewMessage]:
+        """Take the messages that could not be written, e.g. to store or replay."""
+        dead_letters, self.dead_letters = self.dead_letters, []
+        return dead_letters
+
+    def _backoff(self) -> float:
+        """Delay before retrying after ``_retries`` transient failures in a row."""
+        exponent = min(self._retries - 1, 16)
+        return min(self.retry_delay * 2**exponent, self.max_retry_delay)
+
+    async def _run(self) -> None:
+        while not self._closed:
+            # While backing off, only close cuts the wait short, not add
+            if self._retries:
+                event, timeout = self._closing, self._backoff()
+            else:
+                event, timeout = self._wakeup, self.flush_interval
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closed:
+                break
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(
+                    f"Message flush failed {self._retries} times in a row, "
+                    f"{len(self._pending)} messages pending, retrying in "
+                    f"{self._backoff():.1f}s: {e}"
+                )
+
+    async def close(self) -> None:
+        """
+        Stop the background task and flush what is left.
+
+        Raises if the last flush fails; the messages stay pending so ``close``
+        can be called again.
+        """
+        self._closed = True
+        self._closing.set()
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        self._drained.set()
+        await self.flush()
+
+    async def __aenter__(self) -> "MessageWriteBuffer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer statistics."""
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_messages": self.flushed_messages,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+            "dead_letters": len(self.dead_letters),
+        }
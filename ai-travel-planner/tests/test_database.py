@@ -288,8 +288,8 @@ class TestConversationORM:
             test_session.add(message)
         await test_session.commit()
         
-        # Test relationships
-        await test_session.refresh(conversation)
+        # Test relationships (messages are never lazy-loaded, load them explicitly)
+        await test_session.refresh(conversation, attribute_names=["messages"])
         assert len(conversation.messages) == 2
         assert conversation.messages[0].role == MessageRole.USER
         assert conversation.messages[1].role == MessageRole.ASSISTANT
@@ -0,0 +1,102 @@
+"""
+Read-replica routing and pool statistics tests.
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+
+from shared.database import Base, DatabaseRouter, UserORM
+from shared.database.config import create_instrumented_engine
+
+
+@pytest_asyncio.fixture
+async def router(tmp_path):
+    """Router over two SQLite files standing in for a primary and a replica."""
+    router = DatabaseRouter(
+        create_instrumented_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}", "primary"
+        ),
+        [
+            create_instrumented_engine(
+                f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", "replica-0"
+            )
+        ],
+    )
+    for engine in [router.primary, *router.replicas]:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    # Mark the replica so tests can tell which database answered
+    async with router.replicas[0].begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO users "
+                "(id, username, email, is_active, preferences, travel_history) "
+                "VALUES ('00000000000000000000000000000001', 'replica', "
+                "'replica@example.com', 1, '{}', '[]')"
+            )
+        )
+
+    yield router
+
+    await router.dispose()
+
+
+class TestSessionRouting:
+    """Test primary/replica session routing."""
+
+    @pytest.mark.asyncio
+    async def test_read_write_session_uses_primary(self, router):
+        """Test that read-write sessions read and write on the primary."""
+        async with router.sessionmaker()() as session:
+            session.add(UserORM(username="primary", email="primary@example.com"))
+            await session.commit()
+            assert await session.scalar(select(UserORM.username)) == "primary"
+
+    @pytest.mark.asyncio
+    async def test_read_only_session_uses_replica(self, router):
+        """Test that read-only sessions read from a replica."""
+        async with router.sessionmaker(read_only=True)() as session:
+            assert await session.scalar(select(UserORM.username)) == "replica"
+            assert not session.sync_session.pinned_to_primary
+
+    @pytest.mark.asyncio
+    async def test_reads_stay_on_primary_after_write(self, router):
+        """Test that a read-only session that writes keeps reading from the primary."""
+        async with router.sessionmaker(read_only=True)() as session:
+            session.add(UserORM(username="writer", email="writer@example.com"))
+            await session.flush()
+
+            assert session.sync_session.pinned_to_primary
+            assert await session.scalar(select(UserORM.username)) == "writer"
+            await session.commit()
+
+        async with router.sessionmaker()() as session:
+            assert await session.scalar(select(func.count()).select_from(UserORM)) == 1
+
+    @pytest.mark.asyncio
+    async def test_no_replicas_falls_back_to_primary(self, router):
+        """Test that read-only sessions use the primary when there are no replicas."""
+        primary_only = DatabaseRouter(router.primary)
+        async with primary_only.sessionmaker(read_only=True)() as session:
+            assert await session.scalar(select(func.count()).select_from(UserORM)) == 0
+
+
+class TestPoolStats:
+    """Test pool-level statistics."""
+
+    @pytest.mark.asyncio
+    async def test_checkout_stats(self, router):
+        """Test that checkouts, wait and connection age are reported per engine."""
+        async with router.sessionmaker(read_only=True)() as session:
+            await session.scalar(select(UserORM.username))
+
+        stats = router.pool_stats()
+
+        assert set(stats) == {"primary", "replica-0"}
+        replica = stats["replica-0"]
+        assert replica["checkouts"] >= 2
+        assert replica["connections"] == 1
+        assert replica["checkout_wait_max_ms"] >= replica["checkout_wait_avg_ms"] > 0
+        assert replica["connection_age_max_s"] > 0
+        assert replica["timeouts"] == 0
@@ -0,0 +1,290 @@
+"""
+Message partitioning and archival tests.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from shared.models.base import ConversationStatus, MessageRole
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateTable
+
+from shared.database import (
+    Base,
+    ConversationORM,
+    DatabaseRouter,
+    MessageArchiver,
+    MessageORM,
+    MessageRepository,
+    NewMessage,
+    ParquetMessageArchive,
+    UserORM,
+    ensure_message_partitions,
+)
+from shared.database.partitions import add_months, month_partitions
+
+pytest.importorskip("pyarrow")
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", echo=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ParquetMessageArchive(tmp_path / "archive")
+
+
+@pytest_asyncio.fixture
+async def closed_conversation(session_factory):
+    """A conversation with 30 messages, completed 60 days ago."""
+    async with session_factory() as session:
+        user = UserORM(username="archiver", email="archiver@example.com")
+        session.add(user)
+        await session.flush()
+        conversation = ConversationORM(user_id=user.id, title="Lisbon weekend")
+        session.add(conversation)
+        await session.flush()
+
+        start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        await MessageRepository(session).bulk_insert(
+            [
+                NewMessage(
+                    conversation_id=conversation.id,
+                    role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+                    content=f"第{i}轮：里斯本的电车线路",
+                    tokens_used=10,
+                    metadata={"turn": i},
+                    timestamp=start + timedelta(minutes=i),
+                )
+                for i in range(30)
+            ]
+        )
+        await session.execute(
+            update(ConversationORM)
+            .where(ConversationORM.id == conversation.id)
+            .values(
+                status=ConversationStatus.COMPLETED,
+                updated_at=datetime.now(timezone.utc) - timedelta(days=60),
+            )
+        )
+        await session.commit()
+        return conversation
+
+
+async def count_messages(session_factory, conversation_id):
+    async with session_factory() as session:
+        return await session.scalar(
+            select(func.count())
+            .select_from(MessageORM)
+            .where(MessageORM.conversation_id == conversation_id)
+        )
+
+
+async def conversation_status(session_factory, conversation_id):
+    async with session_factory() as session:
+        return await session.scalar(
+            select(ConversationORM.status).where(ConversationORM.id == conversation_id)
+        )
+
+
+class TestPartitions:
+    """Test monthly partition layout."""
+
+    def test_month_partitions(self):
+        """Test that partitions cover whole months across a year boundary."""
+        partitions = month_partitions(date(2024, 11, 15), date(2025, 1, 3))
+
+        assert [p.name for p in partitions] == [
+            "messages_y2024m11",
+            "messages_y2024m12",
+            "messages_y2025m01",
+        ]
+        assert partitions[1].lower == date(2024, 12, 1)
+        assert partitions[1].upper == date(2025, 1, 1)
+        assert (
+            "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')"
+            in partitions[2].create_sql()
+        )
+
+    def test_add_months(self):
+        """Test month arithmetic in both directions."""
+        assert add_months(date(2024, 12, 31), 1) == date(2025, 1, 1)
+        assert add_months(date(2024, 1, 15), -2) == date(2023, 11, 1)
+
+    def test_messages_table_is_partitioned_on_postgresql(self):
+        """Test that the messages DDL partitions by timestamp and keys on it."""
+        ddl = str(
+            CreateTable(MessageORM.__table__).compile(dialect=postgresql.dialect())
+        )
+
+        assert "PARTITION BY RANGE (timestamp)" in ddl
+        assert "PRIMARY KEY (id, timestamp)" in ddl
+
+    @pytest.mark.asyncio
+    async def test_ensure_partitions_is_noop_without_postgresql(self, engine):
+        """Test that partition maintenance skips other databases."""
+        async with engine.begin() as conn:
+            assert await ensure_message_partitions(conn) == []
+
+
+class TestMessageArchiver:
+    """Test moving closed conversations to the cold store and back."""
+
+    @pytest.mark.asyncio
+    async def test_archives_closed_conversation(
+        self, session_factory, archive, closed_conversation
+    ):
+        """Test that messages move to Parquet and the conversation is archived."""
+        archiver = MessageArchiver(
+            archive, session_factory, closed_after=timedelta(days=30)
+        )
+
+        assert await archiver.archive_all() == 1
+        assert await count_messages(session_factory, closed_conversation.id) == 0
+        assert (
+            await conversation_status(session_factory, closed_conversation.id)
+            == ConversationStatus.ARCHIVED
+        )
+        assert archive.path(closed_conversation.id).exists()
+        assert archiver.get_stats() == {
+            "archived_conversations": 1,
+            "archived_messages": 30,
+        }
+
+        archived = await archive.read(closed_conversation.id)
+        assert [m.metadata["turn"] for m in archived] == list(range(30))
+        assert archived[1].role == MessageRole.ASSISTANT
+        assert archived[0].content == "第0轮：里斯本的电车线路"
+
+    @pytest.mark.asyncio
+    async def test_skips_recent_and_open_conversations(
+        self, session_factory, archive, closed_conversation
+    ):
+        """Test that only conversations closed for long enough are archived."""
+        assert (
+            await MessageArchiver(
+                archive, session_factory, closed_after=timedelta(days=90)
+            ).archive_all()
+            == 0
+        )
+
+        async with session_factory() as session:
+            await session.execute(
+                update(ConversationORM)
+                .where(ConversationORM.id == closed_conversation.id)
+                .values(status=ConversationStatus.ACTIVE)
+            )
+            await session.commit()
+        assert (
+            await MessageArchiver(
+                archive, session_factory, closed_after=timedelta(0)
+            ).archive_all()
+            == 0
+        )
+        assert await count_messages(session_factory, closed_conversation.id) == 30
+
+    @pytest.mark.asyncio
+    async def test_history_rehydrates_archived_conversation(
+        self, session_factory, archive, closed_conversation
+    ):
+        """Test that reading an archived conversation restores it transparently."""
+        await MessageArchiver(archive, session_factory).archive_all()
+
+        async with session_factory() as session:
+            page = await MessageRepository(session, archive=archive).history(
+                closed_conversation.id, limit=10
+            )
+            await session.commit()
+
+        assert [m.content for m in page.items] == [
+            f"第{i}轮：里斯本的电车线路" for i in range(20, 30)
+        ]
+        assert page.has_more
+        assert await count_messages(session_factory, closed_conversation.id) == 30
+        assert (
+            await conversation_status(session_factory, closed_conversation.id)
+            == ConversationStatus.COMPLETED
+        )
+
+    @pytest.mark.asyncio
+    async def test_live_conversation_reads_stay_on_replica(
+        self, engine, archive, closed_conversation
+    ):
+        """Test that only archived conversations move reads to the primary."""
+        router = DatabaseRouter(engine, [engine])
+
+        async with router.sessionmaker(read_only=True)() as session:
+            page = await MessageRepository(session, archive=archive).history(
+                closed_conversation.id, limit=50
+            )
+            assert len(page.items) == 30
+            assert not session.sync_session.pinned_to_primary
+
+        await MessageArchiver(archive, router.sessionmaker()).archive_all()
+
+        async with router.sessionmaker(read_only=True)() as session:
+            page = await MessageRepository(session, archive=archive).history(
+                closed_conversation.id, limit=50
+            )
+            assert len(page.items) == 30
+            assert session.sync_session.pinned_to_primary
+            await session.commit()
+
+    @pytest.mark.asyncio
+    async def test_rehydrates_behind_newer_messages(
+        self, session_factory, archive, closed_conversation
+    ):
+        """Test that messages added after archival do not hide the archived ones."""
+        await MessageArchiver(archive, session_factory).archive_all()
+        async with session_factory() as session:
+            await MessageRepository(session).bulk_insert(
+                [
+                    NewMessage(
+                        conversation_id=closed_conversation.id,
+                        role=MessageRole.USER,
+                        content="还在吗？",
+                        tokens_used=10,
+                    )
+                ]
+            )
+            await session.commit()
+
+        async with session_factory() as session:
+            messages = await MessageRepository(
+                session, archive=archive
+            ).recent_within_tokens(closed_conversation.id, max_tokens=50)
+
+        assert [m.content for m in messages][-1] == "还在吗？"
+        assert len(messages) == 5
+
+    @pytest.mark.asyncio
+    async def test_without_archive_reads_only_hot_table(
+        self, session_factory, archive, closed_conversation
+    ):
+        """Test that repositories without an archive never restore."""
+        await MessageArchiver(archive, session_factory).archive_all()
+
+        async with session_factory() as session:
+            assert (
+                await MessageRepository(session).recent(closed_conversation.id, 10)
+                == []
+            )
+        assert (
+            await conversation_status(session_factory, closed_conversation.id)
+            == ConversationStatus.ARCHIVED
+        )
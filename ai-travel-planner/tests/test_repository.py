@@ -0,0 +1,442 @@
+"""
+Repository layer tests.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+from shared.models.base import MessageRole
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from shared.database import (
+    Base,
+    ConversationORM,
+    ConversationRepository,
+    MessageORM,
+    MessageRepository,
+    MessageWriteBuffer,
+    NewMessage,
+    TravelPlanORM,
+    TravelPlanRepository,
+    UserORM,
+    repository,
+)
+from shared.database.repository import decode_cursor, encode_cursor, json_array_contains
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Session factory on a file-backed SQLite database shared by all sessions."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", echo=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def conversation(session_factory):
+    """Create a conversation to attach messages to."""
+    async with session_factory() as session:
+        user = UserORM(username="writer", email="writer@example.com")
+        session.add(user)
+        await session.flush()
+        conversation = ConversationORM(user_id=user.id, title="Trip to Tokyo")
+        session.add(conversation)
+        await session.commit()
+        return conversation
+
+
+def make_messages(conversation_id, count, tokens=3, cost=0.01):
+    return [
+        NewMessage(
+            conversation_id=conversation_id,
+            role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=f"Message {i}",
+            tokens_used=tokens,
+            cost=cost,
+        )
+        for i in range(count)
+    ]
+
+
+async def count_messages(session_factory):
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(MessageORM))
+
+
+class TestMessageRepository:
+    """Test bulk message inserts."""
+
+    @pytest.mark.asyncio
+    async def test_bulk_insert_chunks(self, session_factory, conversation, monkeypatch):
+        """Test that large batches are split to stay under the bind parameter limit."""
+        monkeypatch.setattr(repository, "MAX_BIND_PARAMS", 90)
+        messages = make_messages(conversation.id, 25)
+
+        async with session_factory() as session:
+            async with session.begin():
+                assert await MessageRepository(session).bulk_insert(messages) == 25
+
+        assert await count_messages(session_factory) == 25
+
+        async with session_factory() as session:
+            result = await session.execute(
+                select(MessageORM.content)
+                .where(MessageORM.conversation_id == conversation.id)
+                .order_by(MessageORM.timestamp)
+            )
+            assert [row[0] for row in result] == [m.content for m in messages]
+
+
+class TestMessageHistory:
+    """Test keyset-paginated history queries."""
+
+    @pytest_asyncio.fixture
+    async def history(self, session_factory, conversation):
+        """Insert 100 messages, three per timestamp so pages must break ties by id."""
+        start = datetime.now(timezone.utc)
+        messages = make_messages(conversation.id, 100, tokens=10)
+        for i, message in enumerate(messages):
+            message.timestamp = start + timedelta(seconds=i // 3)
+
+        async with session_factory() as session:
+            async with session.begin():
+                await MessageRepository(session).bulk_insert(messages)
+        return sorted(messages, key=lambda m: (m.timestamp, m.id.hex))
+
+    @pytest.mark.asyncio
+    async def test_pages_cover_history(self, session_factory, conversation, history):
+        """Test that walking pages backwards returns every message exactly once."""
+        seen = []
+        cursor = None
+        async with session_factory() as session:
+            repo = MessageRepository(session)
+            while True:
+                page = await repo.history(conversation.id, limit=7, before=cursor)
+                assert len(page.items) <= 7
+                seen = [m.id for m in page.items] + seen
+                if not page.has_more:
+                    break
+                cursor = page.next_cursor
+
+        assert seen == [m.id for m in history]
+
+    @pytest.mark.asyncio
+    async def test_recent(self, session_factory, conversation, history):
+        """Test loading the last N turns in chronological order."""
+        async with session_factory() as session:
+            recent = await MessageRepository(session).recent(conversation.id, 5)
+
+        assert [m.id for m in recent] == [m.id for m in history[-5:]]
+
+    @pytest.mark.asyncio
+    async def test_recent_within_tokens(self, session_factory, conversation, history):
+        """Test that the token window keeps the newest messages that fit."""
+        async with session_factory() as session:
+            window = await MessageRepository(session).recent_within_tokens(
+                conversation.id, max_tokens=255, scan_batch=4
+            )
+
+        assert [m.id for m in window] == [m.id for m in history[-25:]]
+
+    def test_cursor_round_trip(self):
+        """Test cursor encoding and rejection of malformed cursors."""
+        timestamp = datetime.now(timezone.utc)
+        row_id = repository.uuid4()
+
+        assert decode_cursor(encode_cursor(timestamp, row_id)) == (timestamp, row_id)
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+
+class TestConversationRepository:
+    """Test conversation listing and atomic counter updates."""
+
+    @pytest.mark.asyncio
+    async def test_list_for_user(self, session_factory, conversation):
+        """Test keyset pagination of a user's conversations."""
+        start = datetime.now(timezone.utc)
+        async with session_factory() as session:
+            for i in range(4):
+                session.add(
+                    ConversationORM(
+                        user_id=conversation.user_id,
+                        title=f"Trip {i}",
+                        updated_at=start + timedelta(seconds=i % 2),
+                    )
+                )
+            await session.execute(
+                ConversationORM.__table__.update()
+                .where(ConversationORM.id == conversation.id)
+                .values(updated_at=start)
+            )
+            await session.commit()
+
+        async with session_factory() as session:
+            repo = ConversationRepository(session)
+            first = await repo.list_for_user(conversation.user_id, limit=3)
+            second = await repo.list_for_user(
+                conversation.user_id, limit=3, before=first.next_cursor
+            )
+
+        assert len(first.items) == 3 and first.has_more
+        assert len(second.items) == 2 and not second.has_more
+        ids = [c.id for c in first.items + second.items]
+        assert len(set(ids)) == 5
+
+    @pytest.mark.asyncio
+    async def test_concurrent_add_usage(self, session_factory, conversation):
+        """Test that concurrent increments are all applied."""
+
+        async def add_usage():
+            async with session_factory() as session:
+                async with session.begin():
+                    await ConversationRepository(session).add_usage(
+                        conversation.id, 10, 0.5
+                    )
+
+        await asyncio.gather(*(add_usage() for _ in range(10)))
+
+        async with session_factory() as session:
+            updated = await session.get(ConversationORM, conversation.id)
+            assert updated.total_tokens == 100
+            assert updated.total_cost == pytest.approx(5.0)
+
+
+class TestMessageWriteBuffer:
+    """Test the write-behind message buffer."""
+
+    @pytest.mark.asyncio
+    async def test_flush_on_close(self, session_factory, conversation):
+        """Test that pending messages and usage are written on close."""
+        async with MessageWriteBuffer(
+            session_factory, max_batch_size=10, flush_interval=60
+        ) as buffer:
+            for message in make_messages(conversation.id, 25):
+                await buffer.add(message)
+                await asyncio.sleep(0)
+
+        assert buffer.pending == 0
+        assert buffer.flushed_messages == 25
+        assert await count_messages(session_factory) == 25
+
+        async with session_factory() as session:
+            updated = await session.get(ConversationORM, conversation.id)
+            assert updated.total_tokens == 75
+            assert updated.total_cost == pytest.approx(0.25)
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_messages(
+        self, session_factory, conversation, monkeypatch
+    ):
+        """Test that a transient failure keeps the batch for the next attempt."""
+        buffer = MessageWriteBuffer(session_factory)
+        await buffer.add_many(make_messages(conversation.id, 4))
+
+        async def fail(self, messages):
+            raise OperationalError("INSERT", {}, Exception("database unavailable"))
+
+        with monkeypatch.context() as patch:
+            patch.setattr(MessageRepository, "bulk_insert", fail)
+            with pytest.raises(OperationalError):
+                await buffer.flush()
+
+        assert buffer.pending == 4
+        assert buffer.failed_flushes == 1
+
+        assert await buffer.flush() == 4
+        assert await count_messages(session_factory) == 4
+
+    @pytest.mark.asyncio
+    async def test_failing_message_is_dead_lettered(
+        self, session_factory, conversation, monkeypatch
+    ):
+        """Test that a message that can never be written does not block the others."""
+        buffer = MessageWriteBuffer(session_factory)
+        messages = make_messages(conversation.id, 5)
+        await buffer.add_many(messages)
+        bulk_insert = MessageRepository.bulk_insert
+
+        async def reject_message_3(self, batch):
+            if any(message.content == "Message 3" for message in batch):
+                raise IntegrityError("INSERT", {}, Exception("foreign key violation"))
+            return await bulk_insert(self, batch)
+
+        monkeypatch.setattr(MessageRepository, "bulk_insert", reject_message_3)
+        assert await buffer.flush() == 4
+
+        assert buffer.pending == 0
+        assert list(buffer.dead_letters) == [messages[3]]
+        assert await count_messages(session_factory) == 4
+
+        # The rejected message's usage is not counted
+        async with session_factory() as session:
+            updated = await session.get(ConversationORM, conversation.id)
+            assert updated.total_tokens == 12
+
+        await buffer.add_many(make_messages(conversation.id, 2))
+        assert await buffer.flush() == 2
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_retried_with_backoff(
+        self, session_factory, conversation, monkeypatch
+    ):
+        """Test that transient failures are retried until they pass, never dropped."""
+        buffer = MessageWriteBuffer(
+            session_factory, flush_interval=0.01, retry_delay=0.01
+        )
+        await buffer.add_many(make_messages(conversation.id, 2))
+        bulk_insert = MessageRepository.bulk_insert
+        failures = 0
+
+        async def fail_8_times(self, messages):
+            nonlocal failures
+            if failures < 8:
+                failures += 1
+                raise OperationalError("INSERT", {}, Exception("lock timeout"))
+            return await bulk_insert(self, messages)
+
+        monkeypatch.setattr(MessageRepository, "bulk_insert", fail_8_times)
+        async with buffer:
+            while buffer.pending:
+                await asyncio.sleep(0.01)
+
+        assert buffer.failed_flushes == 8
+        assert buffer.dead_lettered == 0
+        assert await count_messages(session_factory) == 2
+
+    def test_backoff_is_capped(self, session_factory):
+        """Test that the retry delay grows exponentially up to max_retry_delay."""
+        buffer = MessageWriteBuffer(
+            session_factory, retry_delay=0.5, max_retry_delay=30
+        )
+
+        buffer._retries = 3
+        assert buffer._backoff() == 2.0
+        buffer._retries = 5000
+        assert buffer._backoff() == 30
+
+    @pytest.mark.asyncio
+    async def test_add_waits_for_room_instead_of_raising(
+        self, session_factory, conversation, monkeypatch
+    ):
+        """Test that a full buffer makes add wait without queueing or raising."""
+        buffer = MessageWriteBuffer(
+            session_factory, max_pending=2, flush_interval=60, retry_delay=0.05
+        )
+        bulk_insert = MessageRepository.bulk_insert
+        failures = 0
+
+        async def fail_once(self, messages):
+            nonlocal failures
+            if failures < 1:
+                failures += 1
+                raise OperationalError("INSERT", {}, Exception("database unavailable"))
+            return await bulk_insert(self, messages)
+
+        monkeypatch.setattr(MessageRepository, "bulk_insert", fail_once)
+        async with buffer:
+            await buffer.add_many(make_messages(conversation.id, 2))
+            await buffer.add_many(make_messages(conversation.id, 1))
+
+        assert buffer.failed_flushes == 1
+        assert await count_messages(session_factory) == 3
+
+    @pytest.mark.asyncio
+    async def test_dead_letters_are_kept_until_drained(
+        self, session_factory, conversation, monkeypatch
+    ):
+        """Test that dead letters are not bounded and are reported in the stats."""
+        buffer = MessageWriteBuffer(session_factory, max_pending=2)
+        messages = make_messages(conversation.id, 5)
+
+        async def reject(self, batch):
+            raise IntegrityError("INSERT", {}, Exception("foreign key violation"))
+
+        monkeypatch.setattr(MessageRepository, "bulk_insert", reject)
+        await buffer.add_many(messages)
+        assert await buffer.flush() == 0
+
+        assert buffer.get_stats()["dead_letters"] == 5
+        assert buffer.drain_dead_letters() == messages
+        assert buffer.dead_letters == []
+
+
+class TestTravelPlanRepository:
+    """Test filters over travel plan JSON contents."""
+
+    @pytest_asyncio.fixture
+    async def plans(self, session_factory, conversation):
+        plans = [
+            ("Japan", "Tokyo", ["Tokyo", "Kyoto"], "Tokyo Hotel", "Tokyo Tower"),
+            ("France", "Paris", ["Paris"], "Hotel Lutetia", "Louvre"),
+            ("Kansai", "Osaka", ["Osaka", "Kyoto"], "Hotel Lutetia", "Osaka Castle"),
+        ]
+        async with session_factory() as session:
+            for i, (title, destination, destinations, hotel, location) in enumerate(
+                plans
+            ):
+                session.add(
+                    TravelPlanORM(
+                        user_id=conversation.user_id,
+                        title=title,
+                        destination=destination,
+                        destinations=destinations,
+                        start_date=date(2024, 7, i + 1),
+                        end_date=date(2024, 7, i + 5),
+                        duration_days=5,
+                        budget=Decimal("3000.00"),
+                        travel_style="couple",
+                        hotels=[{"name": hotel, "star_rating": 4}],
+                        itinerary=[{"day": 1, "time": "09:00", "location": location}],
+                    )
+                )
+            await session.commit()
+
+    @pytest.mark.asyncio
+    async def test_find_by_city(self, session_factory, plans):
+        """Test matching the main destination or any destination in the list."""
+        async with session_factory() as session:
+            repo = TravelPlanRepository(session)
+            assert [p.title for p in await repo.find_by_city("Kyoto")] == [
+                "Kansai",
+                "Japan",
+            ]
+            assert [p.title for p in await repo.find_by_city("Paris")] == ["France"]
+
+    @pytest.mark.asyncio
+    async def test_find_by_hotel_and_itinerary(self, session_factory, plans):
+        """Test containment filters on arrays of objects."""
+        async with session_factory() as session:
+            repo = TravelPlanRepository(session)
+            assert [p.title for p in await repo.find_by_hotel("Hotel Lutetia")] == [
+                "Kansai",
+                "France",
+            ]
+            assert [
+                p.title for p in await repo.find_by_itinerary(day=1, location="Louvre")
+            ] == ["France"]
+            assert await repo.find_by_itinerary(day=2, location="Louvre") == []
+
+    def test_postgresql_uses_containment(self):
+        """Test that PostgreSQL filters use @> on the bare column, as GIN needs."""
+        condition = json_array_contains(
+            TravelPlanORM.hotels, {"name": "Tokyo Hotel"}, "postgresql"
+        )
+        sql = str(
+            select(TravelPlanORM.id)
+            .where(condition)
+            .compile(dialect=postgresql.dialect())
+        )
+
+        assert "travel_plans.hotels @>" in sql
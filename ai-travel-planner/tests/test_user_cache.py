@@ -0,0 +1,245 @@
+"""
+User context cache tests.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from shared.models.base import PlanStatus
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from shared.database import (
+    Base,
+    LocalSharedCache,
+    TravelPlanORM,
+    UserContextCache,
+    UserORM,
+)
+from shared.database.cache import LRUCache
+
+
+class CountingSessionFactory:
+    """Session factory that counts opened sessions."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.sessions = 0
+
+    def __call__(self):
+        self.sessions += 1
+        return self.factory()
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Session factory on a file-backed SQLite database shared by all sessions."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", echo=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def user(session_factory):
+    """Create a user with preferences and an active travel plan."""
+    async with session_factory() as session:
+        user = UserORM(
+            username="traveler",
+            email="traveler@example.com",
+            preferences={"budget": "mid", "cuisine": ["ramen"]},
+            travel_history=[{"city": "Osaka", "year": 2023}],
+        )
+        session.add(user)
+        await session.flush()
+        session.add(
+            TravelPlanORM(
+                user_id=user.id,
+                title="Kyoto in autumn",
+                destination="Kyoto",
+                destinations=["Kyoto"],
+                start_date=date(2024, 11, 1),
+                end_date=date(2024, 11, 5),
+                duration_days=5,
+                budget=Decimal("3000.00"),
+                travel_style="couple",
+                status=PlanStatus.PLANNING,
+            )
+        )
+        await session.commit()
+        return user
+
+
+async def touch_user(session_factory, user_id, **values):
+    """Update a user with an explicit, later updated_at."""
+    async with session_factory() as session:
+        await session.execute(
+            update(UserORM)
+            .where(UserORM.id == user_id)
+            .values(
+                updated_at=datetime.now(timezone.utc) + timedelta(seconds=1), **values
+            )
+        )
+        await session.commit()
+
+
+class TestLRUCache:
+    """Test the in-process LRU."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a")[0] == 1
+        assert cache.get("c")[0] == 3
+
+    def test_expires_after_ttl(self):
+        """Test that entries past their TTL are dropped."""
+        cache = LRUCache(max_entries=2, ttl=0)
+        cache.set("a", 1, stored_at=0.0)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestUserContextCache:
+    """Test read-through loading, revalidation and single-flight."""
+
+    @pytest.mark.asyncio
+    async def test_loads_once_then_hits(self, session_factory, user):
+        """Test that a loaded context is served from memory."""
+        factory = CountingSessionFactory(session_factory)
+        cache = UserContextCache(factory, revalidate_after=60)
+
+        context = await cache.get(user.id)
+        assert context.preferences == {"budget": "mid", "cuisine": ["ramen"]}
+        assert context.travel_history == [{"city": "Osaka", "year": 2023}]
+        assert context.active_plan["title"] == "Kyoto in autumn"
+        assert context.active_plan["budget"] == "3000.00"
+        assert context.active_plan["status"] == "planning"
+
+        assert await cache.get(user.id) is context
+        assert factory.sessions == 1
+        assert cache.get_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_user(self, session_factory):
+        """Test that an unknown user yields None."""
+        cache = UserContextCache(session_factory)
+        assert await cache.get(uuid4()) is None
+
+    @pytest.mark.asyncio
+    async def test_revalidation_keeps_unchanged_entry(self, session_factory, user):
+        """Test that an unchanged entry is kept after the version check."""
+        cache = UserContextCache(session_factory, revalidate_after=0)
+        context = await cache.get(user.id)
+
+        assert await cache.get(user.id) is context
+        stats = cache.get_stats()
+        assert stats["revalidations"] == 1
+        assert stats["loads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_reloads_when_updated_at_changes(self, session_factory, user):
+        """Test that a newer updated_at triggers a reload."""
+        cache = UserContextCache(session_factory, revalidate_after=0)
+        await cache.get(user.id)
+
+        await touch_user(session_factory, user.id, preferences={"budget": "luxury"})
+
+        context = await cache.get(user.id)
+        assert context.preferences == {"budget": "luxury"}
+        assert cache.get_stats()["stale_reloads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_reloads_when_active_plan_is_removed(self, session_factory, user):
+        """Test that losing the active plan is noticed."""
+        cache = UserContextCache(session_factory, revalidate_after=0)
+        assert (await cache.get(user.id)).active_plan is not None
+
+        async with session_factory() as session:
+            await session.execute(
+                delete(TravelPlanORM).where(TravelPlanORM.user_id == user.id)
+            )
+            await session.commit()
+
+        assert (await cache.get(user.id)).active_plan is None
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self, session_factory, user):
+        """Test that invalidate forces a reload."""
+        shared = LocalSharedCache()
+        cache = UserContextCache(session_factory, revalidate_after=60, shared=shared)
+        await cache.get(user.id)
+
+        await touch_user(session_factory, user.id, preferences={"budget": "low"})
+        await cache.invalidate(user.id)
+
+        assert await shared.get(cache._key(user.id)) is None
+        assert (await cache.get(user.id)).preferences == {"budget": "low"}
+        assert cache.get_stats()["loads"] == 2
+
+    @pytest.mark.asyncio
+    async def test_shared_tier_is_used_by_other_processes(self, session_factory, user):
+        """Test that a second cache sharing the tier skips the full load."""
+        shared = LocalSharedCache()
+        await UserContextCache(session_factory, shared=shared).get(user.id)
+
+        other = UserContextCache(session_factory, shared=shared)
+        context = await other.get(user.id)
+
+        assert context.active_plan["destination"] == "Kyoto"
+        stats = other.get_stats()
+        assert stats["shared_hits"] == 1
+        assert stats["loads"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stale_shared_entry_is_reloaded(self, session_factory, user):
+        """Test that a shared entry older than the database is ignored."""
+        shared = LocalSharedCache()
+        await UserContextCache(session_factory, shared=shared).get(user.id)
+        await touch_user(session_factory, user.id, travel_history=[])
+
+        other = UserContextCache(session_factory, shared=shared)
+        assert (await other.get(user.id)).travel_history == []
+        assert other.get_stats()["loads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_load(self, session_factory, user):
+        """Test that concurrent misses for one user run a single load."""
+        factory = CountingSessionFactory(session_factory)
+        cache = UserContextCache(factory)
+
+        contexts = await asyncio.gather(*(cache.get(user.id) for _ in range(20)))
+
+        assert all(context is contexts[0] for context in contexts)
+        assert factory.sessions == 1
+        stats = cache.get_stats()
+        assert stats["loads"] == 1
+        assert stats["coalesced"] == 19
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_load(self, session_factory, user):
+        """Test that cancelling one caller leaves the shared load running."""
+        cache = UserContextCache(session_factory)
+
+        first = asyncio.ensure_future(cache.get(user.id))
+        second = asyncio.ensure_future(cache.get(user.id))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        context = await second
+        assert context.user_id == str(user.id)
+        assert cache.get_stats()["loads"] == 1
@@ -0,0 +1,175 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from ollama import Client
+
+
+@dataclass
+class EmbeddingProgress:
+    """Progress of one BatchEmbedder.embed call, counted in input texts."""
+    total: int
+    done: int
+    cached: int
+    duplicates: int
+    requests: int
+    elapsed: float
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class EmbeddingCache:
+    """Persistent embedding cache in a SQLite file, keyed by model and content hash.
+
+    Vectors are stored as float64 arrays, so cached embeddings are identical
+    to freshly computed ones. Use ":memory:" for a cache that lives only as
+    long as the process.
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite"):
+        # Streamlit reruns the script on different threads, so share one
+        # connection and serialise access with a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, content_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, content_hash))"
+            )
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND content_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                )
+                for content_hash, blob in rows:
+                    found[content_hash] = array("d", blob).tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector) VALUES (?, ?, ?)",
+                [(model, key, array("d", vector).tobytes()) for key, vector in items.items()],
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class BatchEmbedder:
+    """Embeds texts through Ollama's batch /api/embed endpoint.
+
+    Identical texts are embedded once, texts already in the cache are not
+    sent at all, and the rest go out in batches of `batch_size`. Requests
+    run on one thread pool per embedder, so at most `max_concurrency` are
+    in flight even when several threads call `embed` at once (as the
+    ingestion pipeline's writers do).
+
+    Args:
+        model_name (str): The Ollama embedding model.
+        batch_size (int): Texts per request.
+        max_concurrency (int): Maximum concurrent requests.
+        cache (EmbeddingCache): Persistent cache, or None to disable caching.
+        host (str): Ollama server URL; defaults to OLLAMA_HOST or localhost.
+        progress_callback: Called with an EmbeddingProgress after each batch.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "snowflake-arctic-embed",
+        batch_size: int = 32,
+        max_concurrency: int = 4,
+        cache: Optional[EmbeddingCache] = None,
+        host: Optional[str] = None,
+        progress_callback: Optional[Callable[[EmbeddingProgress], None]] = None,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.progress_callback = progress_callback
+        self.client = Client(host=host)
+        self.last_progress: Optional[EmbeddingProgress] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embed(model=self.model_name, input=texts)
+        embeddings = response["embeddings"]
+        if len(embeddings) != len(texts):
+            raise RuntimeError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return [list(vector) for vector in embeddings]
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed texts, returning one vector per input text in input order."""
+        start = time.perf_counter()
+        keys = [EmbeddingCache.key(text) for text in texts]
+        counts = Counter(keys)
+        unique: Dict[str, str] = dict(zip(keys, texts))
+        vectors = self.cache.get_many(self.model_name, list(unique)) if self.cache is not None else {}
+
+        missing = [key for key in unique if key not in vectors]
+        progress = EmbeddingProgress(
+            total=len(texts),
+            done=sum(counts[key] for key in vectors),
+            cached=sum(counts[key] for key in vectors),
+            duplicates=len(texts) - len(unique),
+            requests=0,
+            elapsed=0.0,
+        )
+        self._report(progress, start)
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        futures = {
+            self._executor.submit(self._embed_batch, [unique[key] for key in batch]): batch
+            for batch in batches
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                batch_vectors = dict(zip(batch, future.result()))
+                vectors.update(batch_vectors)
+                if self.cache is not None:
+                    self.cache.put_many(self.model_name, batch_vectors)
+                progress.requests += 1
+                progress.done += sum(counts[key] for key in batch)
+                self._report(progress, start)
+        finally:
+            # Don't leave this call's queued batches ahead of other callers
+            for future in futures:
+                future.cancel()
+
+        return [vectors[key] for key in keys]
+
+    def close(self) -> None:
+        """Wait for in-flight requests and stop the request threads."""
+        self._executor.shutdown()
+
+    def _report(self, progress: EmbeddingProgress, start: float) -> None:
+        progress.elapsed = time.perf_counter() - start
+        self.last_progress = progress
+        if self.progress_callback:
+            self.progress_callback(progress)
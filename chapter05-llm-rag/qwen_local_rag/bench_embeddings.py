@@ -0,0 +1,127 @@
+"""Benchmark document embedding against a local stub Ollama server.
+
+The stub serves /api/embed with a fixed per-request latency plus a
+per-text cost, roughly like a local Ollama instance, and returns
+deterministic vectors. It compares:
+
+  serial        one request per chunk (the previous embed_documents)
+  batched       BatchEmbedder, cold cache
+  batched_warm  the same chunks again, all served from the cache
+
+Usage:
+    python bench_embeddings.py --pages 300 --batch-size 32 --concurrency 4
+"""
+import argparse
+import hashlib
+import json
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ollama import Client
+
+from batch_embedder import BatchEmbedder, EmbeddingCache
+
+
+def make_handler(request_latency: float, per_text_latency: float, dimensions: int, workers: int):
+    # Models process a limited number of requests at once
+    slots = threading.Semaphore(workers)
+
+    class StubEmbedHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/api/embed":
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            with slots:
+                time.sleep(request_latency + per_text_latency * len(texts))
+            embeddings = []
+            for text in texts:
+                rng = random.Random(hashlib.sha256(text.encode()).digest())
+                embeddings.append([rng.uniform(-1, 1) for _ in range(dimensions)])
+            payload = json.dumps({"model": body["model"], "embeddings": embeddings}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubEmbedHandler
+
+
+def make_chunks(pages: int, chunks_per_page: int) -> list:
+    """PDF-like chunks; repeated headers and boilerplate produce duplicates."""
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(5000)]
+    chunks = []
+    for page in range(pages):
+        chunks.append("Company Confidential · Annual Report 2024 · All rights reserved")
+        for _ in range(chunks_per_page - 1):
+            chunks.append(" ".join(rng.choice(words) for _ in range(150)))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--chunks-per-page", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--request-latency-ms", type=float, default=20.0)
+    parser.add_argument("--per-text-latency-ms", type=float, default=2.0)
+    parser.add_argument("--server-workers", type=int, default=4)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(
+        args.request_latency_ms / 1000, args.per_text_latency_ms / 1000, args.dimensions, args.server_workers
+    ))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+
+    chunks = make_chunks(args.pages, args.chunks_per_page)
+    print(f"{len(chunks)} chunks ({len(set(chunks))} unique) from {args.pages} pages\n")
+
+    results = []
+    client = Client(host=host)
+    start = time.perf_counter()
+    serial = [client.embed(model="stub", input=chunk)["embeddings"][0] for chunk in chunks]
+    results.append(("serial", time.perf_counter() - start, len(chunks), 0))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = EmbeddingCache(str(Path(tmpdir) / "cache.sqlite"))
+        embedder = BatchEmbedder(
+            model_name="stub",
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency,
+            cache=cache,
+            host=host,
+        )
+        for name in ("batched", "batched_warm"):
+            start = time.perf_counter()
+            vectors = embedder.embed(chunks)
+            elapsed = time.perf_counter() - start
+            assert vectors == serial, "batched embeddings differ from serial ones"
+            results.append((name, elapsed, embedder.last_progress.requests, embedder.last_progress.cached))
+        embedder.close()
+        cache.close()
+    server.shutdown()
+
+    baseline = results[0][1]
+    print(f"{'mode':<14}{'seconds':>10}{'chunks/s':>12}{'requests':>10}{'cached':>8}{'speedup':>9}")
+    for name, elapsed, requests, cached in results:
+        print(
+            f"{name:<14}{elapsed:>10.2f}{len(chunks) / elapsed:>12.1f}"
+            f"{requests:>10}{cached:>8}{baseline / elapsed:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
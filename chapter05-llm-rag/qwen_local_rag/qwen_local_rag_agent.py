@@ -1,36 +1,75 @@
+import atexit
 import os
+import sys
 import tempfile
 from datetime import datetime
-from typing import List
+from pathlib import Path
+from typing import Callable, List, Optional
 import streamlit as st
-import bs4
 from agno.agent import Agent
 from agno.models.ollama import Ollama
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams
 from langchain_core.embeddings import Embeddings
 from agno.tools.exa import ExaTools
-from agno.embedder.ollama import OllamaEmbedder
+from batch_embedder import BatchEmbedder, EmbeddingCache, EmbeddingProgress
+
+# The ingestion pipeline is shared with the other chapter05 apps
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rag_ingestion import IngestionPipeline, IngestionStats, PdfSource, WebSource
 
 
 class OllamaEmbedderr(Embeddings):
-    def __init__(self, model_name="snowflake-arctic-embed"):
+    def __init__(
+        self,
+        model_name="snowflake-arctic-embed",
+        batch_size: int = 32,
+        max_concurrency: int = 4,
+        cache_path: str = "embedding_cache.sqlite",
+        progress_callback: Optional[Callable[[EmbeddingProgress], None]] = None,
+    ):
         """
         Initialize the OllamaEmbedderr with a specific model.
 
         Args:
             model_name (str): The name of the model to use for embedding.
+            batch_size (int): Chunks sent per embedding request.
+            max_concurrency (int): Maximum embedding requests in flight.
+            cache_path (str): SQLite file caching embeddings by model and content hash.
+            progress_callback: Called with an EmbeddingProgress after each batch.
         """
-        self.embedder = OllamaEmbedder(id=model_name, dimensions=1024)
+        self.cache = EmbeddingCache(cache_path)
+        self.embedder = BatchEmbedder(
+            model_name=model_name,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            cache=self.cache,
+            progress_callback=progress_callback,
+        )
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return [self.embed_query(text) for text in texts]
+        return self.embedder.embed(texts)
 
     def embed_query(self, text: str) -> List[float]:
-        return self.embedder.get_embedding(text)
+        return self.embedder.embed([text])[0]
+
+    def close(self) -> None:
+        """Stop the embedding request threads and close the cache connection."""
+        self.embedder.close()
+        self.cache.close()
+
+
+@st.cache_resource
+def get_embedder() -> OllamaEmbedderr:
+    """Return the embedder shared by all sessions and reruns of this app.
+
+    Its request threads and SQLite connection live as long as the server
+    process and are released when it exits.
+    """
+    embedder = OllamaEmbedderr()
+    atexit.register(embedder.close)
+    return embedder
 
 
 # Constants
@@ -147,66 +186,40 @@ def init_qdrant() -> QdrantClient | None:
 
 
 # Document Processing Functions
-def process_pdf(file) -> List:
-    """Process PDF file and add source metadata."""
+def process_pdf(file) -> PdfSource | None:
+    """Save an uploaded PDF to a temporary file and describe it as an ingestion source."""
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
             tmp_file.write(file.getvalue())
-            loader = PyPDFLoader(tmp_file.name)
-            documents = loader.load()
-            
-            # Add source metadata
-            for doc in documents:
-                doc.metadata.update({
-                    "source_type": "pdf",
-                    "file_name": file.name,
-                    "timestamp": datetime.now().isoformat()
-                })
-                
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            return text_splitter.split_documents(documents)
+        return PdfSource(tmp_file.name, name=file.name, metadata={
+            "source_type": "pdf",
+            "file_name": file.name,
+            "timestamp": datetime.now().isoformat()
+        })
     except Exception as e:
         st.error(f"📄 PDF processing error: {str(e)}")
-        return []
+        return None
 
 
-def process_web(url: str) -> List:
-    """Process web URL and add source metadata."""
-    try:
-        loader = WebBaseLoader(
-            web_paths=(url,),
-            bs_kwargs=dict(
-                parse_only=bs4.SoupStrainer(
-                    class_=("post-content", "post-title", "post-header", "content", "main")
-                )
-            )
-        )
-        documents = loader.load()
-        
-        # Add source metadata
-        for doc in documents:
-            doc.metadata.update({
-                "source_type": "url",
-                "url": url,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        return text_splitter.split_documents(documents)
-    except Exception as e:
-        st.error(f"🌐 Web processing error: {str(e)}")
-        return []
+def process_web(url: str) -> WebSource:
+    """Describe a web URL as an ingestion source."""
+    return WebSource(url, metadata={
+        "source_type": "url",
+        "url": url,
+        "timestamp": datetime.now().isoformat()
+    })
 
 
 # Vector Store Management
-def create_vector_store(client, texts):
-    """Create and initialize vector store with documents."""
+def create_vector_store(client, sources):
+    """Create and initialize vector store, streaming the sources into it.
+
+    Returns the vector store and the names of the sources that were fully
+    stored, so the caller marks only those as processed and retries the
+    rest. Chunk ids are deterministic, so a retried source overwrites its
+    partly stored chunks instead of duplicating them. The vector store is
+    None when nothing was stored.
+    """
     try:
         # Create collection if needed
         try:
@@ -226,18 +239,46 @@ def create_vector_store(client, texts):
         vector_store = QdrantVectorStore(
             client=client,
             collection_name=COLLECTION_NAME,
-            embedding=OllamaEmbedderr()
+            embedding=get_embedder()
         )
-        
-        # Add documents
-        with st.spinner('📤 Uploading documents to Qdrant...'):
-            vector_store.add_documents(texts)
-            st.success("✅ Documents stored successfully!")
-            return vector_store
+
+        # Show ingestion progress, throughput and backpressure
+        progress_bar = st.progress(0.0, text="📤 Ingesting documents...")
+
+        def show_progress(stats: IngestionStats):
+            progress_bar.progress(
+                stats.pages_done / stats.pages_total if stats.pages_total else 1.0,
+                text=(
+                    f"📤 {stats.pages_done}/{stats.pages_total} pages · "
+                    f"{stats.chunks_written}/{stats.chunks} chunks stored · "
+                    f"{stats.chunks_per_second:.1f} chunks/s · waiting on {stats.bottleneck}"
+                )
+            )
+
+        # Parse in a process pool, embed and upsert in batches of 128 chunks
+        pipeline = IngestionPipeline(vector_store, batch_size=128, progress_callback=show_progress)
+        try:
+            stats = pipeline.run(sources)
+        finally:
+            for source in sources:
+                if isinstance(source, PdfSource):
+                    os.unlink(source.path)
+
+        for error in stats.errors:
+            st.warning(f"⚠️ Skipped: {error}")
+        if stats.failed_sources:
+            st.error(f"🔴 Could not ingest {', '.join(stats.failed_sources)}, please try again")
+        if stats.chunks_written == 0:
+            return None, []
+        st.success(
+            f"✅ Stored {stats.chunks_written} chunks from {stats.pages_done} pages "
+            f"in {stats.elapsed:.1f}s ({stats.chunks_per_second:.1f} chunks/s)"
+        )
+        return vector_store, stats.succeeded_sources
             
     except Exception as e:
         st.error(f"🔴 Vector store error: {str(e)}")
-        return None
+        return None, []
 
 def get_web_search_agent() -> Agent:
     """Initialize a web search agent."""
@@ -325,28 +366,29 @@ if st.session_state.rag_enabled:
 
             if uploaded_files:
                 st.write(f"Processing {len(uploaded_files)} PDF file(s)...")
-                all_texts = []
+                all_sources = []
                 for file in uploaded_files:
                     if file.name not in st.session_state.processed_documents:
-                        with st.spinner(f"Processing {file.name}... "): 
-                            texts = process_pdf(file)
-                            if texts: 
-                                all_texts.extend(texts)
-                                st.session_state.processed_documents.append(file.name)
+                        source = process_pdf(file)
+                        if source:
+                            all_sources.append(source)
                     else:
                         st.write(f"📄 {file.name} already processed.")
                 
-                if all_texts:
+                if all_sources:
                     with st.spinner("Creating vector store..."):
-                        st.session_state.vector_store = create_vector_store(qdrant_client, all_texts)
+                        vector_store, stored = create_vector_store(qdrant_client, all_sources)
+                        if vector_store:
+                            st.session_state.vector_store = vector_store
+                            st.session_state.processed_documents.extend(stored)
 
             if url_input:
                 if url_input not in st.session_state.processed_documents:
                     with st.spinner(f"Scraping and processing {url_input}..."):
-                        texts = process_web(url_input)
-                        if texts:
-                            st.session_state.vector_store = create_vector_store(qdrant_client, texts)
-                            st.session_state.processed_documents.append(url_input)
+                        vector_store, stored = create_vector_store(qdrant_client, [process_web(url_input)])
+                        if vector_store:
+                            st.session_state.vector_store = vector_store
+                            st.session_state.processed_documents.extend(stored)
                 else:
                     st.write(f"🔗 {url_input} already processed.")
                     
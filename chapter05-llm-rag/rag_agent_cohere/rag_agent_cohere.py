@@ -37,7 +37,7 @@ RAG Agent with Cohere 智能检索增强生成系统
     - 嵌入模型：Cohere embed-english-v3.0 (文本向量化)
     - RAG 框架：LangChain (检索增强生成)
     - 智能体编排：LangGraph (复杂任务流程管理)
-    - 文档处理：PyPDFLoader (PDF 解析)
+    - 文档处理：pypdf + rag_ingestion (进程池流式解析、分批向量化写入)
     - 网络搜索：DuckDuckGo Search (外部信息补充)
 
 作者：AI-BOX 团队
@@ -46,9 +46,9 @@ RAG Agent with Cohere 智能检索增强生成系统
 """
 
 import os
+import sys
+from pathlib import Path
 import streamlit as st
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_cohere import CohereEmbeddings, ChatCohere
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
@@ -65,6 +65,10 @@ from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from time import sleep
 from tenacity import retry, wait_exponential, stop_after_attempt
 
+# 共享的文档摄取流水线位于 chapter05-llm-rag/rag_ingestion
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rag_ingestion import IngestionPipeline, IngestionStats, PdfSource
+
 
 def init_session_state():
     """
@@ -190,62 +194,48 @@ client = init_qdrant()
 
 def process_document(file):
     """
-    处理上传的 PDF 文档
+    将上传的 PDF 文档转换为摄取源
     
     功能：
         - 将上传的文件保存为临时文件
-        - 使用 PyPDFLoader 解析 PDF 内容
-        - 使用 RecursiveCharacterTextSplitter 进行文本分块
-        - 清理临时文件
+        - 返回 PdfSource，由摄取流水线逐页解析、分块并写入向量库
     
     参数：
         file: Streamlit 上传的文件对象
     
     返回：
-        list: 分块后的文档列表，每个元素包含文本内容和元数据
+        PdfSource: 指向临时文件的摄取源，以文件名命名，失败时返回 None
     """
     try:
         # 创建临时文件保存上传的 PDF
         with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
             tmp_file.write(file.getvalue())
-            tmp_path = tmp_file.name
-            
-        # 使用 LangChain 的 PDF 加载器解析文档
-        loader = PyPDFLoader(tmp_path)
-        documents = loader.load()
-        
-        # 文本分割器配置
-        # chunk_size=1000: 每个文本块最大长度
-        # chunk_overlap=200: 相邻文本块的重叠长度，保证上下文连续性
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
-        
-        # 清理临时文件
-        os.unlink(tmp_path)
-        
-        return texts
+        return PdfSource(tmp_file.name, name=file.name, metadata={"file_name": file.name})
     except Exception as e:
         st.error(f"Error processing document: {e}")
-        return []
+        return None
 
 # Qdrant 集合名称常量
 COLLECTION_NAME = "cohere_rag"
 
-def create_vector_stores(texts):
+def create_vector_stores(sources):
     """
     创建并填充向量存储
     
     功能：
         - 在 Qdrant 中创建新的集合（如果不存在）
         - 配置向量维度和距离度量方式
-        - 将文档文本转换为向量并存储
-        - 提供用户反馈和错误处理
+        - 通过摄取流水线流式解析、分块、批量向量化并写入文档
+        - 提供进度、吞吐量反馈和错误处理
     
     参数：
-        texts (list): 分块后的文档列表
+        sources (list): 摄取源列表（PdfSource）
     
     返回：
         QdrantVectorStore: 配置好的向量存储对象，失败时返回 None
+    
+    说明：
+        文本块 ID 由文件名、页码和块序号确定，重试时覆盖已写入的文本块，不会产生重复
     """
     try:
         try:
@@ -266,10 +256,29 @@ def create_vector_stores(texts):
                                        collection_name=COLLECTION_NAME,
                                        embedding=embedding)
         
-        # 批量添加文档到向量存储
-        with st.spinner('Storing documents in Qdrant...'):
-            vector_store.add_documents(texts)
-            st.success("Documents successfully stored in Qdrant!")
+        # 流式摄取：进程池解析分块，每批 96 个文本块（Cohere 单次嵌入上限）向量化并写入
+        progress_bar = st.progress(0.0, text="Storing documents in Qdrant...")
+
+        def show_progress(stats: IngestionStats):
+            progress_bar.progress(
+                stats.pages_done / stats.pages_total if stats.pages_total else 1.0,
+                text=(f"{stats.pages_done}/{stats.pages_total} pages, "
+                      f"{stats.chunks_written} chunks stored, "
+                      f"{stats.chunks_per_second:.1f} chunks/s, waiting on {stats.bottleneck}")
+            )
+
+        pipeline = IngestionPipeline(vector_store, batch_size=96, progress_callback=show_progress)
+        try:
+            stats = pipeline.run(sources)
+        finally:
+            # 清理临时文件
+            for source in sources:
+                os.unlink(source.path)
+
+        if stats.failed_sources:
+            raise RuntimeError("; ".join(stats.errors))
+        st.success(f"Documents successfully stored in Qdrant! "
+                   f"({stats.chunks_written} chunks in {stats.elapsed:.1f}s)")
         
         return vector_store
         
@@ -497,8 +506,8 @@ uploaded_file = st.file_uploader("Choose a PDF or Image File", type=["pdf", "jpg
 if uploaded_file is not None and 'processed_file' not in st.session_state:
     with st.spinner('Processing file... This may take a while for images.'):
         # 处理文档并创建向量存储
-        texts = process_document(uploaded_file)
-        vectorstore = create_vector_stores(texts)
+        source = process_document(uploaded_file)
+        vectorstore = create_vector_stores([source]) if source else None
         if vectorstore:
             st.session_state.vectorstore = vectorstore
             st.session_state.processed_file = True
@@ -0,0 +1,3 @@
+from .pipeline import IngestionPipeline, IngestionStats, ParseTask, PdfSource, WebSource
+
+__all__ = ["IngestionPipeline", "IngestionStats", "ParseTask", "PdfSource", "WebSource"]
@@ -0,0 +1,309 @@
+"""Streaming, parallel document ingestion into a LangChain vector store.
+
+Documents are parsed in a process pool, a few pages per task, and each
+task splits its own pages, so no document is ever held in memory whole.
+Chunks are grouped into batches that are embedded and upserted on a small
+thread pool while parsing continues. Both stages are bounded: at most
+`max_pending_tasks` parse tasks and `max_pending_batches` batches are in
+flight, and when the vector store falls behind, results from the parsers
+wait (backpressure) instead of piling up.
+
+Every chunk gets a deterministic id derived from its source name, page
+and position in the page, so ingesting a source again overwrites its
+chunks instead of adding duplicates. IngestionStats records which sources
+failed, so callers can retry only those.
+"""
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+DEFAULT_WEB_CLASSES = ("post-content", "post-title", "post-header", "content", "main")
+
+
+class ParseTask(NamedTuple):
+    """A picklable unit of parsing work: `func(*args)` returns Documents for `pages` pages."""
+    func: Callable[..., List[Document]]
+    args: Tuple[Any, ...]
+    pages: int
+    # Name of the source the pages belong to, used in chunk ids and errors
+    source: str = ""
+
+
+def _parse_pdf_pages(path: str, start: int, stop: int, metadata: Dict[str, Any]) -> List[Document]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [
+        Document(
+            page_content=reader.pages[page].extract_text(),
+            metadata={"source": path, "page": page, **metadata},
+        )
+        for page in range(start, stop)
+    ]
+
+
+def _parse_web(url: str, css_classes: Tuple[str, ...], metadata: Dict[str, Any]) -> List[Document]:
+    import bs4
+    from langchain_community.document_loaders import WebBaseLoader
+
+    loader = WebBaseLoader(
+        web_paths=(url,),
+        bs_kwargs=dict(parse_only=bs4.SoupStrainer(class_=css_classes)),
+    )
+    documents = loader.load()
+    for doc in documents:
+        doc.metadata.update(metadata)
+    return documents
+
+
+def chunk_id(source: str, page: Optional[int], index: int) -> str:
+    """Deterministic UUID of the `index`-th chunk of a page (Qdrant only accepts UUID or integer ids)."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{page}#{index}"))
+
+
+def _run_parse_task(task: ParseTask, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """Runs in a worker process: parse and split one task's pages, assigning chunk ids."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(task.func(*task.args))
+    per_page: Dict[Optional[int], int] = {}
+    for chunk in chunks:
+        page = chunk.metadata.get("page")
+        index = per_page.get(page, 0)
+        per_page[page] = index + 1
+        chunk.id = chunk_id(task.source, page, index)
+    return chunks
+
+
+@dataclass
+class PdfSource:
+    """A PDF file on disk, parsed `pages_per_task` pages at a time.
+
+    `name` identifies the document across runs and defaults to `path`; set
+    it (e.g. to the uploaded file name) when the file is a temporary copy.
+    """
+    path: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    pages_per_task: int = 8
+    name: Optional[str] = None
+
+    def tasks(self) -> Iterator[ParseTask]:
+        from pypdf import PdfReader
+
+        # Reads only the page tree, not page contents
+        total = len(PdfReader(self.path).pages)
+        for start in range(0, total, self.pages_per_task):
+            stop = min(start + self.pages_per_task, total)
+            yield ParseTask(_parse_pdf_pages, (self.path, start, stop, self.metadata), stop - start, str(self))
+
+    def __str__(self) -> str:
+        return self.name or self.path
+
+
+@dataclass
+class WebSource:
+    """A web page, keeping only elements with the given CSS classes."""
+    url: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    css_classes: Tuple[str, ...] = DEFAULT_WEB_CLASSES
+
+    def tasks(self) -> Iterator[ParseTask]:
+        yield ParseTask(_parse_web, (self.url, self.css_classes, self.metadata), 1, str(self))
+
+    def __str__(self) -> str:
+        return self.url
+
+
+@dataclass
+class IngestionStats:
+    """Progress, throughput and backpressure of one ingestion run."""
+    sources: int = 0
+    pages_total: int = 0
+    pages_done: int = 0
+    chunks: int = 0
+    chunks_written: int = 0
+    batches_written: int = 0
+    elapsed: float = 0.0
+    # Time the pipeline waited for parsers (source-bound) ...
+    parse_wait: float = 0.0
+    # ... and for the embedding/upsert stage to free a slot (sink-bound)
+    write_wait: float = 0.0
+    write_time: float = 0.0
+    max_buffered_chunks: int = 0
+    errors: List[str] = field(default_factory=list)
+    # Source names, in input order, split by whether all their chunks were stored
+    succeeded_sources: List[str] = field(default_factory=list)
+    failed_sources: List[str] = field(default_factory=list)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_written / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bottleneck(self) -> str:
+        """The stage the pipeline spent more time waiting on."""
+        return "embedding/upsert" if self.write_wait > self.parse_wait else "parsing"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            "pages_per_second": self.pages_per_second,
+            "chunks_per_second": self.chunks_per_second,
+            "bottleneck": self.bottleneck,
+        }
+
+
+class IngestionPipeline:
+    """Parses, splits, embeds and upserts documents into a vector store.
+
+    Args:
+        vector_store (VectorStore): Target store; `add_documents` embeds and upserts each batch.
+        chunk_size (int): Maximum characters per chunk.
+        chunk_overlap (int): Characters shared by neighbouring chunks.
+        batch_size (int): Chunks per embedding/upsert call.
+        max_workers (int): Parser processes; defaults to the CPU count.
+        max_pending_tasks (int): Parse tasks in flight; defaults to twice `max_workers`.
+        max_pending_batches (int): Embedding/upsert batches in flight.
+        progress_callback: Called with IngestionStats after every parse task and at the end.
+
+    Parse and embedding/upsert failures are recorded in `IngestionStats.errors`
+    and skipped, and the sources they hit are listed in `failed_sources`.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        batch_size: int = 64,
+        max_workers: Optional[int] = None,
+        max_pending_tasks: Optional[int] = None,
+        max_pending_batches: int = 2,
+        progress_callback: Optional[Callable[[IngestionStats], None]] = None,
+    ):
+        self.vector_store = vector_store
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_pending_tasks = max_pending_tasks
+        self.max_pending_batches = max_pending_batches
+        self.progress_callback = progress_callback
+
+    def _write(self, batch: List[Document]) -> Tuple[int, float]:
+        start = time.perf_counter()
+        self.vector_store.add_documents(batch, ids=[doc.id for doc in batch], batch_size=len(batch))
+        return len(batch), time.perf_counter() - start
+
+    def run(self, sources: Sequence[Any]) -> IngestionStats:
+        """Ingest PdfSource/WebSource objects (anything with `tasks()`); returns the final stats."""
+        start = time.perf_counter()
+        stats = IngestionStats(sources=len(sources))
+        failed: Set[str] = set()
+        tasks: List[ParseTask] = []
+        for source in sources:
+            try:
+                tasks.extend(task if task.source else task._replace(source=str(source)) for task in source.tasks())
+            except Exception as e:
+                stats.errors.append(f"{source}: {e}")
+                failed.add(str(source))
+        stats.pages_total = sum(task.pages for task in tasks)
+
+        def finish() -> IngestionStats:
+            for source in map(str, sources):
+                (stats.failed_sources if source in failed else stats.succeeded_sources).append(source)
+            return stats
+
+        if not tasks:
+            return finish()
+
+        # Each buffered chunk is kept with the name of its source
+        buffered: List[Tuple[str, Document]] = []
+        writes: Deque[Tuple[Future, Set[str]]] = deque()
+
+        def collect(write: Tuple[Future, Set[str]]) -> None:
+            future, batch_sources = write
+            try:
+                written, seconds = future.result()
+            except Exception as e:
+                # Only the sources in this batch need another run
+                stats.errors.append(f"{', '.join(sorted(batch_sources))}: {e}")
+                failed.update(batch_sources)
+                return
+            stats.chunks_written += written
+            stats.batches_written += 1
+            stats.write_time += seconds
+
+        def submit_batch(batch: List[Tuple[str, Document]]) -> None:
+            while writes and writes[0][0].done():
+                collect(writes.popleft())
+            # Backpressure: wait for the oldest batch rather than queue more
+            while len(writes) >= self.max_pending_batches:
+                waited = time.perf_counter()
+                collect(writes.popleft())
+                stats.write_wait += time.perf_counter() - waited
+            future = writers.submit(self._write, [doc for _, doc in batch])
+            writes.append((future, {source for source, _ in batch}))
+
+        def report() -> None:
+            stats.elapsed = time.perf_counter() - start
+            if self.progress_callback:
+                self.progress_callback(stats)
+
+        max_workers = self.max_workers or os.cpu_count() or 1
+        max_pending_tasks = self.max_pending_tasks or 2 * max_workers
+        with ProcessPoolExecutor(max_workers=max_workers) as parsers, \
+                ThreadPoolExecutor(max_workers=self.max_pending_batches) as writers:
+            remaining = iter(tasks)
+            parsing: Dict[Future, ParseTask] = {}
+
+            def fill() -> None:
+                while len(parsing) < max_pending_tasks:
+                    task = next(remaining, None)
+                    if task is None:
+                        return
+                    future = parsers.submit(_run_parse_task, task, self.chunk_size, self.chunk_overlap)
+                    parsing[future] = task
+
+            fill()
+            while parsing:
+                waited = time.perf_counter()
+                done, _ = wait(parsing, return_when=FIRST_COMPLETED)
+                stats.parse_wait += time.perf_counter() - waited
+                for future in done:
+                    task = parsing.pop(future)
+                    stats.pages_done += task.pages
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        # A broken file or page range is skipped, not fatal
+                        stats.errors.append(f"{task.source}: {e}")
+                        failed.add(task.source)
+                        continue
+                    stats.chunks += len(chunks)
+                    buffered.extend((task.source, chunk) for chunk in chunks)
+                    stats.max_buffered_chunks = max(stats.max_buffered_chunks, len(buffered))
+                    while len(buffered) >= self.batch_size:
+                        submit_batch(buffered[:self.batch_size])
+                        buffered = buffered[self.batch_size:]
+                fill()
+                report()
+
+            if buffered:
+                submit_batch(buffered)
+            while writes:
+                collect(writes.popleft())
+
+        report()
+        return finish()